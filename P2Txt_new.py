@@ -1,7 +1,8 @@
 import sys
 import os
+import threading
+import time
 import numpy as np
-import matplotlib.pyplot as plt
 import warnings
 
 # 忽略弃用警告
@@ -14,128 +15,31 @@ from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QTextEdit, QFileDialog, QLineEdit,
     QTabWidget, QMessageBox, QSplitter, QProgressDialog,
-    QComboBox, QSizePolicy
+    QComboBox, QSizePolicy, QListWidget, QListWidgetItem, QSpinBox, QCheckBox
 )
-from PyQt6.QtGui import QPixmap, QPalette, QColor, QIcon, QTextCursor
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QSettings
+from PyQt6.QtGui import QPixmap, QPalette, QColor, QIcon, QTextCursor, QImage, QPainter
+from PyQt6.QtCore import Qt, QThread, pyqtSignal, QSettings, QFileSystemWatcher, QTimer
 # 新增 cast
 from typing import Protocol, Any, cast
 
-from pylab import mpl
-# 设置matplotlib的中文字体
-mpl.rcParams["font.sans-serif"] = ["SimHei"]
-
-LABEL_COLORS = {
-    0: ("Other", "#A9A9A9"), 1: ("Buildings", "#FF0000"), 2: ("Trees", "#228B22"),
-    3: ("Cars", "#0000FF"), 4: ("Roads", "#FFFF00"), 5: ("Poles", "#FFA500"),
-}
+from class_schema import ClassSchema, bundled_schema_paths
+from label_overlay import overlay_path
+# 点云加载、渲染、统计与VLM请求等与界面无关的部分，与本地HTTP服务共用
+from p2txt_core import (
+    I18N_TEXTS, DEFAULT_CLASS_SCHEMA, DEFAULT_SCENE_CACHE_MB, DEFAULT_RENDER_CACHE_MB, DEFAULT_VLM_IMAGE_MAX_SIDE,
+    DEFAULT_FIRST_TOKEN_TIMEOUT_S, DEFAULT_INTER_TOKEN_TIMEOUT_S, DEFAULT_HEDGE_PERCENTILE, PREVIEW_MAX_POINTS,
+    VIEW_PROJECTIONS, VLM_VIEW_ORDER, PointCloudFileReader, RenderCache, IncrementalViewRenderer, UploadedImageCache,
+    SceneEntry, SceneCache, DashscopeApiError, VlmStreamTimeout, AnalysisCancelled, FirstTokenLatencyTracker,
+    active_class_schema, set_active_class_schema, load_point_cloud, render_point_cloud_views,
+    compute_scene_statistics, format_scene_statistics, scene_output_dir, resolve_image_reference,
+    stream_vlm_analysis_guarded, render_and_upload_views,
+)
 
-def load_point_cloud(file_path):
-    try:
-        # 尝试加载，允许文件为空或仅包含注释导致数据为空
-        data = np.loadtxt(file_path)
-
-        # 检查数据是否为空（例如文件只有注释或空白，loadtxt会跳过）
-        if data.size == 0:
-            # 如果loadtxt结果为空数组（如文件只有注释或为空）
-            # 取决于np版本和文件内容，loadtxt可能报错或返回空
-            # 这个显式检查处理返回空的情况
-            raise ValueError(
-                "点云文件中未找到数据。文件可能为空或仅包含注释。"
-            )
-
-        if data.ndim == 1:  # 处理文件中只有一个点的情况
-            if data.shape[0] == 5:
-                data = data.reshape(1, 5)
-            else:
-                raise ValueError(
-                    f"文件中单行数据不是5列。实际为{data.shape[0]}列。应为x y z intensity label。")
-        elif data.shape[1] != 5:
-            raise ValueError(
-                f"点云数据必须正好有5列（x y z intensity label）。实际为{data.shape[1]}列。")
-
-        points = data[:, :3]  # x, y, z
-        intensity = data[:, 3]  # 强度
-        labels = data[:, 4].astype(int)  # 标签，确保为整数
-
-        # 返回单独的x,y,z用于2D视图（兼容旧代码）
-        x_coords = points[:, 0]
-        y_coords = points[:, 1]
-        z_coords = points[:, 2]
-
-        return x_coords, y_coords, z_coords, labels, intensity, points
-
-    except ValueError as ve:  # 捕获loadtxt的特定错误或自定义ValueError
-        print(f"加载点云出错（ValueError）：{ve}")
-        raise  # 重新抛出以便调用方捕获
-    except Exception as e:  # 捕获加载过程中的其他潜在错误
-        print(f"加载点云时发生意外错误：{e}")
-        raise  # 重新抛出以便调用方捕获
-
-
-def render_view(x_coords, y_coords, labels, view_name, save_dir, i18n_texts):
-    plt.figure(figsize=(10, 8))
-    # unique_labels将是NumPy数组。如果labels为None或空，np.unique([])为np.array([])
-    unique_labels = np.unique(labels) if labels is not None and labels.size > 0 else np.array([])
-
-    for label_id in unique_labels:  # 如果unique_labels为空，此循环不会执行
-        if label_id in LABEL_COLORS:
-            label_name, color = LABEL_COLORS[label_id]
-            mask = labels == label_id
-            plt.scatter(x_coords[mask], y_coords[mask], c=color, s=1, label=label_name, marker='.')
-        else:
-            print(f"警告：标签ID {label_id} 不在LABEL_COLORS中，跳过。")
-
-    # 如果没有找到唯一标签（如labels数组为空或所有标签未知）
-    # 但有点存在，则用默认颜色绘制
-    # 检查unique_labels是否为空
-    if unique_labels.size == 0 and (x_coords is not None and x_coords.size > 0):
-        plt.scatter(x_coords, y_coords, c=LABEL_COLORS[0][1], s=1, label=LABEL_COLORS[0][0], marker='.')
-
-    plt.axis('equal')
-    plt.title(f'{view_name} {i18n_texts["view_title_suffix"]}')
-    plt.xlabel('X')
-    plt.ylabel('Y')
-    handles, legend_labels = [], []
-    sorted_label_colors = sorted(LABEL_COLORS.items())
-
-    # 根据实际唯一标签生成图例，或如果没有特定标签但有点则显示默认图例
-    for label_id, (label_name, color) in sorted_label_colors:
-        # 条件：label_id在数据中出现的唯一标签中
-        # 或唯一标签数组为空且为默认标签（0），且有点可显示默认图例
-        if label_id in unique_labels or \
-                (unique_labels.size == 0 and label_id == 0 and (x_coords is not None and x_coords.size > 0)):
-            handles.append(
-                plt.Line2D([0], [0], marker='o', color='w', label=label_name, markerfacecolor=color, markersize=10))
-            legend_labels.append(label_name)
-
-    if handles:
-        plt.legend(handles, legend_labels, markerscale=1, fontsize=8, loc='upper right', frameon=True)
-    else:
-        # 如果x_coords为空，或没有标签匹配LABEL_COLORS，可能会出现这种情况
-        print(f"{view_name}中未找到已知标签或无数据用于图例。")
-    plt.tight_layout()
-    file_path = os.path.join(save_dir, f'{view_name.lower().replace(" ", "_")}_view.png')
-    plt.savefig(file_path, dpi=300)
-    plt.close()
-    print(f"{i18n_texts['saved_view_message']}: {view_name}")
-    return file_path
-
-
-def render_point_cloud_views(file_path, save_dir, i18n_texts):
-    if not os.path.exists(save_dir): os.makedirs(save_dir)
-    x, y, z, label_data, _, _points_for_3d = load_point_cloud(file_path)
-    paths = {}
-    # 仅当label_data不为None且不为空时渲染2D视图
-    if label_data is not None and label_data.size > 0:
-        paths['top'] = render_view(x, y, label_data, i18n_texts['top_view_name'], save_dir, i18n_texts)
-        paths['front'] = render_view(x, z, label_data, i18n_texts['front_view_name'], save_dir, i18n_texts)
-        paths['side'] = render_view(y, z, label_data, i18n_texts['side_view_name'], save_dir, i18n_texts)
-        print(f"{i18n_texts['render_complete_message']} {save_dir}")
-    else:
-        # 该消息也适用于load_point_cloud返回空label_data数组的情况
-        print("点云加载无有效标签或无数据点，跳过二维视图生成。")
-    return paths
+# 交互式2D视图：最高帧率，拖动/缩放过程中每帧最多栅格化的点数，以及停止操作后精细重绘的点数上限
+INTERACTIVE_MAX_FPS = 30
+INTERACTIVE_POINT_BUDGET = 1_000_000
+INTERACTIVE_REFINE_POINT_BUDGET = 4_000_000
+INTERACTIVE_REFINE_DELAY_MS = 150
 
 
 # 新增：信号协议，帮助类型检查器识别 emit/connect
@@ -148,69 +52,91 @@ class ApiWorker(QThread):  # 确保这是健壮版本
     # 为信号添加类型注解，消除“在 'pyqtSignal | pyqtSignal' 中找不到引用 'emit'”告警
     result_ready: SignalLike = pyqtSignal(str)
     error_occurred: SignalLike = pyqtSignal(str)
+    # 请求统计：上传字节数、首个token耗时、总耗时，便于比较图片尺寸对延迟的影响
+    metrics_ready: SignalLike = pyqtSignal(dict)
     # 移除对子类 finished 的重新声明，使用基类 QThread.finished
 
-    def __init__(self, api_key, image_paths, system_prompt_text, user_prompt_text):
+    def __init__(self, api_key, image_paths, system_prompt_text, user_prompt_text, upload_cache=None,
+                 image_max_side=0, first_token_timeout_s=DEFAULT_FIRST_TOKEN_TIMEOUT_S,
+                 inter_token_timeout_s=DEFAULT_INTER_TOKEN_TIMEOUT_S, latency_tracker=None, hedge=False):
         super().__init__()
         self.api_key = api_key
         self.image_paths = image_paths  # 这是一个字典
         self.system_prompt_text = system_prompt_text
         self.user_prompt_text = user_prompt_text
+        self.upload_cache = upload_cache  # UploadedImageCache，可为None
+        self.image_max_side = image_max_side
+        self.first_token_timeout_s = first_token_timeout_s
+        self.inter_token_timeout_s = inter_token_timeout_s
+        self.latency_tracker = latency_tracker  # FirstTokenLatencyTracker，可为None
+        self.hedge = hedge
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        """协作式取消：工作线程最多0.2秒内察觉，并直接断开仍在进行的流式连接。"""
+        self.cancel_event.set()
+
+    def was_cancelled(self):
+        return self.cancel_event.is_set()
+
+    def _prepare_images(self):
+        """返回 (图片引用列表, 上传字节数, 额外统计)；无法继续时发出错误并返回None。"""
+        # 检查image_paths字典是否为空。如果2D视图被跳过会出现这种情况
+        if not self.image_paths:
+            self.error_occurred.emit(
+                "无可用于VLM分析的二维视图（点云可能无标签、无数据或视图生成失败）。")
+            return None
+
+        image_refs, upload_bytes = [], 0
+        for view_type in VLM_VIEW_ORDER:
+            if self.cancel_event.is_set():
+                raise AnalysisCancelled()
+            path = self.image_paths.get(view_type)
+            if path and os.path.exists(path):
+                image_ref, sent_bytes = resolve_image_reference(path, self.api_key, self.upload_cache,
+                                                                self.image_max_side)
+                image_refs.append(image_ref)
+                upload_bytes += sent_bytes
+            else:
+                # 这种情况意味着image_paths已填充但某个路径缺失/无效
+                # 如果render_view成功，这种情况一般不会发生
+                # 若视图未生成，前面的if not self.image_paths会捕获
+                self.error_occurred.emit(
+                    f"{view_type}视图的图片路径缺失或无效，无法进行VLM分析。路径: {path}")
+                return None
+        return image_refs, upload_bytes, {}
 
     def run(self):
-        import dashscope
-        from dashscope.api_entities.dashscope_response import Role
-
         try:
-            content_for_api = []
-            # 检查image_paths字典是否为空。如果2D视图被跳过会出现这种情况
-            if not self.image_paths:
-                self.error_occurred.emit(
-                    "无可用于VLM分析的二维视图（点云可能无标签、无数据或视图生成失败）。")
-                self.finished.emit()
+            import dashscope  # 提前检查SDK是否安装，避免先做完渲染/上传
+            request_start = time.perf_counter()
+            prepared = self._prepare_images()
+            if prepared is None:
                 return
-
-            for view_type in ["front", "side", "top"]:
-                path = self.image_paths.get(view_type)
-                if path and os.path.exists(path):
-                    content_for_api.append({"image": f"file://{os.path.abspath(path)}"})
-                else:
-                    # 这种情况意味着image_paths已填充但某个路径缺失/无效
-                    # 如果render_view成功，这种情况一般不会发生
-                    # 若视图未生成，前面的if not self.image_paths会捕获
-                    self.error_occurred.emit(
-                        f"{view_type}视图的图片路径缺失或无效，无法进行VLM分析。路径: {path}")
-                    self.finished.emit()
-                    return
-
-            # 确保确实有图片内容，如果走到这里
-            # 如果上面的循环确保所有图片都存在，这里检查可能是多余的
-            if not any("image" in item for item in content_for_api):
-                self.error_occurred.emit("检查路径后未找到可用于VLM分析的有效图片内容。")
-                self.finished.emit()
-                return
-
-            content_for_api.append({"text": self.user_prompt_text})
-            messages = [{"role": Role.SYSTEM, "content": [{"text": self.system_prompt_text}]},
-                        {"role": Role.USER, "content": content_for_api}]
-            responses = dashscope.MultiModalConversation.call(api_key=self.api_key, model='qwen-vl-max',
-                                                              messages=messages, stream=True, incremental_output=True)
-            for response in responses:
-                if response.status_code == 200:
-                    text_content = ""
-                    if response.output and response.output.choices and len(response.output.choices) > 0:
-                        choice = response.output.choices[0]
-                        if choice.message and choice.message.content and len(choice.message.content) > 0:
-                            for part in choice.message.content:
-                                if "text" in part: text_content += part.get("text", "")
-                    if text_content: self.result_ready.emit(text_content)
-                else:
-                    error_detail = f"Code: {response.code}, Message: {response.message}"
-                    if hasattr(response, 'request_id'): error_detail += f", Request ID: {response.request_id}"
-                    self.error_occurred.emit(f"Dashscope API错误: {error_detail}")
-                    return
+            image_refs, upload_bytes, extra_metrics = prepared
+
+            first_token_time = None
+            for text_content in stream_vlm_analysis_guarded(
+                    self.api_key, image_refs, self.system_prompt_text, self.user_prompt_text,
+                    cancel_event=self.cancel_event, first_token_timeout_s=self.first_token_timeout_s,
+                    inter_token_timeout_s=self.inter_token_timeout_s, latency_tracker=self.latency_tracker,
+                    hedge=self.hedge):
+                if first_token_time is None:
+                    first_token_time = time.perf_counter() - request_start
+                self.result_ready.emit(text_content)
+            metrics = {"upload_bytes": upload_bytes, "first_token_s": first_token_time,
+                       "total_s": time.perf_counter() - request_start, **extra_metrics}
+            print(f"VLM请求统计：上传 {upload_bytes / 1024:.1f} KB，首个token "
+                  f"{(first_token_time or 0):.2f} s，总耗时 {metrics['total_s']:.2f} s")
+            self.metrics_ready.emit(metrics)
         except ImportError:
             self.error_occurred.emit("未安装Dashscope SDK。请安装：pip install dashscope")
+        except AnalysisCancelled:
+            print("VLM分析已取消。")
+        except VlmStreamTimeout as e:
+            self.error_occurred.emit(f"VLM响应超时：{e}")
+        except DashscopeApiError as e:
+            self.error_occurred.emit(f"Dashscope API错误: {e}")
         except Exception as e:
             import traceback
             error_trace = traceback.format_exc()
@@ -220,6 +146,307 @@ class ApiWorker(QThread):  # 确保这是健壮版本
             self.finished.emit()
 
 
+class PipelinedAnalysisWorker(ApiWorker):
+    """自动分析/批量模式：渲染视图与上传流水线并行，最后一张图上传完成即发起模型请求。
+
+    从加载完成到首个token的时间接近“渲染”和“上传”两者中较慢的一个，而不是两者之和。
+    """
+
+    view_ready: SignalLike = pyqtSignal(str, str)  # 视图键, 图片路径
+
+    def __init__(self, api_key, cloud, save_dir, i18n_texts, system_prompt_text, user_prompt_text,
+                 render_cache=None, content_digest=None, **kwargs):
+        super().__init__(api_key, {}, system_prompt_text, user_prompt_text, **kwargs)
+        self.render_cache = render_cache
+        self.content_digest = content_digest  # SceneEntry.content_digest，在工作线程中计算并缓存哈希
+        self.cloud = cloud
+        self.save_dir = save_dir
+        self.i18n_texts = i18n_texts
+
+    def _prepare_images(self):
+        data_digest = None
+        if self.render_cache is not None and self.content_digest is not None:
+            data_digest = self.content_digest(self.cloud)
+        paths, image_refs, upload_bytes, render_seconds = render_and_upload_views(
+            self.cloud, self.save_dir, self.i18n_texts, self.api_key, self.upload_cache, self.image_max_side,
+            on_view=self.view_ready.emit, cancel_event=self.cancel_event, render_cache=self.render_cache,
+            data_digest=data_digest)
+        self.image_paths = paths
+        if not image_refs:
+            self.error_occurred.emit(
+                "无可用于VLM分析的二维视图（点云可能无标签、无数据或视图生成失败）。")
+            return None
+        return image_refs, upload_bytes, {"render_s": render_seconds}
+
+
+class ViewRenderWorker(QThread):
+    """在后台渲染全分辨率视图，每完成一个视图发出view_ready，用于替换已显示的预览或旧视图。
+
+    传入view_renderer时改为增量更新：下标start之前的点已画在其画布上，只绘制之后的点。
+    """
+
+    view_ready: SignalLike = pyqtSignal(str, str)  # 视图键, 图片路径
+    error_occurred: SignalLike = pyqtSignal(str)
+
+    def __init__(self, file_path, cloud, save_dir, i18n_texts, render_cache=None, content_digest=None,
+                 view_renderer=None, start=0):
+        super().__init__()
+        self.file_path = file_path
+        self.cloud = cloud
+        self.save_dir = save_dir
+        self.i18n_texts = i18n_texts
+        self.render_cache = render_cache
+        self.content_digest = content_digest  # SceneEntry.content_digest，在工作线程中计算并缓存哈希
+        self.view_renderer = view_renderer  # IncrementalViewRenderer，运行期间只由本线程使用
+        self.start_index = start
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        try:
+            if self.view_renderer is not None:
+                self.view_renderer.update(self.cloud, self.start_index, on_view=self.view_ready.emit,
+                                          cancel_event=self.cancel_event)
+                return
+            data_digest = None
+            if self.render_cache is not None and self.content_digest is not None:
+                data_digest = self.content_digest(self.cloud)
+            render_point_cloud_views(self.file_path, self.save_dir, self.i18n_texts, cloud=self.cloud,
+                                     render_cache=self.render_cache, on_view=self.view_ready.emit,
+                                     cancel_event=self.cancel_event, data_digest=data_digest)
+        except Exception as e:
+            print(f"后台渲染全分辨率视图失败：{e}")
+            self.error_occurred.emit(str(e))
+
+
+class PointCloudViewport(QWidget):
+    """可缩放、平移的2D投影视图，每次视口变化时只把可见的点按屏幕分辨率栅格化。
+
+    点按水平坐标排序后，可见范围是一段连续切片，用searchsorted即可定位，代价与可见点数成正比。
+    视口变化按INTERACTIVE_MAX_FPS合并重绘；操作过程中超出预算的点按步长抽稀，停下后以更大的预算重绘。
+    排序只在视图可见时进行；增量追加的行单独排序后并入已有结果。
+    """
+
+    projections_sorted: SignalLike = pyqtSignal()  # 排序结果变化（占用的内存随之变化）
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setMouseTracking(False)
+        self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
+        self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        self.placeholder_text = ""
+        self.status_format = "{visible} / {total}"
+        self._cloud = None
+        self._projection = 'top'
+        self._sorted = {}  # 投影键 -> (排序后的水平坐标, 竖直坐标, 颜色)，通常与SceneEntry.projections共享
+        self._center = (0.0, 0.0)
+        self._scale = 1.0  # 每个数据单位对应的像素数，横纵相同以保持比例
+        self._image = None
+        self._image_buffer = None  # QImage不持有数据，需要保留缓冲区的引用
+        self._visible = 0
+        self._drag_origin = None
+        self._fit_pending = False  # 隐藏时无法得知最终尺寸，显示后再适配视口
+        self._redraw_pending = False  # 隐藏期间的数据或视口变化，显示后再重绘
+        self._frame_timer = QTimer(self)
+        self._frame_timer.setSingleShot(True)
+        self._frame_timer.setInterval(1000 // INTERACTIVE_MAX_FPS)
+        cast(SignalLike, self._frame_timer.timeout).connect(lambda: self._rasterize(draft=True))
+        self._refine_timer = QTimer(self)
+        self._refine_timer.setSingleShot(True)
+        self._refine_timer.setInterval(INTERACTIVE_REFINE_DELAY_MS)
+        cast(SignalLike, self._refine_timer.timeout).connect(lambda: self._rasterize(draft=False))
+
+    def set_cloud(self, cloud, reset_view=True, projections=None, unchanged_rows=None):
+        """projections保存排序结果的字典（通常为SceneEntry.projections）；unchanged_rows为与其排序时相比
+        未变的前缀行数，None表示点云未变。覆盖了已变化行的排序结果被丢弃，只覆盖前缀的在下次绘制时合并新行。"""
+        self._cloud = cloud if cloud is not None and cloud[3] is not None and cloud[3].size else None
+        self._sorted = projections if projections is not None and self._cloud is not None else {}
+        if unchanged_rows is not None:
+            for key in [key for key, arrays in self._sorted.items() if arrays[0].size > unchanged_rows]:
+                del self._sorted[key]
+        if reset_view or self._image is None:
+            self.reset_view()
+        else:
+            self._schedule()
+
+    def set_projection(self, key):
+        if key in VIEW_PROJECTIONS and key != self._projection:
+            self._projection = key
+            self.reset_view()
+
+    def refresh(self):
+        """按当前视口完整重绘，例如主题颜色改变后。"""
+        if self._cloud is None or self._fit_pending:
+            return
+        if self.isVisible():
+            self._rasterize(draft=False)
+        else:
+            self._redraw_pending = True
+
+    def reset_view(self):
+        if not self.isVisible():
+            # 排序与栅格化推迟到标签页真正显示时
+            self._fit_pending = self._cloud is not None
+            self._image = None
+            return
+        self._fit_pending = False
+        self._redraw_pending = False
+        data = self._projected()
+        if data is None:
+            self._image = None
+            self.update()
+            return
+        h_coords, v_coords, _colors = data
+        h_min, h_max = float(h_coords[0]), float(h_coords[-1])
+        v_min, v_max = float(v_coords.min()), float(v_coords.max())
+        self._center = ((h_min + h_max) / 2, (v_min + v_max) / 2)
+        margin = 0.95
+        self._scale = margin * min(max(self.width(), 1) / max(h_max - h_min, 1e-9),
+                                   max(self.height(), 1) / max(v_max - v_min, 1e-9))
+        self._rasterize(draft=False)
+
+    def _projected(self):
+        if self._cloud is None:
+            return None
+        h_axis, v_axis, _name_key = VIEW_PROJECTIONS[self._projection]
+        coords = (self._cloud[0], self._cloud[1], self._cloud[2])
+        labels = self._cloud[3]
+        sorted_data = self._sorted.get(self._projection)
+        if sorted_data is None or sorted_data[0].size > labels.size:
+            # 每种投影只排序一次；之后每帧都只处理可见切片
+            order = np.argsort(coords[h_axis], kind='stable')
+            sorted_data = (coords[h_axis][order], coords[v_axis][order],
+                           active_class_schema().colors_argb(labels[order]))
+        elif sorted_data[0].size < labels.size:
+            # 增量追加的行：只排序新行，再按位置插入已排序的数组（线性合并，不重新排序全部点）
+            first = sorted_data[0].size
+            order = first + np.argsort(coords[h_axis][first:], kind='stable')
+            new_h = coords[h_axis][order]
+            positions = np.searchsorted(sorted_data[0], new_h, side='right')  # 与稳定排序一致，旧行在前
+            sorted_data = (np.insert(sorted_data[0], positions, new_h),
+                           np.insert(sorted_data[1], positions, coords[v_axis][order]),
+                           np.insert(sorted_data[2], positions, active_class_schema().colors_argb(labels[order])))
+        else:
+            return sorted_data
+        self._sorted[self._projection] = sorted_data
+        self.projections_sorted.emit()
+        return sorted_data
+
+    def _schedule(self):
+        if not self.isVisible():
+            self._redraw_pending = True  # 隐藏的标签页不排序、不栅格化
+            return
+        # 合并短时间内的多次视口变化，帧率不超过INTERACTIVE_MAX_FPS
+        if not self._frame_timer.isActive():
+            self._frame_timer.start()
+        self._refine_timer.start()
+
+    def _rasterize(self, draft):
+        if not self.isVisible():
+            self._redraw_pending = True  # 计时器触发前标签页已被切走
+            return
+        data = self._projected()
+        width, height = self.width(), self.height()
+        if data is None or width <= 0 or height <= 0:
+            self._image = None
+            self.update()
+            return
+        h_coords, v_coords, colors = data
+        half_w, half_h = width / 2 / self._scale, height / 2 / self._scale
+        h0, v1 = self._center[0] - half_w, self._center[1] + half_h
+        start, stop = np.searchsorted(h_coords, [h0, self._center[0] + half_w])
+        h_slice, v_slice, c_slice = h_coords[start:stop], v_coords[start:stop], colors[start:stop]
+        budget = INTERACTIVE_POINT_BUDGET if draft else INTERACTIVE_REFINE_POINT_BUDGET
+        visible = None
+        if h_slice.size > budget:
+            # 抽稀只影响绘制，状态栏中的可见点数仍按全部点统计
+            visible = int(np.count_nonzero((v_slice <= v1) & (v_slice > v1 - height / self._scale)))
+            step = -(-h_slice.size // budget)
+            h_slice, v_slice, c_slice = h_slice[::step], v_slice[::step], c_slice[::step]
+
+        rows = ((v1 - v_slice) * self._scale).astype(np.int64)
+        inside = (rows >= 0) & (rows < height)
+        cols = ((h_slice[inside] - h0) * self._scale).astype(np.int64)
+        rows = rows[inside]
+        np.clip(cols, 0, width - 1, out=cols)
+        c_slice = c_slice[inside]
+        self._visible = int(rows.size) if visible is None else visible
+
+        buffer = np.full(width * height, self.palette().color(QPalette.ColorRole.Base).rgba(), dtype=np.uint32)
+        flat = rows * width + cols
+        buffer[flat] = c_slice
+        if rows.size and rows.size * 8 < width * height:
+            # 放大后点很稀疏，画成2×2像素以便看清；右边缘和下边缘的点不向外扩展，避免写到下一行或越界
+            right, down = cols + 1 < width, rows + 1 < height
+            both = right & down
+            buffer[flat[right] + 1] = c_slice[right]
+            buffer[flat[down] + width] = c_slice[down]
+            buffer[flat[both] + width + 1] = c_slice[both]
+        self._image_buffer = buffer
+        self._image = QImage(buffer.data, width, height, width * 4, QImage.Format.Format_ARGB32)
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        if self._image is None:
+            painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, self.placeholder_text)
+        else:
+            painter.drawImage(0, 0, self._image)
+            total = self._cloud[3].size if self._cloud is not None else 0
+            painter.setPen(self.palette().color(QPalette.ColorRole.Text))
+            painter.drawText(self.rect().adjusted(6, 4, -6, -4),
+                             Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignBottom,
+                             self.status_format.format(visible=self._visible, total=total,
+                                                       scale=self._scale))
+        painter.end()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self._fit_pending:
+            self.reset_view()
+        elif self._redraw_pending:
+            self._redraw_pending = False
+            self._rasterize(draft=False)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self._cloud is not None and not self._fit_pending:
+            self._schedule()
+
+    def wheelEvent(self, event):
+        if self._cloud is None:
+            return
+        factor = 1.25 ** (event.angleDelta().y() / 120)
+        # 以光标所在的数据坐标为不动点缩放
+        pos = event.position()
+        anchor_h = self._center[0] + (pos.x() - self.width() / 2) / self._scale
+        anchor_v = self._center[1] - (pos.y() - self.height() / 2) / self._scale
+        self._scale *= factor
+        self._center = (anchor_h - (pos.x() - self.width() / 2) / self._scale,
+                        anchor_v + (pos.y() - self.height() / 2) / self._scale)
+        self._schedule()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self._drag_origin = (event.position(), self._center)
+
+    def mouseMoveEvent(self, event):
+        if self._drag_origin is None:
+            return
+        origin, center = self._drag_origin
+        delta = event.position() - origin
+        self._center = (center[0] - delta.x() / self._scale, center[1] + delta.y() / self._scale)
+        self._schedule()
+
+    def mouseReleaseEvent(self, event):
+        self._drag_origin = None
+
+    def mouseDoubleClickEvent(self, event):
+        self.reset_view()
+
+
 MORANDI_LIGHT = {
     "bg": "#EAE0D5", "bg_alt": "#DCD0C0", "fg": "#5D5C61", "accent": "#B6A693",
     "button": "#C9B7A8", "button_fg": "#4A4A48", "border": "#A99A8D", "text_area_bg": "#F5F5F5",
@@ -229,71 +456,6 @@ MORANDI_DARK = {
     "button": "#5A5E61", "button_fg": "#E0E0E0", "border": "#2A2D2F", "text_area_bg": "#2B2B2B",
 }
 
-I18N_TEXTS = {
-    "en": {
-        "window_title": "Point Cloud Scene Analyzer", "load_button": "Load Point Cloud (.txt)",
-        "analyze_button": "Analyze Scene with VLM", "clear_button": "Clear Output & Views",
-        "dark_mode_button": "Switch to Dark Mode", "light_mode_button": "Switch to Light Mode",
-        "api_key_label": "Dashscope API Key:", "output_label": "VLM Analysis:",
-        "views_tab_label": "Generated Views",
-        "threed_view_tab_label": "3D View",
-        "launch_3d_button": "Launch 3D Viewer",
-        "threed_placeholder": "Load a point cloud and click 'Launch 3D Viewer'.",
-        "status_ready": "Ready. Load a point cloud file.",
-        "status_loading_file": "Loading file: {file_path}", "status_generating_views": "Generating 2D views...",
-        "status_views_generated": "2D views generated. Ready for analysis or 3D view.",
-        "status_views_skipped": "Point cloud loaded. 2D views skipped (no labels/data). Ready for 3D view or analysis if applicable.",
-        # New/Updated
-        "status_analyzing": "Analyzing scene with VLM... Please wait.",
-        "status_analysis_complete": "Analysis complete.",
-        "status_analysis_partial": "Receiving analysis...", "error_title": "Error",
-        "error_no_file": "Please load a point cloud file first.",
-        "error_no_views": "Please generate views first (load a file).",
-        "error_no_api_key": "Please enter your Dashscope API Key.",
-        "error_loading_point_cloud": "Failed to load point cloud: {error}",
-        "error_generating_views": "Failed to generate 2D views: {error}",
-        "error_loading_image": "Error loading image for display.",
-        "error_launching_3d": "Failed to launch 3D viewer: {error}",
-        "output_dir_name": "output_views", "top_view_name": "Top", "front_view_name": "Front", "side_view_name": "Side",
-        "view_title_suffix": "View", "saved_view_message": "Saved",
-        "render_complete_message": "2D view rendering complete, images saved in:",
-        "language_select_label": "Language:",
-        "views_placeholder": "Load a point cloud to generate 2D views (requires labels/data).",  # Modified
-        "system_prompt": """You are a helpful AI assistant specializing in point cloud scene understanding. Given three orthogonal 2D projected views (top, front, side) of a 3D point cloud scene, describe the scene in detail. Identify major objects, their spatial relationships, and the overall environment type if possible. Be concise and informative.""",
-        "user_prompt": """Please analyze these three views of a point cloud scene and provide a comprehensive description."""
-    },
-    "zh": {
-        "window_title": "点云场景分析器", "load_button": "加载点云文件 (.txt)",
-        "analyze_button": "调用VLM分析场景", "clear_button": "清除输出和视图",
-        "dark_mode_button": "切换深色模式", "light_mode_button": "切换浅色模式",
-        "api_key_label": "Dashscope API 密钥:", "output_label": "VLM分析结果:",
-        "views_tab_label": "生成的视图",
-        "threed_view_tab_label": "三维视图",
-        "launch_3d_button": "启动三维查看器",
-        "threed_placeholder": "加载点云后，点击“启动三维查看器”。",
-        "status_ready": "就绪。请加载点云文件。",
-        "status_loading_file": "正在加载文件: {file_path}", "status_generating_views": "正在生成二维视图...",
-        "status_views_generated": "二维视图已生成。可以开始分析或查看三维视图。",
-        "status_views_skipped": "点云已加载。二维视图已跳过（无标签/数据）。可进行三维查看或VLM分析（若适用）。",
-        # New/Updated
-        "status_analyzing": "正在调用VLM分析场景... 请稍候。",
-        "status_analysis_complete": "分析完成。", "status_analysis_partial": "正在接收分析结果...",
-        "error_title": "错误", "error_no_file": "请先加载点云文件。",
-        "error_no_views": "请先生成视图 (加载文件)。", "error_no_api_key": "请输入您的Dashscope API密钥。",
-        "error_loading_point_cloud": "加载点云失败: {error}", "error_generating_views": "生成二维视图失败: {error}",
-        "error_loading_image": "错误：无法加载图片用于显示。",
-        "error_launching_3d": "启动三维查看器失败: {error}",
-        "output_dir_name": "output_views_zh", "top_view_name": "俯视图", "front_view_name": "正视图",
-        # output_dir_name changed for zh
-        "side_view_name": "侧视图",
-        "view_title_suffix": "视图", "saved_view_message": "已保存",
-        "render_complete_message": "二维视图渲染完成，图像保存在：",
-        "language_select_label": "语言:", "views_placeholder": "加载点云以生成二维视图（需要标签/数据）。",  # Modified
-        "system_prompt": """你是一个精通点云场景理解的AI助手。给定一个三维点云场景的三个正交二维投影视图（俯视图、正视图、侧视图），请详细描述这个场景。识别主要的物体，它们的空间关系，如果可能的话，判断整体环境类型。请做到简洁且信息丰富。""",
-        "user_prompt": """请分析这三张点云场景的视图，并提供一个全面的描述。"""
-    }
-}
-
 class PointCloudAnalyzerApp(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -303,8 +465,26 @@ class PointCloudAnalyzerApp(QMainWindow):
         self.generated_view_paths = {}
         self.original_pixmaps = {}
         self.raw_vlm_output_buffer = ""
+        self.last_vlm_metrics = None
+        self.upload_cache = UploadedImageCache()  # 会话内复用已上传的视图图片
+        self.api_worker = None
+        self.scenes = {}  # file_path -> SceneEntry，顺序与场景列表一致
+        self.current_scene = None
+        self.analyzing_scene = None
+        self.file_watcher = QFileSystemWatcher(self)
+        cast(SignalLike, self.file_watcher.fileChanged).connect(self._on_scene_file_changed)
+        cast(SignalLike, self.file_watcher.directoryChanged).connect(self._on_scene_dir_changed)
+        # 采集程序往往连续写入，合并短时间内的多次变更通知
+        self.reload_timer = QTimer(self)
+        self.reload_timer.setSingleShot(True)
+        self.reload_timer.setInterval(500)
+        cast(SignalLike, self.reload_timer.timeout).connect(self.reload_scene_action)
 
         self.load_settings()  # 这会设置self.i18n
+        self.scene_cache = SceneCache(self.scene_cache_mb * 1024 * 1024)
+        # 渲染结果缓存与语言无关，放在工作目录下的render_cache中
+        self.render_cache = RenderCache(os.path.join(os.getcwd(), "render_cache"),
+                                        self.render_cache_mb * 1024 * 1024)
         # output_views_dir应在i18n加载后设置
         self.output_views_dir = os.path.join(os.getcwd(), self.i18n.get("output_dir_name", "output_views"))
 
@@ -320,12 +500,45 @@ class PointCloudAnalyzerApp(QMainWindow):
         theme_name = self.settings.value("theme", "light")
         self.current_theme = MORANDI_DARK if theme_name == "dark" else MORANDI_LIGHT
         self.api_key_input_default = self.settings.value("api_key", "")
+        self.scene_cache_mb = int(self.settings.value("scene_cache_mb", DEFAULT_SCENE_CACHE_MB))
+        self.render_cache_mb = int(self.settings.value("render_cache_mb", DEFAULT_RENDER_CACHE_MB))
+        self.watch_scene_file = self.settings.value("watch_scene_file", "false") == "true"
+        self.send_scene_stats = self.settings.value("send_scene_stats", "true") == "true"
+        self.vlm_image_max_side = int(self.settings.value("vlm_image_max_side", DEFAULT_VLM_IMAGE_MAX_SIDE))
+        self.auto_analyze = self.settings.value("auto_analyze", "false") == "true"
+        self.progressive_views = self.settings.value("progressive_views", "true") == "true"
+        self.allow_preview_analysis = self.settings.value("allow_preview_analysis", "false") == "true"
+        self.hedge_requests = self.settings.value("hedge_requests", "false") == "true"
+        self.first_token_timeout_s = float(self.settings.value("first_token_timeout_s", DEFAULT_FIRST_TOKEN_TIMEOUT_S))
+        self.inter_token_timeout_s = float(self.settings.value("inter_token_timeout_s", DEFAULT_INTER_TOKEN_TIMEOUT_S))
+        self.latency_tracker = FirstTokenLatencyTracker(
+            percentile=float(self.settings.value("hedge_percentile", DEFAULT_HEDGE_PERCENTILE)))
+        self.class_schema_path = self.settings.value("class_schema_path", "")
+        if self.class_schema_path:
+            try:
+                set_active_class_schema(ClassSchema.from_file(self.class_schema_path))
+            except (OSError, ValueError) as e:
+                print(f"警告：无法加载类别方案，使用默认方案：{e}")
+                self.class_schema_path = ""
 
     def save_settings(self):
         self.settings.setValue("language", self.current_lang)
         self.settings.setValue("theme", "dark" if self.current_theme == MORANDI_DARK else "light")
         if hasattr(self, 'api_key_input'):
             self.settings.setValue("api_key", self.api_key_input.text())
+        self.settings.setValue("scene_cache_mb", self.scene_cache_mb)
+        self.settings.setValue("render_cache_mb", self.render_cache_mb)
+        self.settings.setValue("watch_scene_file", "true" if self.watch_scene_file else "false")
+        self.settings.setValue("send_scene_stats", "true" if self.send_scene_stats else "false")
+        self.settings.setValue("vlm_image_max_side", self.vlm_image_max_side)
+        self.settings.setValue("auto_analyze", "true" if self.auto_analyze else "false")
+        self.settings.setValue("progressive_views", "true" if self.progressive_views else "false")
+        self.settings.setValue("allow_preview_analysis", "true" if self.allow_preview_analysis else "false")
+        self.settings.setValue("hedge_requests", "true" if self.hedge_requests else "false")
+        self.settings.setValue("first_token_timeout_s", self.first_token_timeout_s)
+        self.settings.setValue("inter_token_timeout_s", self.inter_token_timeout_s)
+        self.settings.setValue("class_schema_path", self.class_schema_path)
+        self.settings.setValue("hedge_percentile", self.latency_tracker.percentile)
 
     def initUI(self):
         self.setGeometry(100, 100, 1200, 700)
@@ -354,12 +567,36 @@ class PointCloudAnalyzerApp(QMainWindow):
         # 原：self.dark_mode_button.clicked.connect(self.toggle_dark_mode)
         cast(SignalLike, self.dark_mode_button.clicked).connect(self.toggle_dark_mode)
         top_controls_layout.addWidget(self.dark_mode_button)
+        self.scene_cache_label = QLabel()
+        top_controls_layout.addWidget(self.scene_cache_label)
+        self.scene_cache_spin = QSpinBox()
+        self.scene_cache_spin.setRange(256, 65536)
+        self.scene_cache_spin.setSingleStep(256)
+        self.scene_cache_spin.setSuffix(" MB")
+        self.scene_cache_spin.setValue(self.scene_cache_mb)
+        cast(SignalLike, self.scene_cache_spin.valueChanged).connect(self.change_scene_cache_limit)
+        top_controls_layout.addWidget(self.scene_cache_spin)
+        self.render_cache_label = QLabel()
+        top_controls_layout.addWidget(self.render_cache_label)
+        self.render_cache_spin = QSpinBox()
+        self.render_cache_spin.setRange(64, 65536)
+        self.render_cache_spin.setSingleStep(256)
+        self.render_cache_spin.setSuffix(" MB")
+        self.render_cache_spin.setValue(self.render_cache_mb)
+        cast(SignalLike, self.render_cache_spin.valueChanged).connect(self.change_render_cache_limit)
+        top_controls_layout.addWidget(self.render_cache_spin)
         top_controls_layout.addStretch(1)
         main_layout.addLayout(top_controls_layout)
 
         self.splitter = QSplitter(Qt.Orientation.Horizontal)
         left_pane = QWidget()
         left_layout = QVBoxLayout(left_pane)
+        self.scene_list_label = QLabel()
+        left_layout.addWidget(self.scene_list_label)
+        self.scene_list = QListWidget()
+        self.scene_list.setMaximumHeight(110)
+        cast(SignalLike, self.scene_list.currentItemChanged).connect(self.scene_selected_action)
+        left_layout.addWidget(self.scene_list)
         self.view_tabs = QTabWidget()
 
         initial_2d_placeholder = self.i18n.get("views_placeholder", "Load a point cloud to generate views.")
@@ -380,6 +617,27 @@ class PointCloudAnalyzerApp(QMainWindow):
         self.view_tabs.addTab(self.front_view_label, "")
         self.view_tabs.addTab(self.side_view_label, "")
 
+        # 交互式2D视图：滚轮缩放、拖动平移、双击复位，按屏幕分辨率重新栅格化可见的点
+        self.explore_tab = QWidget()
+        explore_layout = QVBoxLayout(self.explore_tab)
+        explore_controls = QHBoxLayout()
+        self.explore_projection_combo = QComboBox()
+        for key in VIEW_PROJECTIONS:
+            self.explore_projection_combo.addItem("", key)
+        cast(SignalLike, self.explore_projection_combo.currentIndexChanged).connect(self.change_explore_projection)
+        explore_controls.addWidget(self.explore_projection_combo)
+        self.explore_reset_button = QPushButton()
+        explore_controls.addWidget(self.explore_reset_button)
+        self.explore_hint_label = QLabel()
+        explore_controls.addWidget(self.explore_hint_label, 1)
+        explore_layout.addLayout(explore_controls)
+        self.explore_view = PointCloudViewport()
+        cast(SignalLike, self.explore_view.projections_sorted).connect(self._on_projections_sorted)
+        self.explore_view.placeholder_text = initial_2d_placeholder
+        cast(SignalLike, self.explore_reset_button.clicked).connect(lambda checked=False: self.explore_view.reset_view())
+        explore_layout.addWidget(self.explore_view, 1)
+        self.view_tabs.addTab(self.explore_tab, "")
+
         self.threed_view_widget = QWidget()
         threed_view_layout = QVBoxLayout(self.threed_view_widget)
         threed_view_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -412,16 +670,101 @@ class PointCloudAnalyzerApp(QMainWindow):
         self.splitter.setSizes([self.width() // 2, self.width() // 2])
         main_layout.addWidget(self.splitter)
 
+        # 选项行：加载、渲染与分析相关的开关
+        options_layout = QHBoxLayout()
+        self.watch_file_checkbox = QCheckBox()
+        self.watch_file_checkbox.setChecked(self.watch_scene_file)
+        cast(SignalLike, self.watch_file_checkbox.toggled).connect(self.toggle_watch_scene_file)
+        options_layout.addWidget(self.watch_file_checkbox)
+        self.progressive_views_checkbox = QCheckBox()
+        self.progressive_views_checkbox.setChecked(self.progressive_views)
+        cast(SignalLike, self.progressive_views_checkbox.toggled).connect(self.toggle_progressive_views)
+        options_layout.addWidget(self.progressive_views_checkbox)
+        self.preview_analysis_checkbox = QCheckBox()
+        self.preview_analysis_checkbox.setChecked(self.allow_preview_analysis)
+        cast(SignalLike, self.preview_analysis_checkbox.toggled).connect(self.toggle_preview_analysis)
+        options_layout.addWidget(self.preview_analysis_checkbox)
+        self.auto_analyze_checkbox = QCheckBox()
+        self.auto_analyze_checkbox.setChecked(self.auto_analyze)
+        cast(SignalLike, self.auto_analyze_checkbox.toggled).connect(self.toggle_auto_analyze)
+        options_layout.addWidget(self.auto_analyze_checkbox)
+        self.scene_stats_checkbox = QCheckBox()
+        self.scene_stats_checkbox.setChecked(self.send_scene_stats)
+        cast(SignalLike, self.scene_stats_checkbox.toggled).connect(self.toggle_send_scene_stats)
+        options_layout.addWidget(self.scene_stats_checkbox)
+        self.vlm_image_size_label = QLabel()
+        options_layout.addWidget(self.vlm_image_size_label)
+        self.vlm_image_size_spin = QSpinBox()
+        self.vlm_image_size_spin.setRange(0, 4096)  # 0 = 原图
+        self.vlm_image_size_spin.setSingleStep(256)
+        self.vlm_image_size_spin.setSuffix(" px")
+        self.vlm_image_size_spin.setValue(self.vlm_image_max_side)
+        cast(SignalLike, self.vlm_image_size_spin.valueChanged).connect(self.change_vlm_image_size)
+        options_layout.addWidget(self.vlm_image_size_spin)
+        self.class_schema_label = QLabel()
+        options_layout.addWidget(self.class_schema_label)
+        self.class_schema_combo = QComboBox()
+        self._populate_class_schema_combo()
+        cast(SignalLike, self.class_schema_combo.currentIndexChanged).connect(self.change_class_schema)
+        options_layout.addWidget(self.class_schema_combo)
+        self.load_schema_button = QPushButton()
+        cast(SignalLike, self.load_schema_button.clicked).connect(self.load_class_schema_action)
+        options_layout.addWidget(self.load_schema_button)
+        options_layout.addStretch(1)
+        main_layout.addLayout(options_layout)
+
+        # VLM请求：超时与对冲
+        vlm_options_layout = QHBoxLayout()
+        self.first_token_timeout_label = QLabel()
+        vlm_options_layout.addWidget(self.first_token_timeout_label)
+        self.first_token_timeout_spin = QSpinBox()
+        self.first_token_timeout_spin.setRange(5, 600)
+        self.first_token_timeout_spin.setSuffix(" s")
+        self.first_token_timeout_spin.setValue(int(self.first_token_timeout_s))
+        cast(SignalLike, self.first_token_timeout_spin.valueChanged).connect(self.change_first_token_timeout)
+        vlm_options_layout.addWidget(self.first_token_timeout_spin)
+        self.inter_token_timeout_label = QLabel()
+        vlm_options_layout.addWidget(self.inter_token_timeout_label)
+        self.inter_token_timeout_spin = QSpinBox()
+        self.inter_token_timeout_spin.setRange(1, 300)
+        self.inter_token_timeout_spin.setSuffix(" s")
+        self.inter_token_timeout_spin.setValue(int(self.inter_token_timeout_s))
+        cast(SignalLike, self.inter_token_timeout_spin.valueChanged).connect(self.change_inter_token_timeout)
+        vlm_options_layout.addWidget(self.inter_token_timeout_spin)
+        self.hedge_checkbox = QCheckBox()
+        self.hedge_checkbox.setChecked(self.hedge_requests)
+        cast(SignalLike, self.hedge_checkbox.toggled).connect(self.toggle_hedge_requests)
+        vlm_options_layout.addWidget(self.hedge_checkbox)
+        self.hedge_percentile_label = QLabel()
+        vlm_options_layout.addWidget(self.hedge_percentile_label)
+        self.hedge_percentile_spin = QSpinBox()
+        self.hedge_percentile_spin.setRange(50, 99)
+        self.hedge_percentile_spin.setPrefix("P")
+        self.hedge_percentile_spin.setValue(int(self.latency_tracker.percentile))
+        self.hedge_percentile_spin.setEnabled(self.hedge_requests)
+        cast(SignalLike, self.hedge_percentile_spin.valueChanged).connect(self.change_hedge_percentile)
+        vlm_options_layout.addWidget(self.hedge_percentile_spin)
+        vlm_options_layout.addStretch(1)
+        main_layout.addLayout(vlm_options_layout)
+
         bottom_buttons_layout = QHBoxLayout()
         self.load_button = QPushButton()
         # 原：self.load_button.clicked.connect(self.load_point_cloud_action)
         cast(SignalLike, self.load_button.clicked).connect(self.load_point_cloud_action)
         bottom_buttons_layout.addWidget(self.load_button)
+        self.reload_button = QPushButton()
+        cast(SignalLike, self.reload_button.clicked).connect(self.reload_scene_action)
+        self.reload_button.setEnabled(False)
+        bottom_buttons_layout.addWidget(self.reload_button)
         self.analyze_button = QPushButton()
         # 原：self.analyze_button.clicked.connect(self.analyze_scene_action)
         cast(SignalLike, self.analyze_button.clicked).connect(self.analyze_scene_action)
         self.analyze_button.setEnabled(False)
         bottom_buttons_layout.addWidget(self.analyze_button)
+        self.cancel_analysis_button = QPushButton()
+        cast(SignalLike, self.cancel_analysis_button.clicked).connect(self.cancel_analysis_action)
+        self.cancel_analysis_button.setEnabled(False)
+        bottom_buttons_layout.addWidget(self.cancel_analysis_button)
         self.clear_button = QPushButton()
         # 原：self.clear_button.clicked.connect(self.clear_all_action)
         cast(SignalLike, self.clear_button.clicked).connect(self.clear_all_action)
@@ -437,6 +780,9 @@ class PointCloudAnalyzerApp(QMainWindow):
         self.setWindowTitle(self.i18n["window_title"])
         self.lang_label_widget.setText(self.i18n["language_select_label"])
         self.api_key_label.setText(self.i18n["api_key_label"])
+        self.scene_cache_label.setText(self.i18n["scene_cache_label"])
+        self.render_cache_label.setText(self.i18n["render_cache_label"])
+        self.scene_list_label.setText(self.i18n["scene_list_label"])
         if self.current_theme == MORANDI_LIGHT:
             self.dark_mode_button.setText(self.i18n["dark_mode_button"])
         else:
@@ -445,7 +791,15 @@ class PointCloudAnalyzerApp(QMainWindow):
         self.view_tabs.setTabText(0, self.i18n["top_view_name"])
         self.view_tabs.setTabText(1, self.i18n["front_view_name"])
         self.view_tabs.setTabText(2, self.i18n["side_view_name"])
-        self.view_tabs.setTabText(3, self.i18n["threed_view_tab_label"])
+        self.view_tabs.setTabText(3, self.i18n["explore_tab_label"])
+        self.view_tabs.setTabText(4, self.i18n["threed_view_tab_label"])
+        for index, key in enumerate(VIEW_PROJECTIONS):
+            self.explore_projection_combo.setItemText(index, self.i18n[VIEW_PROJECTIONS[key][2]])
+        self.explore_reset_button.setText(self.i18n["explore_reset_button"])
+        self.explore_hint_label.setText(self.i18n["explore_hint"])
+        self.explore_view.placeholder_text = self.i18n.get("views_placeholder", "")
+        self.explore_view.status_format = self.i18n["explore_status"]
+        self.explore_view.update()
 
         placeholder_2d_text = self.i18n.get("views_placeholder", "Load a point cloud to generate views.")
         if self.top_view_label.pixmap() is None or self.top_view_label.pixmap().isNull(): self.top_view_label.setText(
@@ -462,7 +816,23 @@ class PointCloudAnalyzerApp(QMainWindow):
 
         self.output_label.setText(self.i18n["output_label"])
         self.load_button.setText(self.i18n["load_button"])
+        self.reload_button.setText(self.i18n["reload_button"])
+        self.watch_file_checkbox.setText(self.i18n["watch_file_checkbox"])
         self.analyze_button.setText(self.i18n["analyze_button"])
+        self.scene_stats_checkbox.setText(self.i18n["scene_stats_checkbox"])
+        self.auto_analyze_checkbox.setText(self.i18n["auto_analyze_checkbox"])
+        self.cancel_analysis_button.setText(self.i18n["cancel_analysis_button"])
+        self.hedge_checkbox.setText(self.i18n["hedge_checkbox"])
+        self.first_token_timeout_label.setText(self.i18n["first_token_timeout_label"])
+        self.inter_token_timeout_label.setText(self.i18n["inter_token_timeout_label"])
+        self.hedge_percentile_label.setText(self.i18n["hedge_percentile_label"])
+        self.progressive_views_checkbox.setText(self.i18n["progressive_views_checkbox"])
+        self.preview_analysis_checkbox.setText(self.i18n["preview_analysis_checkbox"])
+        self.vlm_image_size_label.setText(self.i18n["vlm_image_size_label"])
+        self.class_schema_label.setText(self.i18n["class_schema_label"])
+        self.class_schema_combo.setItemText(0, self.i18n["class_schema_default"].format(count=len(DEFAULT_CLASS_SCHEMA)))
+        self.load_schema_button.setText(self.i18n["load_schema_button"])
+        self.vlm_image_size_spin.setSpecialValueText(self.i18n["vlm_image_size_original"])
         self.clear_button.setText(self.i18n["clear_button"])
 
         # 更新状态栏文本，如果当前显示的是通用的“准备就绪”消息
@@ -616,6 +986,7 @@ class PointCloudAnalyzerApp(QMainWindow):
         if hasattr(self, 'top_view_label'): self.top_view_label.update()
         if hasattr(self, 'front_view_label'): self.front_view_label.update()
         if hasattr(self, 'side_view_label'): self.side_view_label.update()
+        if hasattr(self, 'explore_view'): self.explore_view.refresh()  # 背景色随主题变化
         if hasattr(self, 'threed_view_widget'):
             self.threed_view_widget.setStyleSheet(f"background-color: {self.current_theme['bg_alt']}")
             self.threed_placeholder_label.setPalette(palette)  # ensure text color updates
@@ -632,61 +1003,421 @@ class PointCloudAnalyzerApp(QMainWindow):
         file_path, _ = QFileDialog.getOpenFileName(self, self.i18n["load_button"], "",
                                                    "Text Files (*.txt)All Files (*)")
         if file_path:
-            self.point_cloud_file = file_path
-            self.statusBar().showMessage(
-                self.i18n["status_loading_file"].format(file_path=os.path.basename(file_path)))
-            QApplication.processEvents()
+            # 通过按钮加载总是重新解析文件；在场景列表中切换则优先使用缓存
+            self._open_scene(file_path, force_reload=True)
+
+    def _populate_class_schema_combo(self):
+        # 第一项为默认方案（数据为空字符串），其后为schemas目录中的方案和用户加载过的方案
+        self.class_schema_combo.blockSignals(True)
+        self.class_schema_combo.clear()
+        self.class_schema_combo.addItem(self.i18n["class_schema_default"].format(count=len(DEFAULT_CLASS_SCHEMA)), "")
+        paths = bundled_schema_paths()
+        if self.class_schema_path and self.class_schema_path not in paths:
+            paths.append(self.class_schema_path)
+        for path in paths:
+            self.class_schema_combo.addItem(os.path.splitext(os.path.basename(path))[0], path)
+            self.class_schema_combo.setItemData(self.class_schema_combo.count() - 1, path,
+                                                Qt.ItemDataRole.ToolTipRole)
+        self.class_schema_combo.setCurrentIndex(max(self.class_schema_combo.findData(self.class_schema_path), 0))
+        self.class_schema_combo.blockSignals(False)
+
+    def load_class_schema_action(self, checked: bool = False):
+        file_path, _ = QFileDialog.getOpenFileName(self, self.i18n["load_schema_button"], "",
+                                                   "JSON Files (*.json);;All Files (*)")
+        if not file_path:
+            return
+        index = self.class_schema_combo.findData(file_path)
+        if index < 0:
+            self.class_schema_combo.addItem(os.path.splitext(os.path.basename(file_path))[0], file_path)
+            index = self.class_schema_combo.count() - 1
+        if index == self.class_schema_combo.currentIndex():
+            self.change_class_schema(index)  # 重新读取已修改的方案文件
+        else:
+            self.class_schema_combo.setCurrentIndex(index)
+
+    def change_class_schema(self, index: int):
+        path = self.class_schema_combo.itemData(index) or ""
+        if self.analyzing_scene is not None:
+            # 分析过程中视图不能变化
+            self._populate_class_schema_combo()
+            self.statusBar().showMessage(self.i18n["status_schema_busy"])
+            return
+        try:
+            schema = ClassSchema.from_file(path) if path else None
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, self.i18n["error_title"], self.i18n["error_loading_schema"].format(error=str(e)))
+            self._populate_class_schema_combo()
+            return
+        set_active_class_schema(schema)
+        self.class_schema_path = path
+        self.save_settings()
+        self._rerender_scene_views()
+        schema = active_class_schema()
+        self.statusBar().showMessage(self.i18n["status_schema_changed"].format(name=schema.title, count=len(schema)))
+
+    def _rerender_scene_views(self):
+        # 视图颜色和图例随方案变化：其他场景在下次打开时重新渲染，当前场景在后台立即重新渲染
+        current = self.current_scene if self.current_scene is not None and self.current_scene.is_loaded() else None
+        for entry in self.scenes.values():
+            if entry.render_worker is not None:
+                entry.render_worker.cancel()
+                entry.render_worker = None
+            entry.view_renderer = None
+            entry.projections.clear()  # 交互视图的颜色同样随方案变化
+            if entry is not current:
+                entry.view_paths = {}
+                entry.pixmaps = {}
+                entry.views_are_preview = False
+        if current is None:
+            return
+        # 旧视图继续显示，新视图渲染完成后逐个替换；完成前与预览一样，分析需等待
+        current.views_are_preview = True
+        self._activate_scene(current)
+        self._start_full_render(current)
 
-            progress_text = self.i18n["status_generating_views"]
-            progress = QProgressDialog(progress_text, self.i18n.get("cancel_button", "Cancel"), 0, 0, self)
-            progress.setWindowModality(Qt.WindowModality.WindowModal)
-            progress.setWindowTitle(self.i18n.get("progress_title", "Processing"))
-            progress.show()
-            QApplication.processEvents()
+    def toggle_progressive_views(self, checked: bool):
+        self.progressive_views = checked
+        self.save_settings()
 
-            try:
-                _x, _y, _z, labels_data, _intensity_data, points_for_3d = load_point_cloud(self.point_cloud_file)
-                self.loaded_point_cloud_data_for_3d = (points_for_3d, labels_data)  # Store for 3D viewer
+    def toggle_preview_analysis(self, checked: bool):
+        self.allow_preview_analysis = checked
+        self.save_settings()
 
-                # 检查是否加载了点以进行3D视图
-                can_launch_3d = points_for_3d is not None and points_for_3d.size > 0
-                self.launch_3d_button.setEnabled(can_launch_3d)
+    def toggle_hedge_requests(self, checked: bool):
+        self.hedge_requests = checked
+        self.hedge_percentile_spin.setEnabled(checked)
+        self.save_settings()
 
-                # 生成2D视图。 render_point_cloud_views现在处理空的labels_data。
-                self.generated_view_paths = render_point_cloud_views(
-                    self.point_cloud_file, self.output_views_dir, self.i18n
-                )
-                self._load_and_display_original_views()
-
-                # 仅当实际生成了2D视图时启用分析按钮
-                can_analyze = bool(self.generated_view_paths)
-                self.analyze_button.setEnabled(can_analyze)
-
-                if can_analyze:  # 生成了2D视图
-                    status_msg = self.i18n["status_views_generated"]
-                elif can_launch_3d:  # 没有2D视图，但有3D数据
-                    status_msg = self.i18n["status_views_skipped"]
-                else:  # 没有2D视图和3D数据（应由load_point_cloud错误捕获）
-                    status_msg = self.i18n["status_ready"]  # 或更具体的错误状态
+    def change_first_token_timeout(self, value: int):
+        self.first_token_timeout_s = float(value)
+        self.save_settings()
 
-                progress.close()
-                self.api_output_text.clear()
-                self.raw_vlm_output_buffer = ""
-                self.statusBar().showMessage(status_msg)
+    def change_inter_token_timeout(self, value: int):
+        self.inter_token_timeout_s = float(value)
+        self.save_settings()
+
+    def change_hedge_percentile(self, value: int):
+        self.latency_tracker.percentile = value  # 下一次请求按新的百分位计算对冲延迟
+        self.save_settings()
+
+    def cancel_analysis_action(self, checked: bool = False):
+        if self.api_worker is not None and self.api_worker.isRunning():
+            self.api_worker.cancel()
+            self.cancel_analysis_button.setEnabled(False)
 
-            except ValueError as ve:
+    def toggle_auto_analyze(self, checked: bool):
+        self.auto_analyze = checked
+        self.save_settings()
+
+    def toggle_send_scene_stats(self, checked: bool):
+        self.send_scene_stats = checked
+        self.save_settings()
+
+    def change_vlm_image_size(self, value: int):
+        self.vlm_image_max_side = value
+        self.save_settings()
+
+    def change_scene_cache_limit(self, value: int):
+        self.scene_cache_mb = value
+        self.scene_cache.set_max_bytes(value * 1024 * 1024)
+        self.save_settings()
+
+    def change_render_cache_limit(self, value: int):
+        self.render_cache_mb = value
+        self.render_cache.set_max_bytes(value * 1024 * 1024)
+        self.save_settings()
+
+    def scene_selected_action(self, current, previous=None):
+        if current is None:
+            return
+        file_path = current.data(Qt.ItemDataRole.UserRole)
+        if self.current_scene is not None and file_path == self.current_scene.file_path:
+            return
+        self._open_scene(file_path)
+
+    def _scene_output_dir(self, file_path):
+        return scene_output_dir(self.output_views_dir, file_path)
+
+    def _select_scene_item(self, file_path):
+        self.scene_list.blockSignals(True)
+        try:
+            for row in range(self.scene_list.count()):
+                item = self.scene_list.item(row)
+                if item.data(Qt.ItemDataRole.UserRole) == file_path:
+                    self.scene_list.setCurrentRow(row)
+                    break
+            else:
+                self.scene_list.setCurrentRow(-1)
+        finally:
+            self.scene_list.blockSignals(False)
+
+    def _remove_scene(self, entry):
+        self.scene_cache.discard(entry)
+        self.scenes.pop(entry.file_path, None)
+        for row in range(self.scene_list.count()):
+            if self.scene_list.item(row).data(Qt.ItemDataRole.UserRole) == entry.file_path:
+                self.scene_list.blockSignals(True)
+                self.scene_list.takeItem(row)
+                self.scene_list.blockSignals(False)
+                break
+        if self.current_scene is entry:
+            self.current_scene = None
+
+    def _open_scene(self, file_path, force_reload=False):
+        file_path = os.path.abspath(file_path)
+        entry = self.scenes.get(file_path)
+        if entry is None:
+            entry = SceneEntry(file_path, self._scene_output_dir(file_path))
+            self.scenes[file_path] = entry
+            item = QListWidgetItem(os.path.basename(file_path))
+            item.setToolTip(file_path)
+            item.setData(Qt.ItemDataRole.UserRole, file_path)
+            self.scene_list.blockSignals(True)
+            self.scene_list.addItem(item)
+            self.scene_list.blockSignals(False)
+        elif force_reload:
+            entry.release()
+            entry.view_paths = {}
+            entry.analysis_text = ""
+
+        views_on_disk = (bool(entry.view_paths) and not entry.views_are_preview
+                         and all(os.path.exists(p) for p in entry.view_paths.values()))
+        if entry.is_loaded() and views_on_disk:
+            # 最近使用过的场景：数组与视图都还在内存中，直接切换
+            self._activate_scene(entry)
+            self.statusBar().showMessage(
+                self.i18n["status_scene_switched"].format(file_path=os.path.basename(file_path)))
+            return
+
+        self.statusBar().showMessage(
+            self.i18n["status_loading_file"].format(file_path=os.path.basename(file_path)))
+        QApplication.processEvents()
+
+        progress_text = self.i18n["status_generating_views"]
+        progress = QProgressDialog(progress_text, self.i18n.get("cancel_button", "Cancel"), 0, 0, self)
+        progress.setWindowModality(Qt.WindowModality.WindowModal)
+        progress.setWindowTitle(self.i18n.get("progress_title", "Processing"))
+        progress.show()
+        QApplication.processEvents()
+
+        try:
+            if not entry.is_loaded():
+                entry.reader = PointCloudFileReader(file_path)
+                entry.cloud = load_point_cloud(file_path, reader=entry.reader)
+                entry.statistics = compute_scene_statistics(entry.cloud[5], entry.cloud[3])
+            if not views_on_disk and self.auto_analyze and self.api_key_input.text():
+                # 自动分析：视图由流水线工作线程渲染，逐个显示
                 progress.close()
-                QMessageBox.critical(self, self.i18n["error_title"],
-                                     self.i18n["error_loading_point_cloud"].format(error=str(ve)))
-                self.statusBar().showMessage(self.i18n["status_ready"])
-                self.clear_all_action()  # 清除状态并禁用按钮
-            except Exception as e:
+                entry.view_paths = {}
+                entry.pixmaps = {}
+                self._activate_scene(entry)
+                self._start_pipelined_analysis(entry)
+                return
+            if not views_on_disk and self.progressive_views and entry.cloud[3].size > PREVIEW_MAX_POINTS:
+                # 大场景：先同步渲染抽稀的低分辨率预览，全分辨率视图在后台渲染后逐个替换
+                entry.view_paths = render_point_cloud_views(file_path, entry.output_dir, self.i18n, cloud=entry.cloud,
+                                                            render_cache=self.render_cache, preview=True)
+                entry.views_are_preview = True
+                entry.pixmaps = {}
                 progress.close()
-                QMessageBox.critical(self, self.i18n["error_title"],
-                                     self.i18n.get("error_processing_file",
-                                                   "Error processing file: {error}").format(error=str(e)))
-                self.statusBar().showMessage(self.i18n["status_ready"])
-                self.clear_all_action()
+                self._activate_scene(entry)
+                self._start_full_render(entry)
+                self.statusBar().showMessage(self.i18n["status_preview_shown"])
+                return
+            if not views_on_disk:
+                # 生成2D视图。 render_point_cloud_views现在处理空的labels_data。
+                entry.view_paths = render_point_cloud_views(file_path, entry.output_dir, self.i18n, cloud=entry.cloud,
+                                                            render_cache=self.render_cache,
+                                                            data_digest=entry.content_digest(entry.cloud))
+                entry.views_are_preview = False
+                entry.pixmaps = {}
+            progress.close()
+            self._activate_scene(entry)
+
+        except ValueError as ve:
+            progress.close()
+            self._remove_scene(entry)
+            QMessageBox.critical(self, self.i18n["error_title"],
+                                 self.i18n["error_loading_point_cloud"].format(error=str(ve)))
+            self.statusBar().showMessage(self.i18n["status_ready"])
+            self.clear_all_action()  # 清除状态并禁用按钮
+        except Exception as e:
+            progress.close()
+            self._remove_scene(entry)
+            QMessageBox.critical(self, self.i18n["error_title"],
+                                 self.i18n.get("error_processing_file",
+                                               "Error processing file: {error}").format(error=str(e)))
+            self.statusBar().showMessage(self.i18n["status_ready"])
+            self.clear_all_action()
+
+    def _start_full_render(self, entry, start=None):
+        # start不为None时由entry.view_renderer增量更新视图（下标start之前的点未变）
+        if entry.render_worker is not None:
+            entry.render_worker.cancel()  # 后台渲染的是旧数据
+        worker = ViewRenderWorker(entry.file_path, entry.cloud, entry.output_dir, self.i18n,
+                                  render_cache=self.render_cache, content_digest=entry.content_digest,
+                                  view_renderer=entry.view_renderer if start is not None else None,
+                                  start=start or 0)
+        entry.render_worker = worker
+        cast(SignalLike, worker.view_ready).connect(
+            lambda key, path, e=entry, w=worker: self.on_full_view_ready(e, w, key, path))
+        cast(SignalLike, worker.finished).connect(lambda e=entry, w=worker: self.on_full_render_finished(e, w))
+        worker.start()
+
+    def on_full_view_ready(self, entry, worker, key, path):
+        if entry.render_worker is not worker or worker.cancel_event.is_set():
+            return  # 已被新的加载或重新渲染取代
+        # 换成新字典而不原地修改：已交给分析线程的路径字典保持不变
+        entry.view_paths = {**entry.view_paths, key: path}
+        if entry is self.current_scene:
+            self.generated_view_paths = entry.view_paths
+            self._display_view(key, path)
+        else:
+            entry.pixmaps.pop(key, None)
+
+    def on_full_render_finished(self, entry, worker):
+        if entry.render_worker is not worker:
+            return
+        entry.render_worker = None
+        if worker.cancel_event.is_set():
+            return
+        entry.views_are_preview = False
+        self.scene_cache.touch(entry)  # 全分辨率位图替换了预览，重新计算占用
+        if entry is self.current_scene:
+            self.statusBar().showMessage(self.i18n["status_views_generated"])
+
+    def toggle_watch_scene_file(self, checked: bool):
+        self.watch_scene_file = checked
+        self._update_file_watcher()
+        self.save_settings()
+        if checked:
+            self.reload_timer.start()  # 开启时先补上期间追加的内容
+
+    def _update_file_watcher(self):
+        watched = self.file_watcher.files() + self.file_watcher.directories()
+        if watched:
+            self.file_watcher.removePaths(watched)
+        if self.watch_scene_file and self.current_scene is not None and os.path.exists(
+                self.current_scene.file_path):
+            self.file_watcher.addPath(self.current_scene.file_path)
+            # 标签修正写入.labels覆盖文件而不改动场景文本，同样需要监视
+            labels_path = overlay_path(self.current_scene.file_path)
+            if os.path.exists(labels_path):
+                self.file_watcher.addPath(labels_path)
+            else:
+                # 覆盖文件尚不存在：监视所在目录，以便发现之后新建的覆盖文件
+                self.file_watcher.addPath(os.path.dirname(os.path.abspath(self.current_scene.file_path)))
+
+    def _on_scene_file_changed(self, path):
+        # 文件被替换（先写临时文件再改名）后监视会失效，需要重新添加
+        if path not in self.file_watcher.files() and os.path.exists(path):
+            self.file_watcher.addPath(path)
+        self.reload_timer.start()
+
+    def _on_scene_dir_changed(self, path):
+        if self.current_scene is not None and os.path.exists(overlay_path(self.current_scene.file_path)):
+            self._update_file_watcher()  # 改为直接监视新建的覆盖文件
+            self.reload_timer.start()
+
+    def reload_scene_action(self, checked: bool = False):
+        entry = self.current_scene
+        if entry is None:
+            return
+        if self.analyzing_scene is not None:
+            self.reload_timer.start()  # 分析期间视图不能变化，稍后再试
+            return
+        if entry.reader is None:
+            # 场景已被缓存释放，只能完整加载
+            self._open_scene(entry.file_path)
+            return
+        if entry.render_worker is not None and entry.render_worker.view_renderer is not None:
+            # 上次追加的点仍在后台绘制（画布不能同时更新），完成后再读取这期间追加的内容
+            self.reload_timer.start()
+            return
+        try:
+            previous_count = entry.cloud[3].size
+            status, start = entry.reader.refresh()
+            if status == 'unchanged':
+                return
+            entry.cloud = entry.reader.cloud()
+            entry.statistics = compute_scene_statistics(entry.cloud[5], entry.cloud[3])
+            if status == 'reloaded':
+                entry.view_renderer = None
+                if self.progressive_views and entry.cloud[3].size > PREVIEW_MAX_POINTS:
+                    # 与打开大场景相同：先同步渲染抽稀的预览，全分辨率视图在后台渲染
+                    entry.view_paths = render_point_cloud_views(entry.file_path, entry.output_dir, self.i18n,
+                                                                cloud=entry.cloud, render_cache=self.render_cache,
+                                                                preview=True)
+                    entry.pixmaps = {}
+                status_msg = self.i18n["status_scene_reloaded"]
+            else:
+                if entry.view_renderer is None:
+                    entry.view_renderer = IncrementalViewRenderer(entry.output_dir, self.i18n)
+                status_msg = self.i18n["status_scene_appended"].format(count=entry.cloud[3].size - previous_count)
+        except Exception as e:
+            # 读取到一半的文件、或被删除的文件：保留现有数据，等待下次变更
+            print(f"增量重新加载失败：{e}")
+            self.statusBar().showMessage(self.i18n["error_loading_point_cloud"].format(error=str(e)))
+            return
+        # 旧视图（或预览）继续显示，后台绘制完成后逐个替换；完成前与预览一样，分析需等待
+        entry.views_are_preview = True
+        # 追加时start之前的行未变，交互视图的排序结果只需并入新行
+        self._activate_scene(entry, unchanged_rows=start if status == 'appended' else 0)
+        self._start_full_render(entry, start=start if status == 'appended' else None)
+        self.statusBar().showMessage(status_msg)
+
+    def _activate_scene(self, entry, unchanged_rows=None):
+        # 同一场景（如增量重新加载后）保留交互视图的缩放和位置
+        self.explore_view.set_cloud(entry.cloud, reset_view=entry is not self.current_scene,
+                                    projections=entry.projections, unchanged_rows=unchanged_rows)
+        self.current_scene = entry
+        self.point_cloud_file = entry.file_path
+        _x, _y, _z, labels_data, _intensity_data, points_for_3d = entry.cloud
+        self.loaded_point_cloud_data_for_3d = (points_for_3d, labels_data)  # Store for 3D viewer
+
+        # 检查是否加载了点以进行3D视图
+        can_launch_3d = points_for_3d is not None and points_for_3d.size > 0
+        self.launch_3d_button.setEnabled(can_launch_3d)
+
+        self.generated_view_paths = entry.view_paths
+        self.original_pixmaps = entry.pixmaps  # 与场景共享，位图只解码一次
+        if self.original_pixmaps:
+            self._rescale_view_pixmaps()
+        else:
+            self._load_and_display_original_views()
+        self.scene_cache.touch(entry)  # 位图就绪后再计入内存预算
+        self._select_scene_item(entry.file_path)
+        self.reload_button.setEnabled(True)
+        self._update_file_watcher()
+
+        # 仅当实际生成了2D视图时启用分析按钮
+        can_analyze = bool(self.generated_view_paths)
+        self.analyze_button.setEnabled(can_analyze)
+
+        if can_analyze:  # 生成了2D视图
+            status_msg = self.i18n["status_views_generated"]
+        elif can_launch_3d:  # 没有2D视图，但有3D数据
+            status_msg = self.i18n["status_views_skipped"]
+        else:  # 没有2D视图和3D数据（应由load_point_cloud错误捕获）
+            status_msg = self.i18n["status_ready"]  # 或更具体的错误状态
+
+        # 恢复该场景之前的分析结果
+        self.raw_vlm_output_buffer = entry.analysis_text
+        if entry.analysis_text:
+            self.api_output_text.setMarkdown(entry.analysis_text)
+        else:
+            self.api_output_text.clear()
+        self.statusBar().showMessage(status_msg)
+
+    def change_explore_projection(self, index: int):
+        key = self.explore_projection_combo.itemData(index)
+        if key:
+            self.explore_view.set_projection(key)
+
+    def _on_projections_sorted(self):
+        # 排序结果计入当前场景的内存占用，按新的大小重新检查缓存预算
+        if self.current_scene is not None:
+            self.scene_cache.touch(self.current_scene)
 
     def launch_3d_viewer_action(self, checked: bool = False):
         if not self.loaded_point_cloud_data_for_3d or \
@@ -702,20 +1433,18 @@ class PointCloudAnalyzerApp(QMainWindow):
             pcd = o3d.geometry.PointCloud()
             pcd.points = o3d.utility.Vector3dVector(points)
 
+            schema = active_class_schema()
+            default_color_rgb = QColor(schema.fallback_class()[1]).getRgbF()[:3]
             if labels is not None and labels.size > 0:  # 检查标签数组是否不为空
-                label_colors_int_keys = {int(k): QColor(v[1]).getRgbF()[:3] for k, v in LABEL_COLORS.items()}
-                default_color_rgb = QColor(LABEL_COLORS[0][1]).getRgbF()[:3] if 0 in LABEL_COLORS else (0.5, 0.5, 0.5)
-
                 # 确保标签数组长度与点数组相同（如果用于着色）
                 if len(labels) == len(points):
-                    colors = np.array([label_colors_int_keys.get(label, default_color_rgb) for label in labels])
-                    pcd.colors = o3d.utility.Vector3dVector(colors)
+                    # 一次查表得到所有点的颜色，未知标签使用方案中的未知类颜色
+                    pcd.colors = o3d.utility.Vector3dVector(schema.colors_rgb(labels))
                 else:
                     print(
                         f"警告: 点数 ({len(points)}) 与标签数 ({len(labels)}) 不匹配。使用默认颜色进行3D视图。")
                     pcd.paint_uniform_color(default_color_rgb)
             else:
-                default_color_rgb = QColor(LABEL_COLORS[0][1]).getRgbF()[:3] if 0 in LABEL_COLORS else (0.5, 0.5, 0.5)
                 pcd.paint_uniform_color(default_color_rgb)
 
             vis = o3d.visualization.Visualizer()
@@ -735,47 +1464,59 @@ class PointCloudAnalyzerApp(QMainWindow):
             import traceback
             traceback.print_exc()
 
-    def _load_and_display_original_views(self):
-        self.original_pixmaps.clear()
+    def _view_label_widget(self, key):
+        return {'top': self.top_view_label, 'front': self.front_view_label, 'side': self.side_view_label}.get(key)
+
+    def _display_view(self, key, path):
+        label_widget = self._view_label_widget(key)
+        if label_widget is None:
+            return
         placeholder_text = self.i18n.get("views_placeholder", "View not available.")
         error_img_text = self.i18n.get("error_loading_image", "Error loading image.")
-        paths_and_labels = [(self.generated_view_paths.get('top'), self.top_view_label, 'top'),
-                            (self.generated_view_paths.get('front'), self.front_view_label, 'front'),
-                            (self.generated_view_paths.get('side'), self.side_view_label, 'side')]
-        for path, label_widget, key in paths_and_labels:
-            if path and os.path.exists(path):  # Added os.path.exists for safety
-                pixmap = QPixmap(path)
-                if not pixmap.isNull():
-                    self.original_pixmaps[key] = pixmap
-                    label_widget.setPixmap(pixmap.scaled(label_widget.size(), Qt.AspectRatioMode.KeepAspectRatio,
-                                                         Qt.TransformationMode.SmoothTransformation))
-                else:
-                    label_widget.setPixmap(QPixmap())
-                    label_widget.setText(error_img_text + f"\nPath: {path}")
+        self.original_pixmaps.pop(key, None)
+        if path and os.path.exists(path):  # Added os.path.exists for safety
+            pixmap = QPixmap(path)
+            if not pixmap.isNull():
+                self.original_pixmaps[key] = pixmap
+                label_widget.setPixmap(pixmap.scaled(label_widget.size(), Qt.AspectRatioMode.KeepAspectRatio,
+                                                     Qt.TransformationMode.SmoothTransformation))
             else:
                 label_widget.setPixmap(QPixmap())
-                label_widget.setText(placeholder_text)
+                label_widget.setText(error_img_text + f"\nPath: {path}")
+        else:
+            label_widget.setPixmap(QPixmap())
+            label_widget.setText(placeholder_text)
+
+    def _load_and_display_original_views(self):
+        self.original_pixmaps.clear()
+        for key in ('top', 'front', 'side'):
+            self._display_view(key, self.generated_view_paths.get(key))
         # self.apply_theme() # Called by caller or implicitly by other UI updates avoid redundant calls if possible
 
     def resizeEvent(self, event):  # 窗口大小变化时缩放图片
         super().resizeEvent(event)
+        self._rescale_view_pixmaps()
+
+    def _rescale_view_pixmaps(self):
         for key, pixmap in self.original_pixmaps.items():
-            if key == 'top':
-                label_widget = self.top_view_label
-            elif key == 'front':
-                label_widget = self.front_view_label
-            elif key == 'side':
-                label_widget = self.side_view_label
-            else:
+            label_widget = self._view_label_widget(key)
+            if label_widget is None:
                 continue
             if not pixmap.isNull() and label_widget.width() > 0 and label_widget.height() > 0:  # 检查控件尺寸
                 label_widget.setPixmap(pixmap.scaled(label_widget.size(), Qt.AspectRatioMode.KeepAspectRatio,
                                                      Qt.TransformationMode.SmoothTransformation))
 
+    def _analysis_prompts(self, entry):
+        system_prompt = self.i18n["system_prompt"]  # Use self.i18n for current language prompts
+        user_prompt = self.i18n["user_prompt"]
+        if self.send_scene_stats and entry is not None and entry.statistics:
+            # 用文本统计补充计数和布局信息，图片可以小得多
+            user_prompt += "\n\n" + format_scene_statistics(entry.statistics, self.i18n)
+        return system_prompt, user_prompt
+
     def analyze_scene_action(self, checked: bool = False):
         if not self.generated_view_paths:  # 检查字典是否为空
-            QMessageBox.warning(self, self.i18n["error_title"], self.i18n.get("error_no_2d_views_for_vlm",
-                                                                              "No 2D views available for VLM analysis. Please ensure point cloud has labels/data and views were generated."))
+            QMessageBox.warning(self, self.i18n["error_title"], self.i18n["error_no_2d_views_for_vlm"])
             return
         # 还要检查original_pixmaps是否已填充，意味着图像已加载。
         # 这个检查在generated_view_paths不为空且_load_and_display_original_views正常工作时大多是多余的。
@@ -784,25 +1525,63 @@ class PointCloudAnalyzerApp(QMainWindow):
                                                                               "No images loaded to analyze. Please check view generation."))
             return
 
+        if self.current_scene is not None and self.current_scene.views_are_preview and not self.allow_preview_analysis:
+            QMessageBox.warning(self, self.i18n["error_title"], self.i18n["error_views_still_rendering"])
+            return
+
         api_key = self.api_key_input.text()
         if not api_key:
             QMessageBox.warning(self, self.i18n["error_title"], self.i18n["error_no_api_key"])
             return
 
+        system_prompt, user_prompt = self._analysis_prompts(self.current_scene)
+        self._start_api_worker(ApiWorker(api_key, dict(self.generated_view_paths), system_prompt, user_prompt,
+                                         **self._api_worker_options()))
         self.statusBar().showMessage(self.i18n["status_analyzing"])
+
+    def _start_pipelined_analysis(self, entry):
+        # 视图边渲染边上传，最后一张上传完成即发起模型请求
+        system_prompt, user_prompt = self._analysis_prompts(entry)
+        worker = PipelinedAnalysisWorker(self.api_key_input.text(), entry.cloud, entry.output_dir, self.i18n,
+                                         system_prompt, user_prompt, render_cache=self.render_cache,
+                                         content_digest=entry.content_digest, **self._api_worker_options())
+        worker.view_ready.connect(self.on_pipeline_view_ready)
+        self._start_api_worker(worker)
+        self.statusBar().showMessage(self.i18n["status_pipeline_rendering"])
+
+    def _api_worker_options(self):
+        return {"upload_cache": self.upload_cache, "image_max_side": self.vlm_image_max_side,
+                "first_token_timeout_s": self.first_token_timeout_s,
+                "inter_token_timeout_s": self.inter_token_timeout_s,
+                "latency_tracker": self.latency_tracker, "hedge": self.hedge_requests}
+
+    def _start_api_worker(self, worker):
         self.api_output_text.clear()
         self.raw_vlm_output_buffer = ""
         self.analyze_button.setEnabled(False)
         self.load_button.setEnabled(False)
+        self.reload_button.setEnabled(False)
         self.clear_button.setEnabled(False)
-        system_prompt = self.i18n["system_prompt"]  # Use self.i18n for current language prompts
-        user_prompt = self.i18n["user_prompt"]
-        self.api_worker = ApiWorker(api_key, self.generated_view_paths, system_prompt, user_prompt)
+        self.scene_list.setEnabled(False)  # 分析期间不允许切换场景
+        self.cancel_analysis_button.setEnabled(True)
+        self.analyzing_scene = self.current_scene
+        self.last_vlm_metrics = None
+        self.api_worker = worker
         self.api_worker.result_ready.connect(self.append_api_result)
+        self.api_worker.metrics_ready.connect(self.on_api_metrics)
         self.api_worker.error_occurred.connect(self.handle_api_error)
         self.api_worker.finished.connect(self.on_api_finished)
         self.api_worker.start()
 
+    def on_pipeline_view_ready(self, key, path):
+        entry = self.analyzing_scene
+        if entry is None:
+            return
+        entry.view_paths = {**entry.view_paths, key: path}  # 同on_full_view_ready，不原地修改
+        if entry is self.current_scene:
+            self.generated_view_paths = entry.view_paths
+            self._display_view(key, path)
+
     def consolidate_vlm_output(self, text_input: str) -> str:
         if not text_input: return ""
         text = text_input.strip()
@@ -818,6 +1597,9 @@ class PointCloudAnalyzerApp(QMainWindow):
         self.api_output_text.moveCursor(QTextCursor.MoveOperation.End)
         self.statusBar().showMessage(self.i18n["status_analysis_partial"])
 
+    def on_api_metrics(self, metrics):
+        self.last_vlm_metrics = metrics
+
     def handle_api_error(self, error_message):
         QMessageBox.critical(self, self.i18n["error_title"], error_message)
         # 如果有部分输出，显示格式化后的内容
@@ -832,19 +1614,38 @@ class PointCloudAnalyzerApp(QMainWindow):
         # 根据当前状态重新启用按钮
         self.load_button.setEnabled(True)
         self.clear_button.setEnabled(True)
+        self.scene_list.setEnabled(True)
+        self.reload_button.setEnabled(self.current_scene is not None)
+        self.cancel_analysis_button.setEnabled(False)
         self.analyze_button.setEnabled(bool(self.generated_view_paths))  # 仅当视图仍有效时
 
     def on_api_finished(self):
         final_text = self.consolidate_vlm_output(self.raw_vlm_output_buffer)
         self.api_output_text.setMarkdown(final_text)  # 设置最终格式化文本
         self.api_output_text.moveCursor(QTextCursor.MoveOperation.End)
+        if self.analyzing_scene is not None:
+            # 只保存完整的结果（metrics仅在流正常结束时发出）；取消、超时或出错时的半截文本不作为该场景的分析结果
+            if final_text and self.last_vlm_metrics is not None:
+                self.analyzing_scene.analysis_text = final_text  # 切回该场景时恢复
+            self.scene_cache.touch(self.analyzing_scene)  # 流水线模式下位图在分析过程中才加载
+        self.analyzing_scene = None
 
         self.analyze_button.setEnabled(bool(self.generated_view_paths))
         self.load_button.setEnabled(True)
         self.clear_button.setEnabled(True)
+        self.scene_list.setEnabled(True)
+        self.reload_button.setEnabled(self.current_scene is not None)
+        self.cancel_analysis_button.setEnabled(False)
 
-        if not self.api_output_text.toPlainText().strip():  # 检查输出区域是否为空
+        if self.api_worker is not None and self.api_worker.was_cancelled():
+            self.statusBar().showMessage(self.i18n["status_analysis_cancelled"])
+        elif not self.api_output_text.toPlainText().strip():  # 检查输出区域是否为空
             self.statusBar().showMessage(self.i18n["status_ready"])  # 或与视图就绪相关的状态
+        elif self.last_vlm_metrics:
+            metrics = self.last_vlm_metrics
+            self.statusBar().showMessage(self.i18n["status_analysis_metrics"].format(
+                upload_kb=metrics["upload_bytes"] / 1024, first_token_s=metrics["first_token_s"] or 0.0,
+                total_s=metrics["total_s"]))
         else:
             self.statusBar().showMessage(self.i18n["status_analysis_complete"])
         self.save_settings()
@@ -857,12 +1658,18 @@ class PointCloudAnalyzerApp(QMainWindow):
         self.front_view_label.setText(placeholder_text)
         self.side_view_label.setPixmap(QPixmap())
         self.side_view_label.setText(placeholder_text)
-        self.original_pixmaps.clear()
+        self.explore_view.set_cloud(None)
+        self.original_pixmaps = {}  # 可能与场景共享，不能原地清空
 
     def clear_all_action(self, checked: bool = False):
+        # 只脱离当前场景，场景列表及其缓存保留
+        self.current_scene = None
+        self._select_scene_item(None)
         self.point_cloud_file = None
         self.loaded_point_cloud_data_for_3d = None
-        self.generated_view_paths.clear()
+        self.generated_view_paths = {}
+        self.reload_button.setEnabled(False)
+        self._update_file_watcher()
         self.api_output_text.clear()
         self.raw_vlm_output_buffer = ""
         self.clear_views()
@@ -873,8 +1680,12 @@ class PointCloudAnalyzerApp(QMainWindow):
 
     def closeEvent(self, event):
         self.save_settings()
-        if hasattr(self, 'api_worker') and self.api_worker is not None and self.api_worker.isRunning():
-            self.api_worker.quit()  # Request termination
+        for entry in self.scenes.values():
+            if entry.render_worker is not None:
+                entry.render_worker.cancel()
+                entry.render_worker.wait()  # 最多等待当前视图渲染完成
+        if self.api_worker is not None and self.api_worker.isRunning():
+            self.api_worker.cancel()  # 协作式取消，停止读取流式响应
             if not self.api_worker.wait(1000):  # Wait up to 1 sec
                 print("API worker did not terminate gracefully, forcing termination.")
                 self.api_worker.terminate()  # Force terminate if quit doesn't work
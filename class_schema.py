@@ -0,0 +1,106 @@
+import os
+import json
+import hashlib
+import numpy as np
+from matplotlib.colors import to_rgb
+
+# 类别方案：标签ID -> (名称, 颜色)。从JSON文件加载，格式如下：
+#   {"name": "SensatUrban", "unknown_color": "#FF00FF",
+#    "classes": [{"id": 0, "name": "Ground", "color": "#556B2F"}, ...]}
+# 着色与图例都先把标签映射为类别下标（一次查表），代价与类别数无关。
+# 方案中没有的标签归入末尾的“未知”类，以unknown_color显示，不再被静默丢弃。
+UNKNOWN_CLASS_NAME = "Unknown"
+DEFAULT_UNKNOWN_COLOR = "#FF00FF"
+# 标签ID的最大值不超过该值时用直接查表，否则用二分查找（ID稀疏且很大的方案）
+MAX_DIRECT_LUT_SIZE = 1 << 16
+SCHEMA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schemas')
+
+
+class ClassSchema:
+    def __init__(self, title, label_colors, unknown_color=DEFAULT_UNKNOWN_COLOR):
+        """label_colors与LABEL_COLORS格式相同：{标签ID: (名称, 颜色)}。"""
+        if not label_colors:
+            raise ValueError("类别方案中至少需要一个类别。")
+        self.title = title
+        self.ids = np.array(sorted(int(label_id) for label_id in label_colors), dtype=np.int64)
+        self.names = [label_colors[label_id][0] for label_id in self.ids.tolist()] + [UNKNOWN_CLASS_NAME]
+        self.hex_colors = [label_colors[label_id][1] for label_id in self.ids.tolist()] + [unknown_color]
+        self.unknown_index = self.ids.size
+        # 每个类别一行，最后一行为未知类
+        self.rgb = np.array([to_rgb(color) for color in self.hex_colors], dtype=np.float64)
+        rgb8 = np.rint(self.rgb * 255).astype(np.uint32)
+        self.argb = (0xFF << 24) | (rgb8[:, 0] << 16) | (rgb8[:, 1] << 8) | rgb8[:, 2]  # QImage.Format_ARGB32
+        self._lut = None
+        if self.ids[0] >= 0 and self.ids[-1] < MAX_DIRECT_LUT_SIZE:
+            # 多留一个槽：越界的标签截断到最后一个槽（未知类），负数经-1同样落到最后一个槽
+            self._lut = np.full(self.ids[-1] + 2, self.unknown_index, dtype=np.intp)
+            self._lut[self.ids] = np.arange(self.ids.size)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        classes = data.get("classes") if isinstance(data, dict) else None
+        if not classes:
+            raise ValueError(f"类别方案文件缺少classes列表：{path}")
+        label_colors = {}
+        for item in classes:
+            try:
+                label_id, name, color = int(item["id"]), str(item["name"]), item["color"]
+                to_rgb(color)
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"类别方案中的条目无效 {item!r}：{e}")
+            if label_id in label_colors:
+                raise ValueError(f"类别方案中标签ID重复：{label_id}")
+            label_colors[label_id] = (name, color)
+        title = data.get("name") or os.path.splitext(os.path.basename(path))[0]
+        return cls(title, label_colors, data.get("unknown_color", DEFAULT_UNKNOWN_COLOR))
+
+    def __len__(self):
+        return self.ids.size
+
+    def index(self, labels):
+        """把标签数组映射为类别下标数组，未知标签映射为unknown_index。"""
+        labels = np.asarray(labels)
+        if self._lut is not None:
+            return self._lut[np.clip(labels, -1, self._lut.size - 1)]
+        positions = np.minimum(np.searchsorted(self.ids, labels), self.ids.size - 1)
+        return np.where(self.ids[positions] == labels, positions, self.unknown_index)
+
+    def colors_rgb(self, labels):
+        return self.rgb[self.index(labels)]
+
+    def colors_argb(self, labels):
+        return self.argb[self.index(labels)]
+
+    def counts(self, class_index):
+        """由类别下标数组一次bincount得到每个类别（含未知类）的点数。"""
+        return np.bincount(class_index, minlength=self.unknown_index + 1)
+
+    def label_name(self, label_id):
+        position = self.index(np.array([label_id]))[0]
+        return self.names[position] if position != self.unknown_index else f"Label {label_id}"
+
+    def legend_entries(self, counts, max_entries):
+        """返回图例条目 [(名称, 颜色)]：只含出现过的类别，超过max_entries时保留点数最多的类别。"""
+        present = np.flatnonzero(counts)
+        if present.size > max_entries:
+            present = np.sort(present[np.argsort(counts[present], kind='stable')[::-1][:max_entries]])
+        return [(self.names[i], self.hex_colors[i]) for i in present]
+
+    def fallback_class(self):
+        """无标签点云使用的 (名称, 颜色)：方案中有0号类别时用它，否则用未知类。"""
+        position = 0 if self.ids[0] == 0 else self.unknown_index
+        return self.names[position], self.hex_colors[position]
+
+    def digest(self):
+        """方案内容的哈希，作为渲染缓存键的一部分。"""
+        params = (self.ids.tolist(), self.names, self.hex_colors)
+        return hashlib.sha1(repr(params).encode('utf-8')).hexdigest()
+
+
+def bundled_schema_paths():
+    """schemas目录中随程序提供的类别方案文件。"""
+    if not os.path.isdir(SCHEMA_DIR):
+        return []
+    return sorted(os.path.join(SCHEMA_DIR, name) for name in os.listdir(SCHEMA_DIR) if name.endswith('.json'))
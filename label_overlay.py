@@ -0,0 +1,113 @@
+import os
+import struct
+import hashlib
+import numpy as np
+
+# 标签覆盖文件：与场景.txt同名、扩展名为.labels，按点的下标对齐保存uint8标签。
+# 修正标签时只改写这个紧凑的小文件，不再重写整份xyz+强度文本。
+#
+# 文件布局：
+#   8字节魔数 | uint64 点数 | 32字节基础几何校验和 | 点数个uint8标签
+# 校验和覆盖前“点数”个点的xyz（float64），场景文件在末尾追加新点后覆盖仍然有效。
+OVERLAY_SUFFIX = '.labels'
+OVERLAY_MAGIC = b'P2TLBL01'
+_HEADER = struct.Struct('<8sQ32s')
+OVERLAY_HEADER_SIZE = _HEADER.size
+MAX_OVERLAY_LABEL = np.iinfo(np.uint8).max
+
+
+def overlay_path(scene_path):
+    return os.path.splitext(scene_path)[0] + OVERLAY_SUFFIX
+
+
+def geometry_checksum(points):
+    """基础几何（N×3的xyz）的校验和，用于确认覆盖文件与场景对应。"""
+    xyz = np.ascontiguousarray(points, dtype=np.float64)
+    return hashlib.blake2b(xyz.tobytes(), digest_size=32).digest()
+
+
+def read_overlay_header(path):
+    """返回 (点数, 校验和)。"""
+    with open(path, 'rb') as f:
+        raw = f.read(OVERLAY_HEADER_SIZE)
+    if len(raw) < OVERLAY_HEADER_SIZE:
+        raise ValueError(f"标签覆盖文件头不完整：{path}")
+    magic, n_points, checksum = _HEADER.unpack(raw)
+    if magic != OVERLAY_MAGIC:
+        raise ValueError(f"不是标签覆盖文件：{path}")
+    if os.path.getsize(path) < OVERLAY_HEADER_SIZE + n_points:
+        raise ValueError(f"标签覆盖文件被截断：{path}")
+    return n_points, checksum
+
+
+def create_overlay(scene_path, points, labels):
+    """根据基础几何和初始标签新建覆盖文件，返回其路径。"""
+    labels = np.asarray(labels)
+    if labels.shape[0] != points.shape[0]:
+        raise ValueError(f"标签数 ({labels.shape[0]}) 与点数 ({points.shape[0]}) 不一致。")
+    if labels.size and (labels.min() < 0 or labels.max() > MAX_OVERLAY_LABEL):
+        raise ValueError(f"标签必须在0到{MAX_OVERLAY_LABEL}之间才能保存为覆盖文件。")
+    path = overlay_path(scene_path)
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(OVERLAY_MAGIC, labels.shape[0], geometry_checksum(points)))
+        f.write(labels.astype(np.uint8).tobytes())
+    return path
+
+
+def open_overlay(scene_path, mode='r'):
+    """以内存映射方式打开覆盖文件的标签部分；mode为'r+'时可原地修改。"""
+    path = overlay_path(scene_path)
+    n_points, _ = read_overlay_header(path)
+    if n_points == 0:
+        return np.empty(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode=mode, offset=OVERLAY_HEADER_SIZE, shape=(n_points,))
+
+
+def write_overlay_labels(scene_path, labels, indices=None):
+    """只改写覆盖文件中的标签：indices为None时整体替换，否则只修改指定下标的点。"""
+    overlay = open_overlay(scene_path, mode='r+')
+    labels = np.asarray(labels)
+    if labels.size and (labels.min() < 0 or labels.max() > MAX_OVERLAY_LABEL):
+        raise ValueError(f"标签必须在0到{MAX_OVERLAY_LABEL}之间才能保存为覆盖文件。")
+    if indices is None:
+        if labels.shape[0] != overlay.shape[0]:
+            raise ValueError(f"标签数 ({labels.shape[0]}) 与覆盖文件点数 ({overlay.shape[0]}) 不一致。")
+        overlay[:] = labels
+    else:
+        overlay[indices] = labels
+    if isinstance(overlay, np.memmap):
+        overlay.flush()
+
+
+def overlay_matches(scene_path, points):
+    """覆盖文件存在、可读，且点数与校验和都与points（N×3的基础几何）一致。"""
+    path = overlay_path(scene_path)
+    if not os.path.exists(path):
+        return False
+    try:
+        n_points, checksum = read_overlay_header(path)
+    except (OSError, ValueError):
+        return False
+    return n_points == points.shape[0] and geometry_checksum(points) == checksum
+
+
+def apply_overlay(scene_path, points, labels, start=0):
+    """若存在与几何匹配的覆盖文件，则把其中的标签原地写入labels[start:]，返回是否已应用。
+
+    start用于增量追加：只写入从start开始、仍在覆盖文件范围内的点。
+    """
+    path = overlay_path(scene_path)
+    if not os.path.exists(path):
+        return False
+    try:
+        n_points, checksum = read_overlay_header(path)
+    except (OSError, ValueError) as e:
+        print(f"警告：忽略无法读取的标签覆盖文件：{e}")
+        return False
+    if start >= n_points:
+        return False
+    if n_points > points.shape[0] or geometry_checksum(points[:n_points]) != checksum:
+        print(f"警告：标签覆盖文件与点云几何不匹配，已忽略：{path}")
+        return False
+    labels[start:n_points] = open_overlay(scene_path)[start:]
+    return True
@@ -1,9 +1,11 @@
 import numpy as np
 
+from label_overlay import create_overlay, overlay_matches, write_overlay_labels
+
+# 原始场景文件（5列 x y z intensity label），其几何不会被改写
+scene_file = r'/mnt/d/Area_22/scene_1/scene_1.txt'
 # 用软件修改后保存的.txt文件,有6列值
 before_file = r'/mnt/d/Area_22/scene_1/scene_1_Origin.txt'
-# 用代码修改后保存的.txt路径，有5列值
-after_file = r'/mnt/d/Area_22/scene_1/scene_1_label.txt'
 
 points = np.loadtxt(before_file)
 
@@ -13,4 +15,12 @@ for i in range(1, points.shape[1] - 4):
     # 将最后一列不为NaN的值赋值给倒数第二列对应位置的值
     points[valid_indices, -(i + 1)] = points[valid_indices, -i]
 
-np.savetxt(after_file, points[:, :5], fmt='%.8f')
\ No newline at end of file
+labels = points[:, 4].astype(int)
+
+# 修正后的标签只写入标签覆盖文件（scene_1.labels），不再重写整份点云文本
+# 读取一次原始几何：覆盖文件的点数和校验和都与之一致时才原地改写，否则（首次修正或场景几何已变化）重建
+base_xyz = np.loadtxt(scene_file, usecols=(0, 1, 2), ndmin=2, max_rows=labels.shape[0])
+if overlay_matches(scene_file, base_xyz):
+    write_overlay_labels(scene_file, labels)
+else:
+    create_overlay(scene_file, base_xyz, labels)
@@ -0,0 +1,352 @@
+"""本地模拟VLM服务与压测工具。
+
+模拟DashScope多模态生成接口的流式响应（output.choices[0].message.content 分段），
+以及SDK上传本地图片时用到的 getPolicy / OSS 上传接口，用于在不消耗配额、不依赖网络的情况下
+对 ApiWorker 的分析路径做回归测试和压测。
+
+启动模拟服务，然后让程序指向它：
+    python mock_vlm_server.py serve --port 8765 --first-token-delay 1.5 --tokens-per-second 40
+    DASHSCOPE_HTTP_BASE_URL=http://127.0.0.1:8765/api/v1 python P2Txt_new.py
+
+压测（不指定 --url 时在进程内启动一个模拟服务）：
+    python mock_vlm_server.py bench --requests 64 --concurrency 8 --error-rate 0.05
+"""
+import argparse
+import json
+import os
+import random
+import select
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+DEFAULT_REPLY = (
+    "This is a mock description of the point cloud scene. The top view shows several buildings "
+    "along a straight road, with trees lining both sides and a few cars parked near the intersection. "
+    "Poles are spaced regularly along the road edge."
+)
+# 空闲（首token前等待、流中途停住）时每隔该时间写一行SSE注释保活，并检查客户端是否已断开
+KEEPALIVE_INTERVAL_S = 0.5
+MAX_STALL_S = 3600
+
+
+class MockVlmConfig:
+    def __init__(self, first_token_delay_s=1.0, first_token_jitter_s=0.0, tokens_per_second=50.0, tokens=60,
+                 error_rate=0.0, stall_rate=0.0, max_concurrent=0, reply=DEFAULT_REPLY, seed=None):
+        self.first_token_delay_s = first_token_delay_s
+        self.first_token_jitter_s = first_token_jitter_s  # 首token延迟上叠加的均匀随机抖动
+        self.tokens_per_second = tokens_per_second
+        self.tokens = tokens
+        self.error_rate = error_rate  # 注入错误的概率（一半在流开始前，一半在流中途）
+        self.stall_rate = stall_rate  # 流中途停住不再发送的概率，用于测试超时与对冲
+        self.max_concurrent = max_concurrent  # 超过该并发数返回429限流，0表示不限
+        self.reply = reply
+        self.seed = seed
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(first_token_delay_s=args.first_token_delay, first_token_jitter_s=args.first_token_jitter,
+                   tokens_per_second=args.tokens_per_second, tokens=args.tokens, error_rate=args.error_rate,
+                   stall_rate=args.stall_rate, max_concurrent=args.max_concurrent, seed=args.seed)
+
+
+class MockVlmServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, MockVlmHandler)
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.active_streams = 0
+        self.stats = {"requests": 0, "throttled": 0, "errors": 0, "stalls": 0, "uploads": 0, "upload_bytes": 0}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/v1"
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def random(self):
+        with self.lock:
+            return self.rng.random()
+
+    def reply_tokens(self):
+        # 按单词切分，保留空格，循环复用回复文本直到凑够token数
+        words = [word + " " for word in self.config.reply.split()]
+        return [words[i % len(words)] for i in range(self.config.tokens)]
+
+
+class MockVlmHandler(BaseHTTPRequestHandler):
+    server: MockVlmServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # 压测时逐请求打印日志会淹没统计结果
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.endswith("/uploads") and parse_qs(url.query).get("action") == ["getPolicy"]:
+            # SDK上传本地文件前先获取上传凭证，再把文件POST到upload_host
+            host, port = self.server.server_address[:2]
+            self._send_json(200, {"request_id": str(uuid.uuid4()), "data": {
+                "policy": "mock", "signature": "mock", "upload_dir": f"mock/{uuid.uuid4().hex}",
+                "upload_host": f"http://{host}:{port}/oss", "expire_in_seconds": 300, "max_file_size_mb": 100,
+                "capacity_limit_mb": 1000, "oss_access_key_id": "mock", "x_oss_object_acl": "private",
+                "x_oss_forbid_overwrite": "true"}})
+        else:
+            self._send_json(404, {"code": "NotFound", "message": self.path})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path == "/oss":
+            body = self._read_body()
+            self.server.count("uploads")
+            self.server.count("upload_bytes", len(body))
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif url.path.endswith("/generation"):
+            self._handle_generation(json.loads(self._read_body() or b"{}"))
+        else:
+            self._send_json(404, {"code": "NotFound", "message": self.path})
+
+    def _handle_generation(self, request):
+        server, config = self.server, self.server.config
+        server.count("requests")
+        request_id = str(uuid.uuid4())
+        with server.lock:
+            throttled = config.max_concurrent and server.active_streams >= config.max_concurrent
+            if not throttled:
+                server.active_streams += 1
+        if throttled:
+            server.count("throttled")
+            self._send_json(429, {"code": "Throttling.RateQuota", "message": "Requests rate limit exceeded.",
+                                  "request_id": request_id})
+            return
+        try:
+            roll = server.random()
+            if roll < config.error_rate / 2:
+                server.count("errors")
+                self._send_json(500, {"code": "InternalError", "message": "Injected error before stream.",
+                                      "request_id": request_id})
+                return
+            fail_mid_stream = roll < config.error_rate
+            stall = not fail_mid_stream and roll < config.error_rate + config.stall_rate
+            self._stream(request, request_id, fail_mid_stream, stall)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 客户端取消或对冲落败后断开连接
+        finally:
+            with server.lock:
+                server.active_streams -= 1
+
+    def _write_event(self, event_id, status, payload, is_error=False):
+        # 与DashScope的SSE格式一致：id/event/HTTP状态注释行/data
+        lines = [f"id:{event_id}", "event:error" if is_error else "event:result", f":HTTP_STATUS/{status}",
+                 f"status:{status}", "data:" + json.dumps(payload, ensure_ascii=False), "", ""]
+        self.wfile.write("\n".join(lines).encode("utf-8"))
+        self.wfile.flush()
+
+    def _stream(self, request, request_id, fail_mid_stream, stall):
+        server, config = self.server, self.server.config
+        incremental = (request.get("parameters") or {}).get("incremental_output", False)
+        tokens = server.reply_tokens()
+        stop_at = len(tokens) // 2 if (fail_mid_stream or stall) else len(tokens)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream;charset=UTF-8")
+        self.send_header("Connection", "close")  # 流结束即关闭连接，无需分块编码
+        self.end_headers()
+        self.close_connection = True
+
+        self._idle(config.first_token_delay_s + server.random() * config.first_token_jitter_s)
+        interval = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+        sent = ""
+        for index, token in enumerate(tokens[:stop_at]):
+            if index:
+                time.sleep(interval)
+            sent += token
+            finish_reason = "stop" if index == len(tokens) - 1 else "null"
+            self._write_event(index + 1, 200, {
+                "output": {"choices": [{"finish_reason": finish_reason, "message": {
+                    "role": "assistant", "content": [{"text": token if incremental else sent}]}}]},
+                "usage": {"input_tokens": 1200, "output_tokens": index + 1, "image_tokens": 1100},
+                "request_id": request_id})
+        if fail_mid_stream:
+            server.count("errors")
+            self._write_event(stop_at + 1, 500, {"code": "InternalError", "message": "Injected error mid-stream.",
+                                                 "request_id": request_id}, is_error=True)
+        elif stall:
+            server.count("stalls")
+            self._idle(MAX_STALL_S)  # 停住不再发送内容，直到客户端超时断开
+
+    def _idle(self, seconds):
+        """等待seconds秒，期间定期写入SSE注释行（SDK会忽略）。客户端断开时抛出ConnectionResetError或
+        BrokenPipeError，由_handle_generation的finally立即释放并发名额，而不是一直占到等待结束。"""
+        deadline = time.monotonic() + seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            # 客户端关闭连接后套接字变为可读且读到EOF；请求体已读完，正常情况下不会有其他数据
+            readable, _, _ = select.select([self.connection], [], [], min(remaining, KEEPALIVE_INTERVAL_S))
+            if readable:
+                if not self.connection.recv(1, socket.MSG_PEEK):
+                    raise ConnectionResetError("客户端已断开连接")
+                time.sleep(min(remaining, KEEPALIVE_INTERVAL_S))  # 多余的数据留给后续读取，避免忙等
+            if deadline - time.monotonic() > 0:
+                self.wfile.write(b":\n\n")
+                self.wfile.flush()
+
+
+def start_mock_server(config, host="127.0.0.1", port=0):
+    """在后台线程中启动模拟服务并返回server；port为0时自动选择空闲端口。"""
+    server = MockVlmServer((host, port), config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _percentiles(values, percentiles=(50, 90, 99)):
+    import numpy as np
+    if not values:
+        return {p: float("nan") for p in percentiles}
+    return {p: float(np.percentile(values, p)) for p in percentiles}
+
+
+def run_bench(base_url, requests, concurrency, api_key="sk-mock", image_paths=(), hedge=False,
+              first_token_timeout_s=None, inter_token_timeout_s=None):
+    """以给定并发驱动requests次分析，返回每次请求的结果列表和总耗时。"""
+    os.environ["DASHSCOPE_HTTP_BASE_URL"] = base_url
+    import dashscope
+    dashscope.base_http_api_url = base_url
+    # 延迟导入：只有压测需要分析路径本身
+    from p2txt_core import (stream_vlm_analysis_guarded, resolve_image_reference, UploadedImageCache,
+                           FirstTokenLatencyTracker, DEFAULT_FIRST_TOKEN_TIMEOUT_S, DEFAULT_INTER_TOKEN_TIMEOUT_S)
+
+    upload_cache = UploadedImageCache()
+    latency_tracker = FirstTokenLatencyTracker()
+    first_token_timeout_s = first_token_timeout_s or DEFAULT_FIRST_TOKEN_TIMEOUT_S
+    inter_token_timeout_s = inter_token_timeout_s or DEFAULT_INTER_TOKEN_TIMEOUT_S
+
+    def one_analysis(_):
+        start = time.perf_counter()
+        first_token, chunks = None, 0
+        try:
+            image_refs = [resolve_image_reference(path, api_key, upload_cache)[0] for path in image_paths]
+            for _text in stream_vlm_analysis_guarded(
+                    api_key, image_refs, "system", "user", first_token_timeout_s=first_token_timeout_s,
+                    inter_token_timeout_s=inter_token_timeout_s, latency_tracker=latency_tracker, hedge=hedge):
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                chunks += 1
+            error = None
+        except Exception as e:
+            error = type(e).__name__ + (": " + str(e).split(",")[0] if str(e) else "")
+        return {"first_token_s": first_token, "total_s": time.perf_counter() - start, "chunks": chunks,
+                "error": error}
+
+    bench_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one_analysis, range(requests)))
+    return results, time.perf_counter() - bench_start
+
+
+def print_bench_report(results, elapsed_s):
+    ok = [r for r in results if r["error"] is None]
+    errors = {}
+    for r in results:
+        if r["error"] is not None:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+    first_token = _percentiles([r["first_token_s"] for r in ok if r["first_token_s"] is not None])
+    total = _percentiles([r["total_s"] for r in ok])
+    print(f"请求数 {len(results)}，成功 {len(ok)}，失败 {len(results) - len(ok)}，总耗时 {elapsed_s:.2f} s")
+    print(f"吞吐量 {len(ok) / elapsed_s:.2f} 次分析/s，{sum(r['chunks'] for r in ok) / elapsed_s:.1f} 段/s")
+    print("首个token  " + "  ".join(f"p{p} {v:.3f} s" for p, v in first_token.items()))
+    print("总耗时     " + "  ".join(f"p{p} {v:.3f} s" for p, v in total.items()))
+    for error, count in sorted(errors.items(), key=lambda item: -item[1]):
+        print(f"  {count:5d} × {error}")
+
+
+def _add_mock_options(parser):
+    parser.add_argument("--first-token-delay", type=float, default=1.0, help="首个token前的延迟（秒）")
+    parser.add_argument("--first-token-jitter", type=float, default=0.0, help="首token延迟的随机抖动上限（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="token输出速率")
+    parser.add_argument("--tokens", type=int, default=60, help="每次回复的token数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="注入错误的概率")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="流中途停住的概率")
+    parser.add_argument("--max-concurrent", type=int, default=0, help="超过该并发数返回429，0为不限")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟VLM服务与压测工具")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="启动模拟服务")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    _add_mock_options(serve)
+
+    bench = commands.add_parser("bench", help="并发驱动分析请求并统计吞吐量与延迟百分位")
+    bench.add_argument("--url", default=None, help="已运行的服务地址，如 http://127.0.0.1:8765/api/v1；"
+                                                   "不指定则在进程内启动模拟服务")
+    bench.add_argument("--requests", type=int, default=32)
+    bench.add_argument("--concurrency", type=int, default=8)
+    bench.add_argument("--images", nargs="*", default=[], help="随请求上传的视图图片")
+    bench.add_argument("--hedge", action="store_true", help="开启对冲请求")
+    bench.add_argument("--first-token-timeout", type=float, default=None)
+    bench.add_argument("--inter-token-timeout", type=float, default=None)
+    _add_mock_options(bench)
+
+    args = parser.parse_args()
+    config = MockVlmConfig.from_args(args)
+    if args.command == "serve":
+        server = MockVlmServer((args.host, args.port), config)
+        print(f"模拟VLM服务已启动：DASHSCOPE_HTTP_BASE_URL={server.base_url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        server = start_mock_server(config)
+        base_url = server.base_url
+    try:
+        results, elapsed_s = run_bench(base_url, args.requests, args.concurrency, image_paths=args.images,
+                                       hedge=args.hedge, first_token_timeout_s=args.first_token_timeout,
+                                       inter_token_timeout_s=args.inter_token_timeout)
+        print_bench_report(results, elapsed_s)
+        if server is not None:
+            print(f"服务端统计：{server.stats}")
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
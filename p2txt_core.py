@@ -0,0 +1,1309 @@
+"""点云加载、视图渲染、场景统计与VLM流式分析等与界面无关的部分。
+
+图形界面（P2Txt_new.py）和本地HTTP服务（p2txt_service.py）共用这些函数和缓存；本模块不依赖Qt或Open3D。
+"""
+import os
+import hashlib
+import io
+import queue
+import shutil
+import socket
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+import matplotlib as mpl
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.lines import Line2D
+
+from label_overlay import apply_overlay, overlay_path
+from class_schema import ClassSchema
+
+# 设置matplotlib的中文字体
+mpl.rcParams["font.sans-serif"] = ["SimHei"]
+
+LABEL_COLORS = {
+    0: ("Other", "#A9A9A9"), 1: ("Buildings", "#FF0000"), 2: ("Trees", "#228B22"),
+    3: ("Cars", "#0000FF"), 4: ("Roads", "#FFFF00"), 5: ("Poles", "#FFA500"),
+}
+# 默认类别方案即LABEL_COLORS；可在界面中加载其他方案（见class_schema.py）
+DEFAULT_CLASS_SCHEMA = ClassSchema("Default", LABEL_COLORS)
+_active_class_schema = DEFAULT_CLASS_SCHEMA
+# 图例最多显示的类别数，超出时只保留点数最多的类别
+LEGEND_MAX_ENTRIES = 20
+
+
+def active_class_schema():
+    return _active_class_schema
+
+
+def set_active_class_schema(schema):
+    """切换渲染、统计和3D着色使用的类别方案；schema为None时恢复默认方案。"""
+    global _active_class_schema
+    _active_class_schema = schema if schema is not None else DEFAULT_CLASS_SCHEMA
+
+VLM_MODEL = 'qwen-vl-max'
+# DashScope临时上传文件的有效期为48小时，预留1小时余量，避免引用在请求途中过期
+UPLOAD_URL_TTL_SECONDS = 47 * 3600
+# 多场景缓存的默认内存预算（MB），可在界面中调整
+DEFAULT_SCENE_CACHE_MB = 2048
+# 发送给VLM前把视图缩小到的最长边（像素），0表示发送原图；附带场景统计后小图即可保持分析质量
+DEFAULT_VLM_IMAGE_MAX_SIDE = 1024
+# 场景统计中俯视占据栅格的边长（格数）
+SCENE_STATS_GRID_SIZE = 8
+# 视图图片的画布尺寸（英寸）与分辨率
+VIEW_FIGSIZE = (10, 8)
+VIEW_DPI = 300
+# 渐进式预览：点数超过上限的场景先用抽稀后的点以低分辨率快速出图，再在后台渲染全分辨率视图
+PREVIEW_MAX_POINTS = 200_000
+PREVIEW_DPI = 60
+# 渲染结果缓存：渲染代码改变图片外观时递增版本号，使旧条目失效
+RENDER_CACHE_VERSION = 2
+DEFAULT_RENDER_CACHE_MB = 1024
+# 流式响应超时（秒）：等待首个token、以及相邻两段token之间的最长时间
+DEFAULT_FIRST_TOKEN_TIMEOUT_S = 60
+DEFAULT_INTER_TOKEN_TIMEOUT_S = 30
+# 对冲请求：首个token迟迟未到（超过历史首token延迟的该百分位）时再发一个相同请求，取先响应者
+DEFAULT_HEDGE_PERCENTILE = 95
+
+def _file_stamp(path):
+    """文件的 (mtime, 大小, inode)，文件不存在时为None；用于发现文件被改写、替换或删除。"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def _parse_point_rows(raw_bytes):
+    """把若干完整的文本行解析为 (N, 5) 数组。"""
+    if not raw_bytes.strip():
+        return np.empty((0, 5))
+    with warnings.catch_warnings():
+        # 片段只包含注释或空白时loadtxt会给出空输入警告，这里按无数据处理
+        warnings.simplefilter("ignore", UserWarning)
+        data = np.loadtxt(io.BytesIO(raw_bytes), ndmin=2)
+    if data.size == 0:
+        return np.empty((0, 5))
+
+    if data.shape[0] == 1 and data.shape[1] != 5:  # 处理只有一行数据的情况
+        raise ValueError(
+            f"文件中单行数据不是5列。实际为{data.shape[1]}列。应为x y z intensity label。")
+    elif data.shape[1] != 5:
+        raise ValueError(
+            f"点云数据必须正好有5列（x y z intensity label）。实际为{data.shape[1]}列。")
+    return data
+
+
+class PointCloudFileReader:
+    """记录已解析到的字节偏移；文件只在末尾追加时，仅解析新增的行并扩展内存中的数组。
+
+    文件被截断、被替换为新文件（inode变化）或改写时才完整重新解析。判断改写只比较两个窗口：
+    文件开头和已解析区域末尾各_CHECK_BYTES字节；只改动中间字节且大小不变的原地改写检测不到。
+    cloud()返回的数组此后不会再被修改，可以在其他线程中继续使用。
+    标签覆盖文件（label_overlay）在加载时应用；追加的点若仍在覆盖文件范围内也会应用，
+    覆盖文件被新建、改写或删除后由文本中的标签列重新套用，无需重新解析文本。
+    """
+
+    _CHECK_BYTES = 4096  # 用于判断改写的开头/边界字节数
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._reset()
+
+    def _reset(self):
+        self._data = None  # 预留容量的 (capacity, 5) 缓冲区，追加时摊还扩容
+        self._labels = None
+        self._count = 0
+        self._offset = 0  # 已解析的完整行（以换行结尾）的字节数
+        self._tail_rows = 0  # 末尾未以换行结尾、已解析但可能仍在写入的行数
+        self._file_size = 0
+        self._mtime_ns = 0
+        self._file_id = None  # (st_dev, st_ino)，先写临时文件再改名替换时会变化
+        self._head_digest = b""
+        self._boundary_digest = b""
+        self._overlay_stamp = None  # 上次应用时标签覆盖文件的_file_stamp
+
+    def load(self):
+        self._reset()
+        self._consume()
+        if self._count == 0:
+            # 文件为空或仅包含注释/空白
+            raise ValueError(
+                "点云文件中未找到数据。文件可能为空或仅包含注释。"
+            )
+        # 标签修正保存在独立的覆盖文件中，加载时按点下标覆盖文本中的标签列
+        if self._apply_overlay():
+            print(f"已应用标签覆盖文件：{self.file_path}")
+        return self.cloud()
+
+    def refresh(self):
+        """读取文件的新内容，返回 (状态, 新增点的起始下标)。
+
+        状态为 'unchanged'、'appended' 或 'reloaded'（截断/改写后完整重新解析，或标签覆盖文件变化后
+        所有点的标签都可能不同）。
+        """
+        stat = os.stat(self.file_path)
+        text_unchanged = stat.st_size == self._file_size and stat.st_mtime_ns == self._mtime_ns
+        overlay_changed = _file_stamp(overlay_path(self.file_path)) != self._overlay_stamp
+        if text_unchanged and not overlay_changed:
+            return 'unchanged', self._count
+        if not text_unchanged and (stat.st_size < self._file_size or (stat.st_dev, stat.st_ino) != self._file_id
+                                   or not self._prefix_unchanged()):
+            print(f"文件被截断或改写，完整重新解析：{self.file_path}")
+            self.load()
+            return 'reloaded', 0
+        if not text_unchanged:
+            start = self._count - self._tail_rows  # 上次解析的未完结行会被重新解析
+            self._consume()
+            if not overlay_changed:
+                self._apply_overlay(start)  # 追加的点可能仍在覆盖文件范围内
+                return 'appended', start
+        print(f"标签覆盖文件已变化，重新应用：{self.file_path}")
+        self._relabel()
+        return 'reloaded', 0
+
+    def cloud(self):
+        data = self._data[:self._count]
+        points = data[:, :3]  # x, y, z
+        intensity = data[:, 3]  # 强度
+        labels = self._labels[:self._count]  # 标签，确保为整数
+
+        # 返回单独的x,y,z用于2D视图（兼容旧代码）
+        return points[:, 0], points[:, 1], points[:, 2], labels, intensity, points
+
+    def _apply_overlay(self, start=0):
+        self._overlay_stamp = _file_stamp(overlay_path(self.file_path))
+        return apply_overlay(self.file_path, self._data[:self._count, :3], self._labels[:self._count], start)
+
+    def _relabel(self):
+        # 由文本中的标签列重建标签（写入新数组，不改动已交出的视图），再套用当前的覆盖文件
+        labels = np.empty(self._labels.shape[0], dtype=int)
+        labels[:self._count] = self._data[:self._count, 4]
+        self._labels = labels
+        self._apply_overlay()
+
+    def _read_range(self, f, start, length):
+        f.seek(max(start, 0))
+        return f.read(max(length, 0))
+
+    def _digests(self, f):
+        head = self._read_range(f, 0, min(self._CHECK_BYTES, self._offset))
+        boundary_start = max(self._offset - self._CHECK_BYTES, 0)
+        boundary = self._read_range(f, boundary_start, self._offset - boundary_start)
+        return hashlib.sha1(head).digest(), hashlib.sha1(boundary).digest()
+
+    def _prefix_unchanged(self):
+        with open(self.file_path, 'rb') as f:
+            return self._digests(f) == (self._head_digest, self._boundary_digest)
+
+    def _consume(self):
+        with open(self.file_path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            chunk = self._read_range(f, self._offset, stat.st_size - self._offset)
+            last_newline = chunk.rfind(b"\n")
+            complete, tail = chunk[:last_newline + 1], chunk[last_newline + 1:]
+            rows = _parse_point_rows(complete)
+            tail_rows = np.empty((0, 5))
+            if tail.strip():
+                # 最后一行没有换行：可能是文件本身没有结尾换行，也可能正在写入
+                try:
+                    tail_rows = _parse_point_rows(tail)
+                except ValueError:
+                    print("文件末尾存在不完整的行，等待下次追加后再解析。")
+
+            if self._tail_rows:
+                # 上次的未完结行会被重新解析；之前cloud()交出的视图覆盖这些行，改写前先换用新的缓冲区
+                self._count -= self._tail_rows
+                self._reallocate(self._data.shape[0])
+            self._append(rows)
+            self._append(tail_rows)
+            self._tail_rows = tail_rows.shape[0]
+            self._offset += last_newline + 1
+            self._file_size = self._offset + len(tail)
+            self._mtime_ns = stat.st_mtime_ns
+            self._file_id = (stat.st_dev, stat.st_ino)
+            self._head_digest, self._boundary_digest = self._digests(f)
+
+    def _append(self, rows):
+        if rows.shape[0] == 0:
+            if self._data is None:
+                self._data = np.empty((0, 5))
+                self._labels = np.empty(0, dtype=int)
+            return
+        needed = self._count + rows.shape[0]
+        capacity = 0 if self._data is None else self._data.shape[0]
+        if needed > capacity:
+            self._reallocate(needed if capacity == 0 else max(needed, int(capacity * 1.5)))
+        # 只写入已交出的视图之外的行
+        self._data[self._count:needed] = rows
+        self._labels[self._count:needed] = rows[:, 4].astype(int)
+        self._count = needed
+
+    def _reallocate(self, capacity):
+        data = np.empty((capacity, 5))
+        labels = np.empty(capacity, dtype=int)
+        if self._count:
+            data[:self._count] = self._data[:self._count]
+            labels[:self._count] = self._labels[:self._count]
+        self._data, self._labels = data, labels
+
+
+def load_point_cloud(file_path, reader=None):
+    try:
+        # 传入reader时由其记住已解析的偏移，便于之后增量重新加载
+        if reader is None:
+            reader = PointCloudFileReader(file_path)
+        return reader.load()
+
+    except ValueError as ve:  # 捕获loadtxt的特定错误或自定义ValueError
+        print(f"加载点云出错（ValueError）：{ve}")
+        raise  # 重新抛出以便调用方捕获
+    except Exception as e:  # 捕获加载过程中的其他潜在错误
+        print(f"加载点云时发生意外错误：{e}")
+        raise  # 重新抛出以便调用方捕获
+
+
+def _new_view_figure():
+    # 使用面向对象接口而非pyplot全局状态，Figure可以保留下来做增量更新
+    fig = Figure(figsize=VIEW_FIGSIZE)
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot(1, 1, 1)
+
+
+def _scatter_labels(ax, x_coords, y_coords, labels, schema):
+    """每个出现的类别用一次单色scatter绘制（按类别顺序叠放）；返回每个类别（含未知类）的点数。"""
+    if labels is None or labels.size == 0:
+        return np.zeros(len(schema) + 1, dtype=np.int64)
+    class_index = schema.index(labels)
+    class_counts = schema.counts(class_index)
+    # 按类别下标稳定排序后每个类别是一段连续切片，无需逐类别扫描全部点；小整数键走基数排序
+    key_dtype = np.uint16 if class_counts.size <= np.iinfo(np.uint16).max else np.intp
+    order = np.argsort(class_index.astype(key_dtype, copy=False), kind='stable')
+    ends = np.cumsum(class_counts)
+    for position in np.flatnonzero(class_counts):
+        rows = order[ends[position] - class_counts[position]:ends[position]]
+        ax.scatter(x_coords[rows], y_coords[rows], color=schema.hex_colors[position], s=1, marker='.')
+    return class_counts
+
+
+def _add_legend(ax, view_name, class_counts, has_points, schema):
+    # 图例由各类别点数直接得到，只列出数据中出现的类别
+    entries = schema.legend_entries(class_counts, LEGEND_MAX_ENTRIES)
+    if not entries and has_points:
+        # 无标签的点云用默认颜色绘制，图例也显示默认类别
+        entries = [schema.fallback_class()]
+    if not entries:
+        # 如果x_coords为空，可能会出现这种情况
+        print(f"{view_name}中无数据用于图例。")
+        return None
+    handles = [Line2D([0], [0], marker='o', color='w', label=name, markerfacecolor=color, markersize=10)
+               for name, color in entries]
+    return ax.legend(handles, [name for name, _ in entries], markerscale=1, fontsize=8, loc='upper right',
+                     frameon=True)
+
+
+def _finish_view(fig, ax, view_name, class_counts, has_points, i18n_texts, schema):
+    ax.axis('equal')
+    ax.set_title(f'{view_name} {i18n_texts["view_title_suffix"]}')
+    ax.set_xlabel('X')
+    ax.set_ylabel('Y')
+    _add_legend(ax, view_name, class_counts, has_points, schema)
+    fig.tight_layout()
+
+
+def _view_file_path(view_name, save_dir, variant=""):
+    suffix = f"_{variant}" if variant else ""
+    return os.path.join(save_dir, f'{view_name.lower().replace(" ", "_")}_view{suffix}.png')
+
+
+def _save_view_figure(fig, view_name, save_dir, i18n_texts, dpi=VIEW_DPI, variant=""):
+    file_path = _view_file_path(view_name, save_dir, variant)
+    fig.savefig(file_path, dpi=dpi)
+    print(f"{i18n_texts['saved_view_message']}: {view_name}")
+    return file_path
+
+
+def render_view(x_coords, y_coords, labels, view_name, save_dir, i18n_texts, dpi=VIEW_DPI, variant=""):
+    schema = active_class_schema()
+    fig, ax = _new_view_figure()
+    class_counts = _scatter_labels(ax, x_coords, y_coords, labels, schema)
+
+    # 没有标签但有点存在时，用默认颜色绘制
+    has_points = x_coords is not None and x_coords.size > 0
+    if not class_counts.any() and has_points:
+        ax.scatter(x_coords, y_coords, c=schema.fallback_class()[1], s=1, marker='.')
+
+    _finish_view(fig, ax, view_name, class_counts, has_points, i18n_texts, schema)
+    return _save_view_figure(fig, view_name, save_dir, i18n_texts, dpi=dpi, variant=variant)
+
+
+def cloud_content_digest(cloud, chunk_rows=1 << 20):
+    """点坐标与标签内容的哈希，作为渲染缓存键的一部分。"""
+    _x, _y, _z, labels, _, points = cloud
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(repr((points.shape, labels.shape, labels.dtype.str)).encode("utf-8"))
+    for arr in (points, labels):
+        # 分块哈希，避免为非连续视图一次性复制整个数组
+        for start in range(0, arr.shape[0], chunk_rows):
+            digest.update(np.ascontiguousarray(arr[start:start + chunk_rows]).tobytes())
+    return digest.hexdigest()
+
+
+class RenderCache:
+    """按输入内容与渲染参数缓存视图图片；总大小超出上限时淘汰最久未使用的条目。
+
+    缓存键由点云内容哈希、视图类型、分辨率、类别方案（名称与颜色）和图中文字组成，
+    任一项变化都会得到新的键，旧条目不再被命中并随淘汰清除；损坏的条目在读取时丢弃。
+    """
+
+    _PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def key(self, data_digest, view_key, view_name, i18n_texts, dpi=VIEW_DPI, variant=""):
+        params = (RENDER_CACHE_VERSION, data_digest, view_key, view_name, i18n_texts["view_title_suffix"],
+                  VIEW_FIGSIZE, dpi, active_class_schema().digest(), variant)
+        return hashlib.sha1(repr(params).encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".png")
+
+    def fetch(self, key, dest_path):
+        """命中时把缓存的图片复制到dest_path并返回True。"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                if f.read(len(self._PNG_SIGNATURE)) != self._PNG_SIGNATURE:
+                    raise ValueError("缓存文件不是有效的PNG")
+            shutil.copyfile(path, dest_path)
+            os.utime(path)  # 以修改时间记录最近使用
+            return True
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            print(f"丢弃损坏的渲染缓存条目 {path}：{e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return False
+
+    def store(self, key, src_path):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        # 先写临时文件再改名，并发读取时不会看到写了一半的图片
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def set_max_bytes(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def _evict(self):
+        if not os.path.isdir(self.cache_dir):
+            return  # 尚未写入过任何条目
+        with self._lock:
+            entries = []
+            with os.scandir(self.cache_dir) as it:
+                for item in it:
+                    if item.name.endswith(".png"):
+                        stat = item.stat()
+                        entries.append((stat.st_mtime, stat.st_size, item.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+
+def render_view_cached(x_coords, y_coords, labels, view_name, save_dir, i18n_texts, render_cache=None,
+                       data_digest=None, view_key="", dpi=VIEW_DPI, variant=""):
+    """与render_view相同，但先查渲染缓存；未命中时渲染并写入缓存。"""
+    if render_cache is None or data_digest is None:
+        return render_view(x_coords, y_coords, labels, view_name, save_dir, i18n_texts, dpi=dpi, variant=variant)
+    cache_key = render_cache.key(data_digest, view_key, view_name, i18n_texts, dpi=dpi, variant=variant)
+    file_path = _view_file_path(view_name, save_dir, variant)
+    if render_cache.fetch(cache_key, file_path):
+        print(f"{i18n_texts['cached_view_message']}: {view_name}")
+        return file_path
+    file_path = render_view(x_coords, y_coords, labels, view_name, save_dir, i18n_texts, dpi=dpi, variant=variant)
+    try:
+        render_cache.store(cache_key, file_path)
+    except OSError as e:
+        print(f"写入渲染缓存失败：{e}")
+    return file_path
+
+
+# 视图键 -> (横轴坐标下标, 纵轴坐标下标, 视图名称的i18n键)
+VIEW_PROJECTIONS = {
+    'top': (0, 1, 'top_view_name'),
+    'front': (0, 2, 'front_view_name'),
+    'side': (1, 2, 'side_view_name'),
+}
+
+
+class IncrementalViewRenderer:
+    """点云追加时增量更新三个视图。
+
+    每个视图完整绘制一次后只保留Agg画布（不保留散点对象及其坐标副本），并记下坐标范围和图例下方的像素。
+    新增的点都落在原坐标范围内时，擦除图例、只把新点画到画布上、再画图例并保存，代价与新增点数成正比；
+    超出坐标范围、之前绘制的点被替换或换了类别方案时，该视图完整重绘。
+    """
+
+    def __init__(self, save_dir, i18n_texts):
+        self.save_dir = save_dir
+        self.i18n_texts = i18n_texts
+        self._views = {}  # 视图键 -> 画布状态（见_draw_full）
+        self._schema = None  # 已绘制部分使用的类别方案
+        self._class_counts = None  # 每个类别（含未知类）的点数，三个视图共用，用于图例
+        self._counted = 0  # _class_counts已统计的点数
+
+    def nbytes(self):
+        """保留的画布像素缓冲区大小，计入场景缓存的内存预算。"""
+        return sum(state["nbytes"] for state in self._views.values())
+
+    def update(self, cloud, start, on_view=None, cancel_event=None):
+        """把视图更新为cloud中的全部点（下标start之前的点与上次调用时相同），返回视图路径字典。
+
+        on_view在每个视图保存后以 (视图键, 路径) 调用；cancel_event置位时提前返回已完成的视图，
+        未更新的视图在下次调用时补上。
+        """
+        x, y, z, labels, _, _points = cloud
+        if labels is None or labels.size == 0:
+            return {}
+        schema = active_class_schema()
+        if schema is not self._schema:
+            self._views = {}
+            self._schema = schema
+            self._class_counts = None
+        if self._class_counts is None or start < self._counted:
+            self._class_counts = schema.counts(schema.index(labels))
+        else:
+            self._class_counts = self._class_counts + schema.counts(schema.index(labels[self._counted:]))
+        self._counted = labels.size
+        if not os.path.exists(self.save_dir): os.makedirs(self.save_dir)
+
+        coords = (x, y, z)
+        paths = {}
+        for key, (h_axis, v_axis, name_key) in VIEW_PROJECTIONS.items():
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            view_name = self.i18n_texts[name_key]
+            h_coords, v_coords = coords[h_axis], coords[v_axis]
+            state = self._views.get(key)
+            if state is None or not self._draw_appended(state, h_coords, v_coords, labels, start, view_name):
+                state = self._views[key] = self._draw_full(h_coords, v_coords, labels, view_name)
+            paths[key] = self._save(state, view_name)
+            if on_view is not None:
+                on_view(key, paths[key])
+        return paths
+
+    def _draw_full(self, h_coords, v_coords, labels, view_name):
+        fig, ax = _new_view_figure()
+        _scatter_labels(ax, h_coords, v_coords, labels, self._schema)
+        _finish_view(fig, ax, view_name, self._class_counts, True, self.i18n_texts, self._schema)
+        fig.set_dpi(VIEW_DPI)  # 布局与render_view相同，再直接在画布上按输出分辨率绘制
+        legend = ax.get_legend()
+        if legend is not None:
+            legend.set_visible(False)  # 先画不含图例的画面，以便保存图例下方的像素
+        fig.canvas.draw()
+        ax.set_autoscale_on(False)  # 之后添加的散点不再改变坐标范围
+        for collection in list(ax.collections):
+            collection.remove()  # 点已画在画布上，释放坐标副本
+        renderer = fig.canvas.get_renderer()
+        state = {"fig": fig, "ax": ax, "rendered": labels.size, "limits": (ax.get_xlim(), ax.get_ylim()),
+                 "legend_box": None, "under_legend": None, "nbytes": int(renderer.width * renderer.height * 4)}
+        if legend is not None:
+            box = legend.get_window_extent(renderer).expanded(1.02, 1.02)
+            state["legend_box"] = box
+            state["under_legend"] = fig.canvas.copy_from_bbox(box)
+            state["nbytes"] += int(box.width * box.height * 4)
+            legend.set_visible(True)
+            ax.draw_artist(legend)
+        return state
+
+    def _draw_appended(self, state, h_coords, v_coords, labels, start, view_name):
+        """只绘制state之后新增的点；需要完整重绘时返回False。"""
+        first = state["rendered"]
+        if first > start:
+            return False  # 已绘制的点被替换（例如末尾未完结的行）
+        new_h, new_v = h_coords[first:], v_coords[first:]
+        (x0, x1), (y0, y1) = state["limits"]
+        if new_h.size and not (min(x0, x1) <= new_h.min() and new_h.max() <= max(x0, x1)
+                               and min(y0, y1) <= new_v.min() and new_v.max() <= max(y0, y1)):
+            return False  # 新点超出原坐标范围，需要重新确定坐标轴
+        fig, ax = state["fig"], state["ax"]
+        renderer = fig.canvas.get_renderer()
+        legend = _add_legend(ax, view_name, self._class_counts, True, self._schema)
+        box = state["legend_box"]
+        if (legend is None) != (box is None):
+            return False
+        if legend is not None:
+            extent = legend.get_window_extent(renderer)
+            if not (box.x0 <= extent.x0 and box.y0 <= extent.y0 and extent.x1 <= box.x1 and extent.y1 <= box.y1):
+                return False  # 新图例（例如出现了新类别）超出保存的区域
+            fig.canvas.restore_region(state["under_legend"])  # 擦除旧图例，恢复其下方的点
+        _scatter_labels(ax, new_h, new_v, labels[first:], self._schema)
+        for collection in list(ax.collections):
+            ax.draw_artist(collection)
+            collection.remove()
+        for spine in ax.spines.values():
+            ax.draw_artist(spine)  # 边缘的新点不压住坐标轴
+        if legend is not None:
+            state["under_legend"] = fig.canvas.copy_from_bbox(box)
+            ax.draw_artist(legend)
+        state["rendered"] = labels.size
+        return True
+
+    def _save(self, state, view_name):
+        from PIL import Image  # matplotlib的依赖，无需额外安装
+        # 直接保存画布像素（savefig会重新绘制整个Figure）；压缩级别1的编码速度约为默认级别的两倍多，文件略大
+        renderer = state["fig"].canvas.get_renderer()
+        file_path = _view_file_path(view_name, self.save_dir)
+        temp_path = file_path + ".tmp"  # 界面可能正在读取旧图片，写完后再原子替换
+        Image.frombuffer('RGBA', (int(renderer.width), int(renderer.height)), state["fig"].canvas.buffer_rgba(),
+                         'raw', 'RGBA', 0, 1).save(temp_path, format='PNG', dpi=(VIEW_DPI, VIEW_DPI),
+                                                   compress_level=1)
+        os.replace(temp_path, file_path)
+        print(f"{self.i18n_texts['saved_view_message']}: {view_name}")
+        return file_path
+
+
+def subsample_cloud(cloud, max_points):
+    """按固定步长抽稀点云（结果确定，便于缓存），点数不超过max_points时原样返回。"""
+    labels = cloud[3]
+    if labels is None or labels.size <= max_points:
+        return cloud
+    step = -(-labels.size // max_points)  # 向上取整
+    return tuple(arr[::step] if arr is not None else None for arr in cloud)
+
+
+def render_point_cloud_views(file_path, save_dir, i18n_texts, cloud=None, render_cache=None, preview=False,
+                             on_view=None, cancel_event=None, data_digest=None):
+    """渲染三个视图并返回路径字典。
+
+    preview为True时只渲染抽稀后的低分辨率预览（文件名带_preview后缀）；
+    on_view在每个视图完成后以 (视图键, 路径) 调用，cancel_event置位时提前返回已完成的视图。
+    data_digest为cloud的内容哈希（调用方按点云版本缓存，见SceneEntry.content_digest），为None时在此计算。
+    """
+    if not os.path.exists(save_dir): os.makedirs(save_dir)
+    # 调用方已加载过点云时直接复用，避免再次解析文本文件
+    if cloud is None:
+        cloud = load_point_cloud(file_path)
+    dpi, variant = VIEW_DPI, ""
+    if preview:
+        cloud = subsample_cloud(cloud, PREVIEW_MAX_POINTS)
+        dpi, variant = PREVIEW_DPI, "preview"  # 缓存键含variant，可直接沿用完整点云的哈希
+    x, y, z, label_data, _, _points_for_3d = cloud
+    paths = {}
+    # 仅当label_data不为None且不为空时渲染2D视图
+    if label_data is not None and label_data.size > 0:
+        # 输入与渲染参数都没变的视图直接从缓存复制
+        if render_cache is not None and data_digest is None:
+            data_digest = cloud_content_digest(cloud)
+        coords = (x, y, z)
+        for key, (h_axis, v_axis, name_key) in VIEW_PROJECTIONS.items():
+            if cancel_event is not None and cancel_event.is_set():
+                return paths
+            paths[key] = render_view_cached(coords[h_axis], coords[v_axis], label_data, i18n_texts[name_key],
+                                            save_dir, i18n_texts, render_cache, data_digest, key, dpi=dpi,
+                                            variant=variant)
+            if on_view is not None:
+                on_view(key, paths[key])
+        print(f"{i18n_texts['render_complete_message']} {save_dir}")
+    else:
+        # 该消息也适用于load_point_cloud返回空label_data数组的情况
+        print("点云加载无有效标签或无数据点，跳过二维视图生成。")
+    return paths
+
+
+def compute_scene_statistics(points, labels, grid_size=SCENE_STATS_GRID_SIZE):
+    """一次稳定排序+归约算出每个标签的点数、包围盒和俯视占据栅格，代价与类别数无关。"""
+    if points is None or labels is None or labels.size == 0:
+        return None
+    order = np.argsort(labels, kind='stable')
+    sorted_labels = labels[order]
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(sorted_labels)) + 1))
+    label_ids = sorted_labels[starts]
+    counts = np.diff(np.append(starts, labels.size))
+    # 逐列取排序后的坐标做归约，避免再复制一份N×3数组
+    mins = np.empty((label_ids.size, 3))
+    maxs = np.empty((label_ids.size, 3))
+    for axis in range(3):
+        sorted_axis = points[order, axis]
+        mins[:, axis] = np.minimum.reduceat(sorted_axis, starts)
+        maxs[:, axis] = np.maximum.reduceat(sorted_axis, starts)
+    inverse = np.empty(labels.size, dtype=np.intp)  # 每个点所属类别在label_ids中的下标
+    inverse[order] = np.repeat(np.arange(label_ids.size), counts)
+
+    scene_min = points.min(axis=0)
+    scene_max = points.max(axis=0)
+    extent = np.maximum(scene_max[:2] - scene_min[:2], 1e-9)
+    cells = ((points[:, :2] - scene_min[:2]) / extent * grid_size).astype(int)
+    np.clip(cells, 0, grid_size - 1, out=cells)
+    # 每个 (标签, 行, 列) 一个计数槽；行按y从大到小排列，与俯视图上北下南一致
+    rows = grid_size - 1 - cells[:, 1]
+    flat = (inverse * grid_size + rows) * grid_size + cells[:, 0]
+    occupancy = np.bincount(flat, minlength=label_ids.size * grid_size * grid_size)
+    return {
+        "label_ids": label_ids, "counts": counts, "mins": mins, "maxs": maxs,
+        "occupancy": occupancy.reshape(label_ids.size, grid_size, grid_size) > 0,
+        "scene_min": scene_min, "scene_max": scene_max, "total": int(labels.size), "grid_size": grid_size,
+    }
+
+
+def format_scene_statistics(stats, i18n_texts):
+    """把场景统计序列化为附加在user_prompt后的紧凑文本。"""
+    if not stats:
+        return ""
+    schema = active_class_schema()
+    scene_min, scene_max = stats["scene_min"], stats["scene_max"]
+    lines = [i18n_texts["scene_stats_header"].format(
+        total=stats["total"], grid=stats["grid_size"],
+        x0=scene_min[0], x1=scene_max[0], y0=scene_min[1], y1=scene_max[1], z0=scene_min[2], z1=scene_max[2])]
+    for label_id, count, lo, hi, grid in zip(stats["label_ids"], stats["counts"], stats["mins"], stats["maxs"],
+                                             stats["occupancy"]):
+        name = schema.label_name(label_id)
+        grid_rows = "/".join("".join("#" if cell else "." for cell in row) for row in grid)
+        lines.append(i18n_texts["scene_stats_line"].format(
+            name=name, count=int(count), share=100.0 * count / stats["total"],
+            x0=lo[0], x1=hi[0], y0=lo[1], y1=hi[1], z0=lo[2], z1=hi[2], grid_rows=grid_rows))
+    return "\n".join(lines)
+
+
+def prepare_vlm_image(path, max_side):
+    """生成发送给VLM的缩小版视图（与原图同目录），max_side为0或原图已足够小时返回原路径。"""
+    if not max_side:
+        return path
+    from PIL import Image  # matplotlib的依赖，无需额外安装
+    stem, _ = os.path.splitext(path)
+    small_path = f"{stem}_vlm{max_side}.png"
+    if os.path.exists(small_path) and os.path.getmtime(small_path) >= os.path.getmtime(path):
+        return small_path
+    with Image.open(path) as img:
+        if max(img.size) <= max_side:
+            return path
+        img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        img.save(small_path, optimize=True)
+    return small_path
+
+
+def file_content_digest(file_path, chunk_size=1 << 20):
+    """按块计算文件内容的SHA-256，用作上传缓存的键。"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadedImageCache:
+    """按内容哈希登记已上传的视图图片，在有效期内复用其远程引用（oss://）。
+
+    同一场景仅更换提示词或语言再次分析时，图片无需重新上传，只剩文本往返。
+    """
+
+    def __init__(self, model=VLM_MODEL, ttl_seconds=UPLOAD_URL_TTL_SECONDS):
+        self.model = model
+        self.ttl_seconds = ttl_seconds
+        self._entries = {}  # (api_key, 内容哈希) -> (远程引用, 过期时间戳)
+        self._pending = {}  # (api_key, 内容哈希) -> 正在上传的Future，同时未命中的请求等待同一次上传
+        self._lock = threading.Lock()  # ApiWorker在后台线程中调用
+
+    def resolve(self, file_path, api_key):
+        """返回 (远程引用, 本次实际上传的字节数)；命中缓存或复用其他线程正在进行的上传时字节数为0。"""
+        key = (api_key, file_content_digest(file_path))
+        now = time.time()
+        with self._lock:
+            # 顺带清理已过期的条目
+            for stale_key in [k for k, (_, expires_at) in self._entries.items() if expires_at <= now]:
+                del self._entries[stale_key]
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry[0], 0
+            pending = self._pending.get(key)
+            if pending is None:
+                future = self._pending[key] = Future()
+        if pending is not None:
+            return pending.result(), 0  # 上传失败时同样抛出异常
+        try:
+            remote_url = self._upload(file_path, api_key)
+        except BaseException as e:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            # 有效期从上传前开始计算，偏保守
+            self._entries[key] = (remote_url, now + self.ttl_seconds)
+            del self._pending[key]
+        future.set_result(remote_url)
+        return remote_url, os.path.getsize(file_path)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _upload(self, file_path, api_key):
+        from dashscope.utils.oss_utils import OssUtils
+        result = OssUtils.upload(model=self.model, file_path=os.path.abspath(file_path), api_key=api_key)
+        if isinstance(result, tuple):  # 部分SDK版本同时返回上传凭证
+            result = result[0]
+        if not result:
+            raise RuntimeError(f"上传图片失败：{file_path}")
+        return result
+
+
+def _arrays_nbytes(arrays):
+    """统计数组占用的内存，共享同一底层缓冲区的视图只计一次。"""
+    buffers = {}
+    for arr in arrays:
+        if arr is None:
+            continue
+        base = arr
+        while isinstance(base.base, np.ndarray):
+            base = base.base
+        buffers[id(base)] = base.nbytes
+    return sum(buffers.values())
+
+
+def scene_output_dir(base_dir, file_path):
+    # 以文件名加路径哈希区分场景，不同目录下的同名文件也不会互相覆盖
+    path_digest = hashlib.sha1(file_path.encode("utf-8")).hexdigest()[:8]
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(base_dir, f"{stem}_{path_digest}")
+
+
+class SceneEntry:
+    """一个已打开的场景：点云数组、渲染视图与分析结果。"""
+
+    def __init__(self, file_path, output_dir):
+        self.file_path = file_path
+        self.output_dir = output_dir  # 每个场景独立的输出目录，避免视图文件互相覆盖
+        self._digest_lock = threading.Lock()
+        self.cloud = None  # load_point_cloud的返回值
+        self.reader = None  # PointCloudFileReader，记录已解析的字节偏移
+        self.view_renderer = None  # IncrementalViewRenderer，首次追加时创建
+        self.view_paths = {}
+        self.pixmaps = {}
+        self.analysis_text = ""
+        self.statistics = None  # compute_scene_statistics的结果，加载时计算
+        self.views_are_preview = False  # view_paths当前是否为低分辨率预览
+        self.render_worker = None  # 正在渲染全分辨率视图的ViewRenderWorker
+        self.pins = 0  # 正在使用该场景的后台任务数，大于0时场景缓存不会释放它
+        self.projections = {}  # 交互视图按投影排序的坐标与颜色（与视图共享，计入内存预算）
+
+    @property
+    def cloud(self):
+        return self._cloud
+
+    @cloud.setter
+    def cloud(self, cloud):
+        with self._digest_lock:
+            self._cloud = cloud
+            self._content_digest = None  # 点云变化后按需重新计算
+
+    def content_digest(self, cloud):
+        """cloud的内容哈希（渲染缓存键的一部分）。cloud为当前点云时缓存结果，同一版本只计算一次；
+        可在工作线程中调用，期间点云被替换时不缓存旧版本的结果。"""
+        with self._digest_lock:
+            if cloud is self._cloud and self._content_digest is not None:
+                return self._content_digest
+        digest = cloud_content_digest(cloud)
+        with self._digest_lock:
+            if cloud is self._cloud:
+                self._content_digest = digest
+        return digest
+
+    def is_loaded(self):
+        return self.cloud is not None
+
+    def nbytes(self):
+        total = _arrays_nbytes(self.cloud) if self.cloud is not None else 0
+        if self.view_renderer is not None:
+            total += self.view_renderer.nbytes()
+        for arrays in self.projections.values():
+            total += _arrays_nbytes(arrays)
+        for pixmap in self.pixmaps.values():
+            total += pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+        return total
+
+    def release(self):
+        # 只释放大块内存；视图文件仍在磁盘上，分析结果体积很小，予以保留
+        self.cloud = None
+        self.reader = None
+        self.view_renderer = None
+        self.pixmaps = {}
+        self.projections.clear()  # 就地清空，交互视图持有的同一份排序结果随之释放
+        if self.render_worker is not None:
+            self.render_worker.cancel()  # 预览仍保留，下次打开时重新渲染全分辨率视图
+
+
+class SceneCache:
+    """按最近使用顺序管理场景占用的内存，超出预算时释放最久未使用的场景。"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # file_path -> SceneEntry，末尾为最近使用
+
+    def touch(self, entry):
+        self._entries[entry.file_path] = entry
+        self._entries.move_to_end(entry.file_path)
+        self._evict()
+
+    def discard(self, entry):
+        self._entries.pop(entry.file_path, None)
+
+    def pin(self, entry):
+        """后台任务开始使用场景前调用；与touch/_evict由同一把锁保护（图形界面只在主线程使用，无需固定）。"""
+        entry.pins += 1
+
+    def unpin(self, entry):
+        entry.pins -= 1
+        self._evict()  # 固定期间跳过的淘汰在此补上
+
+    def set_max_bytes(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def total_bytes(self):
+        return sum(entry.nbytes() for entry in self._entries.values())
+
+    def _evict(self):
+        # 最近使用的场景始终保留，即使它单独就超出预算；被固定的场景跳过
+        for file_path in list(self._entries)[:-1]:
+            if self.total_bytes() <= self.max_bytes:
+                break
+            entry = self._entries[file_path]
+            if entry.pins > 0:
+                continue
+            del self._entries[file_path]
+            print(f"场景缓存超出预算，释放：{entry.file_path}")
+            entry.release()
+
+
+class DashscopeApiError(Exception):
+    """流式响应中返回了非200状态。"""
+
+
+class VlmStreamTimeout(Exception):
+    """在限定时间内没有收到首个token或下一段token。"""
+
+
+class AnalysisCancelled(Exception):
+    """分析被用户取消。"""
+
+
+class FirstTokenLatencyTracker:
+    """记录最近若干次请求的首个token延迟，按百分位给出对冲请求的触发时间。"""
+
+    def __init__(self, percentile=DEFAULT_HEDGE_PERCENTILE, window=50, min_samples=5, default_delay_s=8.0):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_delay_s = default_delay_s  # 样本不足时使用
+        self._samples = []
+        self._window = window
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            del self._samples[:-self._window]
+
+    def hedge_delay(self):
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return self.default_delay_s
+            return float(np.percentile(self._samples, self.percentile))
+
+
+# VLM消息中图片的顺序
+VLM_VIEW_ORDER = ("front", "side", "top")
+
+
+def resolve_image_reference(path, api_key, upload_cache=None, image_max_side=0):
+    """把视图图片转换为VLM消息中的引用，返回 (图片引用, 上传字节数)。"""
+    try:
+        path = prepare_vlm_image(path, image_max_side)
+    except Exception as e:
+        print(f"缩小视图图片失败，发送原图：{e}")
+    # 优先复用会话内已上传的远程引用，失败时退回由SDK上传本地文件
+    if upload_cache is not None:
+        try:
+            return upload_cache.resolve(path, api_key)
+        except Exception as e:
+            print(f"预上传图片失败，改由SDK直接上传：{e}")
+    return f"file://{os.path.abspath(path)}", os.path.getsize(path)
+
+
+def stream_vlm_analysis(api_key, image_refs, system_prompt_text, user_prompt_text, session=None):
+    """发起流式多模态请求，逐段产出增量文本；API返回错误时抛出DashscopeApiError。
+
+    session为requests.Session时经由它发送请求（见StreamAbortHandle）。
+    """
+    import dashscope
+    from dashscope.api_entities.dashscope_response import Role
+
+    content_for_api = [{"image": ref} for ref in image_refs]
+    content_for_api.append({"text": user_prompt_text})
+    messages = [{"role": Role.SYSTEM, "content": [{"text": system_prompt_text}]},
+                {"role": Role.USER, "content": content_for_api}]
+    call_kwargs = {}
+    if any(ref.startswith("oss://") for ref in image_refs):
+        # 直接传入oss://引用时需显式开启服务端解析（SDK仅在自行上传时设置此请求头）
+        call_kwargs["headers"] = {"X-DashScope-OssResourceResolve": "enable"}
+    if session is not None:
+        call_kwargs["session"] = session
+    responses = dashscope.MultiModalConversation.call(api_key=api_key, model=VLM_MODEL,
+                                                      messages=messages, stream=True, incremental_output=True,
+                                                      **call_kwargs)
+    for response in responses:
+        if response.status_code == 200:
+            text_content = ""
+            if response.output and response.output.choices and len(response.output.choices) > 0:
+                choice = response.output.choices[0]
+                if choice.message and choice.message.content and len(choice.message.content) > 0:
+                    for part in choice.message.content:
+                        if "text" in part: text_content += part.get("text", "")
+            if text_content:
+                yield text_content
+        else:
+            error_detail = f"Code: {response.code}, Message: {response.message}"
+            if hasattr(response, 'request_id'): error_detail += f", Request ID: {response.request_id}"
+            raise DashscopeApiError(error_detail)
+
+
+def _response_socket(response):
+    sock = getattr(getattr(response.raw, "_connection", None), "sock", None)
+    if sock is None:
+        # 响应为Connection: close时，http.client把套接字交给响应对象持有
+        fp = getattr(getattr(response.raw, "_fp", None), "fp", None)
+        sock = getattr(getattr(fp, "raw", None), "_sock", None)
+    return sock
+
+
+def _abort_response(response):
+    # 先shutdown套接字：仅close()唤醒不了另一线程中阻塞的读取，而且close()要等那次读取返回才能拿到缓冲区的锁
+    sock = _response_socket(response)
+    if sock is None:
+        return  # 连接已释放
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    response.close()
+
+
+class StreamAbortHandle:
+    """一次流式请求专用的会话：记录收到的HTTP响应，控制线程调用abort()即可立即断开连接。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._responses = []
+        self._aborted = False
+        self._session = None
+
+    def session(self):
+        import requests
+
+        with self._lock:
+            if self._session is None:
+                self._session = requests.Session()
+                self._session.hooks["response"].append(self._on_response)
+            return self._session
+
+    def _on_response(self, response, *args, **kwargs):
+        with self._lock:
+            self._responses.append(response)
+            aborted = self._aborted
+        if aborted:  # 取消发生在响应头到达之前
+            _abort_response(response)
+
+    def abort(self):
+        with self._lock:
+            if self._aborted:
+                return
+            self._aborted = True
+            responses, session = list(self._responses), self._session
+        for response in responses:
+            _abort_response(response)
+        if session is not None:
+            session.close()
+
+
+def _pump_stream(stream_factory, tag, out_queue, stop_event):
+    # 在独立线程中读取一路流式响应；停止时控制线程会断开连接，阻塞中的读取随即以异常返回
+    stream = None
+    try:
+        stream = stream_factory()
+        for text_content in stream:
+            if stop_event.is_set():
+                return
+            out_queue.put((tag, "text", text_content))
+        out_queue.put((tag, "done", None))
+    except Exception as e:
+        if not stop_event.is_set():  # 被主动断开时的读取异常无需上报
+            out_queue.put((tag, "error", e))
+    finally:
+        if stream is not None and hasattr(stream, "close"):
+            stream.close()
+
+
+def stream_vlm_analysis_guarded(api_key, image_refs, system_prompt_text, user_prompt_text, cancel_event=None,
+                                first_token_timeout_s=DEFAULT_FIRST_TOKEN_TIMEOUT_S,
+                                inter_token_timeout_s=DEFAULT_INTER_TOKEN_TIMEOUT_S,
+                                latency_tracker=None, hedge=False):
+    """在stream_vlm_analysis之外加上取消、首token/token间超时以及可选的对冲请求。
+
+    hedge为True时，若超过latency_tracker给出的延迟仍无首个token，则再发起一路相同请求，
+    先产出token的一路胜出。取消、超时或对冲落败时由调用线程直接断开对应的连接。
+    """
+    def stream_factory(session):
+        return stream_vlm_analysis(api_key, image_refs, system_prompt_text, user_prompt_text, session=session)
+
+    out_queue = queue.Queue()
+    stop_events, handles = {}, {}
+    alive = set()
+
+    def launch(tag):
+        stop_events[tag] = threading.Event()
+        handles[tag] = handle = StreamAbortHandle()
+        alive.add(tag)
+        threading.Thread(target=_pump_stream, name=f"vlm-stream-{tag}",
+                         args=(lambda: stream_factory(handle.session()), tag, out_queue, stop_events[tag]),
+                         daemon=True).start()
+
+    def stop(tag):
+        stop_events[tag].set()
+        handles[tag].abort()
+
+    start = time.monotonic()
+    deadline = start + first_token_timeout_s
+    hedge_at = start + latency_tracker.hedge_delay() if hedge and latency_tracker is not None else None
+    winner = None
+    last_error = None
+    launch(0)
+    try:
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                raise AnalysisCancelled()
+            now = time.monotonic()
+            # 最多等待0.2秒，以便及时响应取消
+            wake_at = min(deadline, hedge_at if hedge_at is not None else deadline, now + 0.2)
+            try:
+                tag, kind, payload = out_queue.get(timeout=max(wake_at - now, 0))
+            except queue.Empty:
+                now = time.monotonic()
+                if hedge_at is not None and winner is None and now >= hedge_at:
+                    print(f"首个token超过 {hedge_at - start:.1f} s 未到达，发起对冲请求。")
+                    hedge_at = None
+                    launch(1)
+                if now >= deadline:
+                    stage = "首个token" if winner is None else "下一段token"
+                    raise VlmStreamTimeout(f"等待{stage}超时")
+                continue
+
+            if winner is not None and tag != winner:
+                continue  # 落败一路的剩余输出
+            if kind == "text":
+                now = time.monotonic()
+                if winner is None:
+                    winner = tag
+                    for other_tag in stop_events:
+                        if other_tag != tag:
+                            stop(other_tag)
+                    if latency_tracker is not None:
+                        latency_tracker.record(now - start)
+                deadline = now + inter_token_timeout_s
+                yield payload
+                continue
+
+            alive.discard(tag)
+            if winner is None and alive:
+                # 尚无胜出者时，一路出错或空响应不影响仍在进行的另一路
+                last_error = payload if kind == "error" else last_error
+                continue
+            if kind == "error":
+                raise payload
+            if winner is None and last_error is not None:
+                raise last_error
+            return
+    finally:
+        # 正常结束时连接已读完，断开只是释放会话；取消、超时或调用方提前关闭生成器时立即断开仍在读取的连接
+        for tag in stop_events:
+            stop(tag)
+
+
+def render_and_upload_views(cloud, save_dir, i18n_texts, api_key, upload_cache=None, image_max_side=0,
+                            on_view=None, max_upload_workers=3, cancel_event=None, render_cache=None,
+                            data_digest=None):
+    """流水线：每渲染完一个视图就提交后台上传，同时继续渲染下一个视图。
+
+    返回 (视图路径字典, 按VLM_VIEW_ORDER排列的图片引用列表, 上传字节数, 渲染耗时)。
+    渲染使用各自独立的Figure（不经过pyplot），可以在工作线程中运行。
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    x, y, z, labels, _, _points = cloud
+    if labels is None or labels.size == 0:
+        return {}, [], 0, 0.0
+    if not os.path.exists(save_dir): os.makedirs(save_dir)
+    coords = (x, y, z)
+    paths, uploads = {}, {}
+    render_start = time.perf_counter()
+    if render_cache is not None and data_digest is None:
+        data_digest = cloud_content_digest(cloud)
+    with ThreadPoolExecutor(max_workers=max_upload_workers) as pool:
+        for key, (h_axis, v_axis, name_key) in VIEW_PROJECTIONS.items():
+            if cancel_event is not None and cancel_event.is_set():
+                raise AnalysisCancelled()
+            paths[key] = render_view_cached(coords[h_axis], coords[v_axis], labels, i18n_texts[name_key], save_dir,
+                                            i18n_texts, render_cache, data_digest, key)
+            uploads[key] = pool.submit(resolve_image_reference, paths[key], api_key, upload_cache, image_max_side)
+            if on_view is not None:
+                on_view(key, paths[key])
+        render_seconds = time.perf_counter() - render_start
+        resolved = [uploads[key].result() for key in VLM_VIEW_ORDER]
+    print(f"{i18n_texts['render_complete_message']} {save_dir}")
+    return paths, [ref for ref, _ in resolved], sum(sent for _, sent in resolved), render_seconds
+
+
+I18N_TEXTS = {
+    "en": {
+        "window_title": "Point Cloud Scene Analyzer", "load_button": "Load Point Cloud (.txt)",
+        "analyze_button": "Analyze Scene with VLM", "clear_button": "Clear Output & Views",
+        "dark_mode_button": "Switch to Dark Mode", "light_mode_button": "Switch to Light Mode",
+        "api_key_label": "Dashscope API Key:", "output_label": "VLM Analysis:",
+        "views_tab_label": "Generated Views",
+        "threed_view_tab_label": "3D View",
+        "class_schema_label": "Class schema:", "class_schema_default": "Default ({count} classes)",
+        "load_schema_button": "Load Schema...",
+        "error_loading_schema": "Failed to load class schema: {error}",
+        "status_schema_changed": "Class schema: {name} ({count} classes)",
+        "status_schema_busy": "Cannot change the class schema while an analysis is running.",
+        "explore_tab_label": "Explore 2D", "explore_reset_button": "Reset View",
+        "explore_hint": "Scroll to zoom, drag to pan, double-click to reset.",
+        "explore_status": "{visible:,} of {total:,} points visible",
+        "launch_3d_button": "Launch 3D Viewer",
+        "threed_placeholder": "Load a point cloud and click 'Launch 3D Viewer'.",
+        "status_ready": "Ready. Load a point cloud file.",
+        "status_loading_file": "Loading file: {file_path}", "status_generating_views": "Generating 2D views...",
+        "status_views_generated": "2D views generated. Ready for analysis or 3D view.",
+        "status_views_skipped": "Point cloud loaded. 2D views skipped (no labels/data). Ready for 3D view or analysis if applicable.",
+        # New/Updated
+        "status_analyzing": "Analyzing scene with VLM... Please wait.",
+        "status_analysis_complete": "Analysis complete.",
+        "status_analysis_partial": "Receiving analysis...", "error_title": "Error",
+        "error_no_file": "Please load a point cloud file first.",
+        "error_no_views": "Please generate views first (load a file).",
+        "error_no_api_key": "Please enter your Dashscope API Key.",
+        "error_loading_point_cloud": "Failed to load point cloud: {error}",
+        "error_generating_views": "Failed to generate 2D views: {error}",
+        "error_loading_image": "Error loading image for display.",
+        "error_launching_3d": "Failed to launch 3D viewer: {error}",
+        "output_dir_name": "output_views", "top_view_name": "Top", "front_view_name": "Front", "side_view_name": "Side",
+        "view_title_suffix": "View", "saved_view_message": "Saved",
+        "cached_view_message": "Reused cached render",
+        "render_complete_message": "2D view rendering complete, images saved in:",
+        "language_select_label": "Language:",
+        "scene_list_label": "Scenes:", "scene_cache_label": "Scene cache limit:",
+        "render_cache_label": "Render cache limit:",
+        "status_scene_switched": "Switched to scene: {file_path}",
+        "reload_button": "Reload", "watch_file_checkbox": "Watch file for appends",
+        "status_scene_appended": "Scene updated: {count} new points appended.",
+        "status_scene_reloaded": "File was truncated or rewritten, or its label overlay changed; scene fully reloaded.",
+        "progressive_views_checkbox": "Progressive previews",
+        "preview_analysis_checkbox": "Allow analysis on previews",
+        "status_preview_shown": "Preview shown; rendering full-resolution views in the background...",
+        "error_no_2d_views_for_vlm": "No 2D views available for VLM analysis. Please ensure point cloud has labels/data and views were generated.",
+        "error_views_still_rendering": "Full-resolution views are still rendering. Enable 'Allow analysis on previews' to analyze the preview now.",
+        "cancel_analysis_button": "Cancel Analysis", "hedge_checkbox": "Hedge slow requests",
+        "first_token_timeout_label": "First-token timeout:", "inter_token_timeout_label": "Token gap timeout:",
+        "hedge_percentile_label": "Hedge after latency percentile:",
+        "status_analysis_cancelled": "Analysis cancelled.",
+        "auto_analyze_checkbox": "Auto-analyze after load",
+        "status_pipeline_rendering": "Rendering views and uploading them in parallel...",
+        "scene_stats_checkbox": "Attach scene statistics", "vlm_image_size_label": "VLM image size:",
+        "vlm_image_size_original": "Original",
+        "status_analysis_metrics": "Analysis complete. Uploaded {upload_kb:.1f} KB, first token after {first_token_s:.2f} s, total {total_s:.2f} s.",
+        "scene_stats_header": "Per-class statistics computed from the full point cloud ({total} points; extent x [{x0:.1f}, {x1:.1f}], y [{y0:.1f}, {y1:.1f}], z [{z0:.1f}, {z1:.1f}]). Occupancy is a {grid}x{grid} top-view grid, rows from max y to min y separated by '/', '#' = occupied:",
+        "scene_stats_line": "- {name}: {count} points ({share:.1f}%), x [{x0:.1f}, {x1:.1f}], y [{y0:.1f}, {y1:.1f}], height z [{z0:.1f}, {z1:.1f}], occupancy {grid_rows}",
+        "views_placeholder": "Load a point cloud to generate 2D views (requires labels/data).",  # Modified
+        "system_prompt": """You are a helpful AI assistant specializing in point cloud scene understanding. Given three orthogonal 2D projected views (top, front, side) of a 3D point cloud scene, describe the scene in detail. Identify major objects, their spatial relationships, and the overall environment type if possible. Be concise and informative.""",
+        "user_prompt": """Please analyze these three views of a point cloud scene and provide a comprehensive description."""
+    },
+    "zh": {
+        "window_title": "点云场景分析器", "load_button": "加载点云文件 (.txt)",
+        "analyze_button": "调用VLM分析场景", "clear_button": "清除输出和视图",
+        "dark_mode_button": "切换深色模式", "light_mode_button": "切换浅色模式",
+        "api_key_label": "Dashscope API 密钥:", "output_label": "VLM分析结果:",
+        "views_tab_label": "生成的视图",
+        "threed_view_tab_label": "三维视图",
+        "class_schema_label": "类别方案：", "class_schema_default": "默认（{count}类）",
+        "load_schema_button": "加载方案...",
+        "error_loading_schema": "加载类别方案失败：{error}",
+        "status_schema_changed": "类别方案：{name}（{count}类）",
+        "status_schema_busy": "分析进行中，无法切换类别方案。",
+        "explore_tab_label": "交互二维视图", "explore_reset_button": "复位视图",
+        "explore_hint": "滚轮缩放，拖动平移，双击复位。",
+        "explore_status": "可见 {visible:,} / {total:,} 个点",
+        "launch_3d_button": "启动三维查看器",
+        "threed_placeholder": "加载点云后，点击“启动三维查看器”。",
+        "status_ready": "就绪。请加载点云文件。",
+        "status_loading_file": "正在加载文件: {file_path}", "status_generating_views": "正在生成二维视图...",
+        "status_views_generated": "二维视图已生成。可以开始分析或查看三维视图。",
+        "status_views_skipped": "点云已加载。二维视图已跳过（无标签/数据）。可进行三维查看或VLM分析（若适用）。",
+        # New/Updated
+        "status_analyzing": "正在调用VLM分析场景... 请稍候。",
+        "status_analysis_complete": "分析完成。", "status_analysis_partial": "正在接收分析结果...",
+        "error_title": "错误", "error_no_file": "请先加载点云文件。",
+        "error_no_views": "请先生成视图 (加载文件)。", "error_no_api_key": "请输入您的Dashscope API密钥。",
+        "error_loading_point_cloud": "加载点云失败: {error}", "error_generating_views": "生成二维视图失败: {error}",
+        "error_loading_image": "错误：无法加载图片用于显示。",
+        "error_launching_3d": "启动三维查看器失败: {error}",
+        "output_dir_name": "output_views_zh", "top_view_name": "俯视图", "front_view_name": "正视图",
+        # output_dir_name changed for zh
+        "side_view_name": "侧视图",
+        "view_title_suffix": "视图", "saved_view_message": "已保存",
+        "cached_view_message": "已复用缓存的渲染结果",
+        "render_complete_message": "二维视图渲染完成，图像保存在：",
+        "scene_list_label": "场景列表:", "scene_cache_label": "场景缓存上限:",
+        "render_cache_label": "渲染缓存上限:",
+        "status_scene_switched": "已切换到场景: {file_path}",
+        "reload_button": "重新加载", "watch_file_checkbox": "监视文件追加",
+        "status_scene_appended": "场景已更新：新增 {count} 个点。",
+        "status_scene_reloaded": "文件被截断或改写，或标签覆盖文件已变化，已完整重新加载场景。",
+        "progressive_views_checkbox": "渐进式预览",
+        "preview_analysis_checkbox": "允许用预览图分析",
+        "status_preview_shown": "已显示预览，正在后台渲染全分辨率视图...",
+        "error_no_2d_views_for_vlm": "没有可用于VLM分析的2D视图。请确认点云包含数据/标签且视图已生成。",
+        "error_views_still_rendering": "全分辨率视图仍在渲染。勾选“允许用预览图分析”可立即分析预览图。",
+        "cancel_analysis_button": "取消分析", "hedge_checkbox": "慢请求对冲",
+        "first_token_timeout_label": "首token超时：", "inter_token_timeout_label": "token间隔超时：",
+        "hedge_percentile_label": "对冲触发百分位：",
+        "status_analysis_cancelled": "分析已取消。",
+        "auto_analyze_checkbox": "加载后自动分析",
+        "status_pipeline_rendering": "正在渲染视图并同时上传...",
+        "scene_stats_checkbox": "附带场景统计", "vlm_image_size_label": "VLM图片边长:",
+        "vlm_image_size_original": "原图",
+        "status_analysis_metrics": "分析完成。上传 {upload_kb:.1f} KB，首个token用时 {first_token_s:.2f} 秒，总耗时 {total_s:.2f} 秒。",
+        "scene_stats_header": "以下为根据完整点云计算的各类别统计（共 {total} 个点；范围 x [{x0:.1f}, {x1:.1f}]，y [{y0:.1f}, {y1:.1f}]，z [{z0:.1f}, {z1:.1f}]）。占据栅格为 {grid}x{grid} 的俯视网格，各行按y从大到小排列并以“/”分隔，“#”表示有点：",
+        "scene_stats_line": "- {name}：{count} 个点（{share:.1f}%），x [{x0:.1f}, {x1:.1f}]，y [{y0:.1f}, {y1:.1f}]，高度 z [{z0:.1f}, {z1:.1f}]，占据 {grid_rows}",
+        "language_select_label": "语言:", "views_placeholder": "加载点云以生成二维视图（需要标签/数据）。",  # Modified
+        "system_prompt": """你是一个精通点云场景理解的AI助手。给定一个三维点云场景的三个正交二维投影视图（俯视图、正视图、侧视图），请详细描述这个场景。识别主要的物体，它们的空间关系，如果可能的话，判断整体环境类型。请做到简洁且信息丰富。""",
+        "user_prompt": """请分析这三张点云场景的视图，并提供一个全面的描述。"""
+    }
+}
@@ -0,0 +1,621 @@
+"""本地HTTP服务：以任务队列的形式对外提供点云视图渲染与VLM场景描述。
+
+其他工具提交场景路径（或直接上传场景文本），任务依次经过加载、渲染、分析三组工作线程；
+客户端可以轮询任务状态，也可以通过SSE逐段接收模型输出的文本。
+已加载的场景（SceneCache）、渲染结果（RenderCache）和已上传图片的引用在所有请求之间共享，
+重复查询热点场景时只剩一次文本往返。
+
+启动：
+    python p2txt_service.py --port 8766 --api-key sk-xxx
+
+接口：
+    POST   /jobs                     JSON {"scene_path": ..., "analyze": true, "lang": "zh", ...}
+                                     或以 text/plain 上传场景内容（参数放在查询串中，如 ?analyze=0&lang=en）
+    GET    /jobs/<id>                任务状态、视图路径、场景统计与已生成的文本
+    GET    /jobs/<id>/events         SSE事件流：status / view / text / done / error
+    GET    /jobs/<id>/views/<view>   视图PNG（view为 top / front / side）
+    DELETE /jobs/<id>                取消任务
+    GET    /health                   队列与缓存概况
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from p2txt_core import (
+    I18N_TEXTS, VLM_VIEW_ORDER, DEFAULT_SCENE_CACHE_MB, DEFAULT_RENDER_CACHE_MB, DEFAULT_VLM_IMAGE_MAX_SIDE,
+    DEFAULT_FIRST_TOKEN_TIMEOUT_S, DEFAULT_INTER_TOKEN_TIMEOUT_S, PointCloudFileReader, SceneEntry, SceneCache,
+    RenderCache, UploadedImageCache, FirstTokenLatencyTracker, AnalysisCancelled, VlmStreamTimeout,
+    DashscopeApiError, load_point_cloud, render_point_cloud_views, compute_scene_statistics,
+    format_scene_statistics, prepare_vlm_image, resolve_image_reference, render_and_upload_views,
+    stream_vlm_analysis_guarded,
+    scene_output_dir, active_class_schema, set_active_class_schema,
+)
+from class_schema import ClassSchema
+
+# 任务状态；后三种为终态
+JOB_QUEUED, JOB_LOADING, JOB_RENDERING, JOB_ANALYZING = "queued", "loading", "rendering", "analyzing"
+JOB_DONE, JOB_FAILED, JOB_CANCELLED = "done", "failed", "cancelled"
+TERMINAL_STATES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+UPLOAD_CHUNK_BYTES = 1 << 20
+
+
+def statistics_to_json(stats):
+    """把compute_scene_statistics的结果转换为可JSON序列化的结构。"""
+    if not stats:
+        return None
+    schema = active_class_schema()
+    classes = []
+    for label_id, count, lo, hi, grid in zip(stats["label_ids"], stats["counts"], stats["mins"], stats["maxs"],
+                                             stats["occupancy"]):
+        label_id = int(label_id)
+        classes.append({
+            "label": label_id, "name": schema.label_name(label_id),
+            "count": int(count), "min": [float(v) for v in lo], "max": [float(v) for v in hi],
+            "occupancy": ["".join("#" if cell else "." for cell in row) for row in grid]})
+    return {"total": stats["total"], "grid_size": stats["grid_size"],
+            "scene_min": [float(v) for v in stats["scene_min"]], "scene_max": [float(v) for v in stats["scene_max"]],
+            "classes": classes}
+
+
+class ServiceConfig:
+    def __init__(self, api_key="", output_dir="service_views", upload_dir="service_uploads",
+                 render_cache_dir="render_cache", scene_cache_mb=DEFAULT_SCENE_CACHE_MB,
+                 render_cache_mb=DEFAULT_RENDER_CACHE_MB, loader_workers=2, render_workers=2, vlm_workers=4,
+                 image_max_side=DEFAULT_VLM_IMAGE_MAX_SIDE, first_token_timeout_s=DEFAULT_FIRST_TOKEN_TIMEOUT_S,
+                 inter_token_timeout_s=DEFAULT_INTER_TOKEN_TIMEOUT_S, hedge=False, max_upload_mb=512,
+                 max_finished_jobs=200):
+        self.api_key = api_key  # 请求中未提供api_key时使用
+        self.output_dir = output_dir
+        self.upload_dir = upload_dir  # 上传的场景按内容哈希保存，相同内容复用同一场景缓存
+        self.render_cache_dir = render_cache_dir
+        self.scene_cache_mb = scene_cache_mb
+        self.render_cache_mb = render_cache_mb
+        self.loader_workers = loader_workers
+        self.render_workers = render_workers
+        self.vlm_workers = vlm_workers
+        self.image_max_side = image_max_side
+        self.first_token_timeout_s = first_token_timeout_s
+        self.inter_token_timeout_s = inter_token_timeout_s
+        self.hedge = hedge
+        self.max_upload_mb = max_upload_mb
+        self.max_finished_jobs = max_finished_jobs  # 超出后丢弃最早结束的任务记录
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(api_key=args.api_key, output_dir=args.output_dir, upload_dir=args.upload_dir,
+                   render_cache_dir=args.render_cache_dir, scene_cache_mb=args.scene_cache_mb,
+                   render_cache_mb=args.render_cache_mb, loader_workers=args.loader_workers,
+                   render_workers=args.render_workers, vlm_workers=args.vlm_workers,
+                   image_max_side=args.image_max_side, first_token_timeout_s=args.first_token_timeout,
+                   inter_token_timeout_s=args.inter_token_timeout, hedge=args.hedge,
+                   max_upload_mb=args.max_upload_mb, max_finished_jobs=args.max_finished_jobs)
+
+
+class AnalysisJob:
+    """一个渲染/分析任务。事件按顺序记录，SSE客户端可以从任意位置开始追赶。"""
+
+    def __init__(self, scene_path, lang="zh", analyze=True, api_key="", system_prompt=None, user_prompt=None,
+                 scene_stats=True):
+        self.id = uuid.uuid4().hex
+        self.scene_path = os.path.abspath(scene_path)
+        self.lang = lang
+        self.analyze = analyze
+        self.api_key = api_key
+        self.system_prompt = system_prompt
+        self.user_prompt = user_prompt
+        self.scene_stats = scene_stats
+        self.status = JOB_QUEUED
+        self.created_at = time.time()
+        self.finished_at = None
+        self.views = {}
+        self.statistics = None
+        self.text = ""
+        self.error = None
+        self.metrics = {}
+        self.cancel_event = threading.Event()
+        self._events = []  # (事件类型, 数据)
+        self._cond = threading.Condition()
+
+    @property
+    def i18n(self):
+        return I18N_TEXTS[self.lang]
+
+    def is_finished(self):
+        return self.status in TERMINAL_STATES
+
+    def emit(self, event, data):
+        with self._cond:
+            self._events.append((event, data))
+            self._cond.notify_all()
+
+    def set_status(self, status, final_event=None, error=None):
+        """切换状态并追加status事件。结束状态的final_event（done/error）与状态在同一次持锁中写入：
+        SSE读取方一旦看到任务结束，结束事件一定已经可读。返回是否切换成功（已结束的任务不再变化）。"""
+        with self._cond:
+            if self.is_finished():
+                return False
+            self.status = status
+            if status in TERMINAL_STATES:
+                self.finished_at = time.time()
+                if error is not None:
+                    self.error = error
+            self._events.append(("status", {"status": status}))
+            if final_event is not None:
+                self._events.append(final_event)
+            self._cond.notify_all()
+            return True
+
+    def add_view(self, key, path):
+        # 渲染线程写入，HTTP处理线程通过snapshot读取，需在锁内修改
+        with self._cond:
+            self.views[key] = path
+        self.emit("view", {"view": key, "path": path, "url": f"/jobs/{self.id}/views/{key}"})
+
+    def add_text(self, text):
+        self.text += text
+        self.emit("text", {"text": text})
+
+    def finish(self):
+        self.set_status(JOB_DONE, final_event=("done", {"text": self.text, "metrics": self.metrics}))
+
+    def fail(self, message):
+        self.set_status(JOB_FAILED, final_event=("error", {"error": message}), error=message)
+
+    def events_since(self, index, timeout):
+        """返回index之后的事件；暂无新事件时最多等待timeout秒。"""
+        with self._cond:
+            if index >= len(self._events) and not self.is_finished():
+                self._cond.wait(timeout)
+            return self._events[index:]
+
+    def snapshot(self):
+        with self._cond:
+            views = dict(self.views)
+            status, finished_at, text, error = self.status, self.finished_at, self.text, self.error
+        return {"id": self.id, "status": status, "scene_path": self.scene_path, "lang": self.lang,
+                "analyze": self.analyze, "created_at": self.created_at, "finished_at": finished_at,
+                "views": {key: {"path": path, "url": f"/jobs/{self.id}/views/{key}"}
+                          for key, path in views.items()},
+                "statistics": statistics_to_json(self.statistics), "text": text, "error": error, "metrics": self.metrics}
+
+
+class SceneService:
+    """任务队列与共享缓存：加载、渲染、分析各有一组工作线程，任务在各阶段之间依次传递。"""
+
+    def __init__(self, config):
+        self.config = config
+        self.scene_cache = SceneCache(config.scene_cache_mb * 1024 * 1024)
+        self.render_cache = RenderCache(os.path.abspath(config.render_cache_dir),
+                                        config.render_cache_mb * 1024 * 1024)
+        self.upload_cache = UploadedImageCache()
+        self.latency_tracker = FirstTokenLatencyTracker()
+        self.loader_pool = ThreadPoolExecutor(config.loader_workers, thread_name_prefix="p2t-load")
+        self.render_pool = ThreadPoolExecutor(config.render_workers, thread_name_prefix="p2t-render")
+        self.vlm_pool = ThreadPoolExecutor(config.vlm_workers, thread_name_prefix="p2t-vlm")
+        self._lock = threading.Lock()  # 保护场景表、任务表和SceneCache
+        self._scenes = {}  # file_path -> SceneEntry
+        self._scene_locks = {}  # file_path -> Lock，同一场景的加载/渲染串行执行
+        self._view_paths = {}  # (file_path, lang) -> 已渲染的视图路径字典
+        self._jobs = OrderedDict()  # job_id -> AnalysisJob，按提交顺序
+
+    # ---- 任务管理 ----
+    def submit(self, job):
+        if not os.path.isfile(job.scene_path):
+            raise FileNotFoundError(f"场景文件不存在：{job.scene_path}")
+        if job.lang not in I18N_TEXTS:
+            raise ValueError(f"不支持的语言：{job.lang}")
+        if job.analyze and not (job.api_key or self.config.api_key):
+            raise ValueError("未提供API密钥，无法分析。可以设置analyze=false只渲染视图。")
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune_jobs()
+        job.emit("status", {"status": job.status})
+        self.loader_pool.submit(self._run_stage, job, self._load_stage)
+        return job
+
+    def get_job(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel_job(self, job_id):
+        job = self.get_job(job_id)
+        if job is not None and not job.is_finished():
+            job.cancel_event.set()
+            job.set_status(JOB_CANCELLED)
+        return job
+
+    def _prune_jobs(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.is_finished()]
+        for job_id in finished[:max(len(finished) - self.config.max_finished_jobs, 0)]:
+            del self._jobs[job_id]
+
+    def health(self):
+        with self._lock:
+            by_status = {}
+            for job in self._jobs.values():
+                by_status[job.status] = by_status.get(job.status, 0) + 1
+            return {"jobs": by_status, "scenes": len(self._scenes),
+                    "scene_cache_bytes": self.scene_cache.total_bytes(),
+                    "loaded_scenes": sum(entry.is_loaded() for entry in self._scenes.values())}
+
+    def save_upload(self, stream, length):
+        """把上传的场景内容按块写入磁盘，以内容哈希命名，返回文件路径。"""
+        if length > self.config.max_upload_mb * 1024 * 1024:
+            raise ValueError(f"上传内容超过 {self.config.max_upload_mb} MB 上限")
+        os.makedirs(self.config.upload_dir, exist_ok=True)
+        digest = hashlib.sha1()
+        tmp_path = os.path.join(self.config.upload_dir, f"upload.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                remaining = length
+                while remaining > 0:
+                    chunk = stream.read(min(UPLOAD_CHUNK_BYTES, remaining))
+                    if not chunk:
+                        raise ValueError("上传内容不完整")
+                    digest.update(chunk)
+                    f.write(chunk)
+                    remaining -= len(chunk)
+            path = os.path.abspath(os.path.join(self.config.upload_dir, digest.hexdigest() + ".txt"))
+            if os.path.exists(path):
+                os.remove(tmp_path)  # 相同内容已上传过，保留原文件使场景缓存继续有效
+            else:
+                os.replace(tmp_path, path)
+            return path
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def shutdown(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job.cancel_event.set()  # 排队中的阶段会直接返回
+        for pool in (self.loader_pool, self.render_pool, self.vlm_pool):
+            pool.shutdown(wait=True)
+
+    # ---- 各阶段 ----
+    def _run_stage(self, job, stage):
+        if job.cancel_event.is_set():
+            return
+        try:
+            stage(job)
+        except AnalysisCancelled:
+            job.set_status(JOB_CANCELLED)
+        except VlmStreamTimeout as e:
+            job.fail(f"VLM响应超时：{e}")
+        except DashscopeApiError as e:
+            job.fail(f"Dashscope API错误: {e}")
+        except Exception as e:
+            print(f"任务 {job.id} 失败：{e}")
+            job.fail(str(e))
+
+    def _scene_lock(self, file_path):
+        with self._lock:
+            return self._scene_locks.setdefault(file_path, threading.Lock())
+
+    @contextlib.contextmanager
+    def _using_scene(self, file_path):
+        """持有场景锁并固定场景：其他任务触发的缓存淘汰不会在使用期间释放它的点云和读取器。"""
+        with self._scene_lock(file_path):
+            with self._lock:
+                entry = self._scenes.get(file_path)
+                if entry is None:
+                    entry = SceneEntry(file_path, scene_output_dir(os.path.abspath(self.config.output_dir),
+                                                                   file_path))
+                    self._scenes[file_path] = entry
+                self.scene_cache.pin(entry)
+            try:
+                yield entry
+            finally:
+                with self._lock:
+                    self.scene_cache.unpin(entry)
+
+    def _load_stage(self, job):
+        job.set_status(JOB_LOADING)
+        file_path = job.scene_path
+        with self._using_scene(file_path) as entry:
+            if entry.is_loaded():
+                # 热点场景：只检查文件是否有追加或改写
+                status, _start = entry.reader.refresh()
+                if status != 'unchanged':
+                    entry.cloud = entry.reader.cloud()
+                    entry.statistics = compute_scene_statistics(entry.cloud[5], entry.cloud[3])
+                    self._forget_views(file_path)
+            else:
+                entry.reader = PointCloudFileReader(file_path)
+                entry.cloud = load_point_cloud(file_path, reader=entry.reader)
+                entry.statistics = compute_scene_statistics(entry.cloud[5], entry.cloud[3])
+                self._forget_views(file_path)
+            with self._lock:
+                self.scene_cache.touch(entry)
+            job.statistics = entry.statistics
+        self.render_pool.submit(self._run_stage, job, self._render_stage)
+
+    def _forget_views(self, file_path):
+        with self._lock:
+            for key in [key for key in self._view_paths if key[0] == file_path]:
+                del self._view_paths[key]
+
+    def _render_stage(self, job):
+        job.set_status(JOB_RENDERING)
+        file_path = job.scene_path
+        uploaded = None  # 冷场景分析时渲染与上传流水线执行的结果：(图片引用列表, 上传字节数)
+        with self._using_scene(file_path) as entry:
+            with self._lock:
+                paths = self._view_paths.get((file_path, job.lang))
+            if not paths or not all(os.path.exists(p) for p in paths.values()):
+                cloud = entry.cloud
+                if cloud is None:
+                    # 加载后已被场景缓存释放（内存预算过小），重新加载
+                    entry.reader = PointCloudFileReader(file_path)
+                    cloud = entry.cloud = load_point_cloud(file_path, reader=entry.reader)
+                    with self._lock:
+                        self.scene_cache.touch(entry)
+                # 每种语言的视图标题不同，分目录保存
+                save_dir = os.path.join(entry.output_dir, job.lang)
+                if job.analyze:
+                    # 每渲染完一个视图就开始缩小并上传，首token时间不再是渲染加三次上传之和；
+                    # 缩小图片会写入场景目录，上传在返回前完成，仍处于场景锁内
+                    paths, image_refs, upload_bytes, _render_s = render_and_upload_views(
+                        cloud, save_dir, job.i18n, job.api_key or self.config.api_key,
+                        upload_cache=self.upload_cache, image_max_side=self.config.image_max_side,
+                        on_view=job.add_view, cancel_event=job.cancel_event, render_cache=self.render_cache,
+                        data_digest=entry.content_digest(cloud))
+                    uploaded = (image_refs, upload_bytes)
+                else:
+                    paths = render_point_cloud_views(file_path, save_dir, job.i18n, cloud=cloud,
+                                                     render_cache=self.render_cache, cancel_event=job.cancel_event,
+                                                     data_digest=entry.content_digest(cloud))
+                if job.cancel_event.is_set():
+                    raise AnalysisCancelled()
+                with self._lock:
+                    self._view_paths[(file_path, job.lang)] = paths
+            if job.analyze and paths and uploaded is None:
+                # 缩小图片会写入场景目录，放在场景锁内避免并发任务同时写同一文件
+                vlm_paths = {key: prepare_vlm_image(path, self.config.image_max_side) for key, path in paths.items()}
+            else:
+                vlm_paths = paths
+        if uploaded is None:
+            for key in VLM_VIEW_ORDER:
+                if key in paths:
+                    job.add_view(key, paths[key])
+        if not job.analyze:
+            job.finish()
+            return
+        if not paths:
+            raise ValueError(job.i18n["error_no_2d_views_for_vlm"])
+        self.vlm_pool.submit(self._run_stage, job, lambda j: self._analyze_stage(j, vlm_paths, uploaded))
+
+    def _analyze_stage(self, job, vlm_paths, uploaded=None):
+        job.set_status(JOB_ANALYZING)
+        api_key = job.api_key or self.config.api_key
+        request_start = time.perf_counter()
+        if uploaded is not None:
+            image_refs, upload_bytes = uploaded
+        else:
+            if job.cancel_event.is_set():
+                raise AnalysisCancelled()
+            # 视图已渲染过：三个视图同时解析（多数直接命中上传缓存，未命中的并发上传）
+            with ThreadPoolExecutor(max_workers=len(VLM_VIEW_ORDER)) as pool:
+                futures = [pool.submit(resolve_image_reference, vlm_paths[key], api_key, self.upload_cache)
+                           for key in VLM_VIEW_ORDER]
+                resolved = [future.result() for future in futures]
+            image_refs = [image_ref for image_ref, _ in resolved]
+            upload_bytes = sum(sent_bytes for _, sent_bytes in resolved)
+
+        system_prompt = job.system_prompt or job.i18n["system_prompt"]
+        user_prompt = job.user_prompt or job.i18n["user_prompt"]
+        if job.scene_stats and job.statistics:
+            user_prompt += "\n\n" + format_scene_statistics(job.statistics, job.i18n)
+        first_token_time = None
+        for text_content in stream_vlm_analysis_guarded(
+                api_key, image_refs, system_prompt, user_prompt, cancel_event=job.cancel_event,
+                first_token_timeout_s=self.config.first_token_timeout_s,
+                inter_token_timeout_s=self.config.inter_token_timeout_s, latency_tracker=self.latency_tracker,
+                hedge=self.config.hedge):
+            if first_token_time is None:
+                first_token_time = time.perf_counter() - request_start
+            job.add_text(text_content)
+        job.metrics = {"upload_bytes": upload_bytes, "first_token_s": first_token_time,
+                       "total_s": time.perf_counter() - request_start}
+        job.finish()
+
+
+class ServiceServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        super().__init__(address, ServiceHandler)
+        self.service = service
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def _flag(value, default):
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() not in ("0", "false", "no", "off")
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    server: ServiceServer
+    protocol_version = "HTTP/1.1"
+    sse_poll_s = 15.0  # SSE空闲时发送注释行的间隔，及时发现已断开的客户端
+
+    def log_message(self, format, *args):
+        print(f"[{self.address_string()}] {format % args}")
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message):
+        self._send_json(status, {"error": message})
+
+    def _route(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        return parts, parse_qs(url.query)
+
+    def do_GET(self):
+        parts, _query = self._route()
+        service = self.server.service
+        if parts == ["health"]:
+            self._send_json(200, service.health())
+            return
+        if len(parts) < 2 or parts[0] != "jobs":
+            self._send_error(404, self.path)
+            return
+        job = service.get_job(parts[1])
+        if job is None:
+            self._send_error(404, f"任务不存在：{parts[1]}")
+        elif len(parts) == 2:
+            self._send_json(200, job.snapshot())
+        elif parts[2:] == ["events"]:
+            self._stream_events(job)
+        elif len(parts) == 4 and parts[2] == "views":
+            self._send_view(job, parts[3])
+        else:
+            self._send_error(404, self.path)
+
+    def do_POST(self):
+        parts, query = self._route()
+        if parts != ["jobs"]:
+            self._send_error(404, self.path)
+            return
+        service = self.server.service
+        length = int(self.headers.get("Content-Length", 0))
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip()
+        try:
+            if content_type == "application/json":
+                params = json.loads(self.rfile.read(length) or b"{}")
+                if not params.get("scene_path"):
+                    raise ValueError("缺少scene_path")
+                scene_path = params["scene_path"]
+            else:
+                # 其余内容类型视为上传的场景文本（每行 x y z 强度 标签），参数取自查询串
+                params = {key: values[-1] for key, values in query.items()}
+                scene_path = service.save_upload(self.rfile, length)
+            job = AnalysisJob(scene_path, lang=params.get("lang", "zh"), analyze=_flag(params.get("analyze"), True),
+                              api_key=params.get("api_key", ""), system_prompt=params.get("system_prompt"),
+                              user_prompt=params.get("user_prompt"),
+                              scene_stats=_flag(params.get("scene_stats"), True))
+            service.submit(job)
+        except (ValueError, FileNotFoundError) as e:
+            self.close_connection = True  # 请求体可能未读完
+            self._send_error(400, str(e))
+            return
+        self._send_json(202, {"id": job.id, "status_url": f"/jobs/{job.id}",
+                              "events_url": f"/jobs/{job.id}/events"})
+
+    def do_DELETE(self):
+        parts, _query = self._route()
+        if len(parts) != 2 or parts[0] != "jobs":
+            self._send_error(404, self.path)
+            return
+        job = self.server.service.cancel_job(parts[1])
+        if job is None:
+            self._send_error(404, f"任务不存在：{parts[1]}")
+        else:
+            self._send_json(200, job.snapshot())
+
+    def _send_view(self, job, key):
+        path = job.views.get(key)
+        if path is None or not os.path.exists(path):
+            self._send_error(404, f"视图不存在：{key}")
+            return
+        with open(path, "rb") as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_events(self, job):
+        # 支持断线重连：Last-Event-ID为客户端已收到的最后一个事件序号
+        index = int(self.headers.get("Last-Event-ID", -1)) + 1
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            while True:
+                events = job.events_since(index, self.sse_poll_s)
+                if not events:
+                    if job.is_finished():
+                        return
+                    self.wfile.write(b":keep-alive\n\n")
+                    self.wfile.flush()
+                    continue
+                for event, data in events:
+                    payload = json.dumps(data, ensure_ascii=False)
+                    self.wfile.write(f"id:{index}\nevent:{event}\ndata:{payload}\n\n".encode("utf-8"))
+                    index += 1
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 客户端断开，任务继续执行
+
+
+def main():
+    parser = argparse.ArgumentParser(description="点云渲染与场景分析的本地HTTP服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--api-key", default=os.environ.get("DASHSCOPE_API_KEY", ""),
+                        help="默认的DashScope API密钥，默认读取DASHSCOPE_API_KEY环境变量")
+    parser.add_argument("--output-dir", default="service_views", help="视图输出目录")
+    parser.add_argument("--upload-dir", default="service_uploads", help="上传场景的保存目录")
+    parser.add_argument("--render-cache-dir", default="render_cache", help="渲染缓存目录，可与图形界面共用")
+    parser.add_argument("--scene-cache-mb", type=int, default=DEFAULT_SCENE_CACHE_MB)
+    parser.add_argument("--render-cache-mb", type=int, default=DEFAULT_RENDER_CACHE_MB)
+    parser.add_argument("--loader-workers", type=int, default=2)
+    parser.add_argument("--render-workers", type=int, default=2)
+    parser.add_argument("--vlm-workers", type=int, default=4)
+    parser.add_argument("--image-max-side", type=int, default=DEFAULT_VLM_IMAGE_MAX_SIDE,
+                        help="发送给VLM前缩小到的最长边（像素），0为原图")
+    parser.add_argument("--first-token-timeout", type=float, default=DEFAULT_FIRST_TOKEN_TIMEOUT_S)
+    parser.add_argument("--inter-token-timeout", type=float, default=DEFAULT_INTER_TOKEN_TIMEOUT_S)
+    parser.add_argument("--hedge", action="store_true", help="开启慢请求对冲")
+    parser.add_argument("--max-upload-mb", type=int, default=512)
+    parser.add_argument("--max-finished-jobs", type=int, default=200)
+    parser.add_argument("--class-schema", default=None, help="类别方案JSON文件（见schemas目录），默认使用内置的6类方案")
+    args = parser.parse_args()
+
+    if args.class_schema:
+        set_active_class_schema(ClassSchema.from_file(args.class_schema))
+
+    service = SceneService(ServiceConfig.from_args(args))
+    server = ServiceServer((args.host, args.port), service)
+    print(f"点云分析服务已启动：{server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
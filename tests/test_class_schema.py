@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from class_schema import ClassSchema, MAX_DIRECT_LUT_SIZE
+
+COLORS = {0: ("Ground", "#000000"), 2: ("Road", "#00FF00"), 5: ("Car", "#0000FF")}
+
+
+def _reference_index(schema, labels):
+    """逐个标签查找的参考实现。"""
+    ids = schema.ids.tolist()
+    return np.array([ids.index(label) if label in ids else schema.unknown_index for label in labels.tolist()])
+
+
+@pytest.mark.parametrize("label_colors", [
+    COLORS,
+    {MAX_DIRECT_LUT_SIZE + 7: ("Sparse", "#123456"), 3: ("Low", "#654321")},  # ID超出直接查表范围，走二分查找
+    {-2: ("Negative", "#AAAAAA"), 1: ("One", "#BBBBBB")},  # 负数ID同样走二分查找
+])
+def test_index_maps_negative_and_out_of_range_labels_to_unknown(label_colors):
+    schema = ClassSchema("test", label_colors)
+    labels = np.array([0, 1, 2, 3, 5, 6, -1, -2, -300, 7, 255, MAX_DIRECT_LUT_SIZE + 7, 10 ** 9], dtype=np.int64)
+    np.testing.assert_array_equal(schema.index(labels), _reference_index(schema, labels))
+
+
+def test_unknown_labels_get_unknown_color_and_count():
+    schema = ClassSchema("test", COLORS, unknown_color="#FF00FF")
+    labels = np.array([0, 2, 2, -1, 6, 1000], dtype=np.int32)
+    class_index = schema.index(labels)
+    np.testing.assert_array_equal(schema.counts(class_index), [1, 2, 0, 3])
+    np.testing.assert_allclose(schema.colors_rgb(labels)[3:], [[1.0, 0.0, 1.0]] * 3)
+    assert schema.label_name(-1) == "Label -1"
+    assert schema.label_name(5) == "Car"
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from p2txt_core import I18N_TEXTS, IncrementalViewRenderer, SceneEntry, render_point_cloud_views
+
+
+def _cloud(points, labels):
+    return points[:, 0], points[:, 1], points[:, 2], labels, np.zeros(labels.size), points
+
+
+@pytest.fixture
+def scene():
+    rng = np.random.default_rng(0)
+    points = rng.random((3000, 3)) * 10
+    labels = rng.integers(0, 4, 3000)
+    return points, labels
+
+
+def _pixels(path):
+    return np.asarray(Image.open(path).convert('RGB')).astype(int)
+
+
+def test_append_inside_limits_draws_only_new_points(scene, tmp_path):
+    points, labels = scene
+    renderer = IncrementalViewRenderer(str(tmp_path / "inc"), I18N_TEXTS["en"])
+    renderer.update(_cloud(points[:2900], labels[:2900]), 0)
+    state = renderer._views['top']
+    paths = renderer.update(_cloud(points, labels), 2900)
+    # 原画布上直接追加，不保留散点对象
+    assert renderer._views['top'] is state and state["rendered"] == 3000
+    assert not state["ax"].collections
+    full = render_point_cloud_views("x", str(tmp_path / "full"), I18N_TEXTS["en"], cloud=_cloud(points, labels))
+    for key, path in paths.items():
+        # 只有新点的叠放顺序与完整绘制不同
+        differs = np.abs(_pixels(path) - _pixels(full[key])).sum(axis=-1) > 30
+        assert differs.mean() < 0.01
+
+
+def test_append_outside_limits_or_with_new_class_redraws(scene, tmp_path):
+    points, labels = scene
+    renderer = IncrementalViewRenderer(str(tmp_path / "inc"), I18N_TEXTS["en"])
+    renderer.update(_cloud(points[:2900], labels[:2900]), 0)
+    state = renderer._views['top']
+    shifted = points.copy()
+    shifted[2900:, 0] += 100
+    renderer.update(_cloud(shifted, labels), 2900)
+    assert renderer._views['top'] is not state
+
+    state = renderer._views['top']
+    more_points = np.vstack([shifted, shifted[:10]])
+    more_labels = np.concatenate([labels, np.full(10, 5)])  # 图例新增一个类别
+    renderer.update(_cloud(more_points, more_labels), 3000)
+    assert renderer._views['top'] is not state
+    assert renderer._views['top']["rendered"] == 3010
+
+
+def test_renderer_memory_counts_towards_scene(scene, tmp_path):
+    points, labels = scene
+    entry = SceneEntry(str(tmp_path / "a.txt"), str(tmp_path))
+    entry.cloud = _cloud(points, labels)
+    base = entry.nbytes()
+    entry.view_renderer = IncrementalViewRenderer(str(tmp_path / "inc"), I18N_TEXTS["en"])
+    entry.view_renderer.update(entry.cloud, 0)
+    assert entry.view_renderer.nbytes() >= 3 * 3000 * 2400 * 4
+    assert entry.nbytes() == base + entry.view_renderer.nbytes()
@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pytest
+
+from label_overlay import (apply_overlay, create_overlay, geometry_checksum, overlay_matches, overlay_path,
+                           read_overlay_header, write_overlay_labels)
+from p2txt_core import PointCloudFileReader
+
+
+def _write_scene(path, xyz, labels):
+    with open(path, "w") as f:
+        for (x, y, z), label in zip(xyz, labels):
+            f.write(f"{x} {y} {z} 0.5 {label}\n")
+
+
+@pytest.fixture
+def geometry():
+    rng = np.random.default_rng(0)
+    return np.round(rng.random((12, 3)) * 100, 3)
+
+
+def _bump_mtime(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_overlay_round_trip(tmp_path, geometry):
+    scene = str(tmp_path / "scene.txt")
+    create_overlay(scene, geometry, np.zeros(12, dtype=int))
+    write_overlay_labels(scene, [7, 8], indices=[2, 5])
+    assert read_overlay_header(overlay_path(scene)) == (12, geometry_checksum(geometry))
+    labels = np.full(12, -1)
+    assert apply_overlay(scene, geometry, labels)
+    assert labels[2] == 7 and labels[5] == 8 and labels.sum() == 15
+
+
+def test_checksum_mismatch_is_ignored(tmp_path, geometry):
+    scene = tmp_path / "scene.txt"
+    _write_scene(scene, geometry, np.ones(12, dtype=int))
+    moved = geometry.copy()
+    moved[3, 0] += 1
+    create_overlay(str(scene), moved, np.full(12, 9))
+    assert not overlay_matches(str(scene), geometry)
+    assert overlay_matches(str(scene), moved)
+    labels = PointCloudFileReader(str(scene)).load()[3]
+    np.testing.assert_array_equal(labels, np.ones(12))
+
+
+def test_overlay_matches_requires_same_point_count(tmp_path, geometry):
+    scene = str(tmp_path / "scene.txt")
+    create_overlay(scene, geometry[:10], np.zeros(10, dtype=int))
+    assert overlay_matches(scene, geometry[:10])
+    assert not overlay_matches(scene, geometry)
+
+
+def test_overlay_applies_to_appended_points(tmp_path, geometry):
+    scene = tmp_path / "scene.txt"
+    _write_scene(scene, geometry[:8], np.zeros(8, dtype=int))
+    # 覆盖文件覆盖全部12个点，场景文件仍在写入
+    create_overlay(str(scene), geometry, np.arange(12) + 10)
+    reader = PointCloudFileReader(str(scene))
+    before = reader.load()
+    np.testing.assert_array_equal(before[3], np.zeros(8))  # 点数不足，覆盖文件暂不适用
+    with open(scene, "a") as f:
+        for (x, y, z) in geometry[8:]:
+            f.write(f"{x} {y} {z} 0.5 0\n")
+    _bump_mtime(scene)
+    status, start = reader.refresh()
+    assert (status, start) == ("appended", 8)
+    np.testing.assert_array_equal(reader.cloud()[3][8:], [18, 19, 20, 21])
+
+
+def test_overlay_change_relabels_without_touching_earlier_views(tmp_path, geometry):
+    scene = tmp_path / "scene.txt"
+    _write_scene(scene, geometry, np.ones(12, dtype=int))
+    reader = PointCloudFileReader(str(scene))
+    before = reader.load()
+    assert reader.refresh() == ("unchanged", 12)
+
+    create_overlay(str(scene), geometry, np.full(12, 4))
+    assert reader.refresh() == ("reloaded", 0)
+    relabeled = reader.cloud()
+    np.testing.assert_array_equal(relabeled[3], np.full(12, 4))
+    np.testing.assert_array_equal(before[3], np.ones(12))
+
+    write_overlay_labels(str(scene), [6], indices=[0])
+    _bump_mtime(overlay_path(str(scene)))
+    assert reader.refresh() == ("reloaded", 0)
+    assert reader.cloud()[3][0] == 6 and relabeled[3][0] == 4
+
+    os.remove(overlay_path(str(scene)))  # 删除覆盖文件后恢复文本中的标签
+    assert reader.refresh() == ("reloaded", 0)
+    np.testing.assert_array_equal(reader.cloud()[3], np.ones(12))
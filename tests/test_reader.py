@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+import pytest
+
+from p2txt_core import PointCloudFileReader
+
+
+def _rows(start, count):
+    return "".join(f"{i} {i + 0.5} {i * 2} 0.1 {i % 4}\n" for i in range(start, start + count))
+
+
+@pytest.fixture
+def scene(tmp_path):
+    path = tmp_path / "scene.txt"
+    path.write_text(_rows(0, 10))
+    return path
+
+
+def _bump_mtime(path):
+    # 同一时间戳内的两次写入在部分文件系统上mtime相同，测试中显式推进
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_append_parses_only_new_rows(scene):
+    reader = PointCloudFileReader(str(scene))
+    reader.load()
+    with open(scene, "a") as f:
+        f.write(_rows(10, 5))
+    _bump_mtime(scene)
+    assert reader.refresh() == ("appended", 10)
+    x, _y, _z, labels, _intensity, points = reader.cloud()
+    np.testing.assert_array_equal(x, np.arange(15))
+    np.testing.assert_array_equal(labels, np.arange(15) % 4)
+    assert reader.refresh() == ("unchanged", 15)
+
+
+def test_unterminated_tail_is_reparsed_without_touching_earlier_views(scene):
+    scene.write_text(_rows(0, 10) + "10 10.5 20 0.1 2")  # 最后一行尚无换行
+    reader = PointCloudFileReader(str(scene))
+    before = reader.load()
+    assert before[3].size == 11
+    with open(scene, "a") as f:
+        f.write("5\n" + _rows(11, 3))  # 补全正在写入的行：标签由2变为25
+    _bump_mtime(scene)
+    status, start = reader.refresh()
+    assert (status, start) == ("appended", 10)
+    after = reader.cloud()
+    assert after[3][10] == 25
+    np.testing.assert_array_equal(after[0][11:], [11, 12, 13])
+    # 先前交出的视图保持原值
+    assert before[3].size == 11 and before[3][10] == 2 and before[5][10, 0] == 10
+
+
+def test_truncation_triggers_full_reload(scene):
+    reader = PointCloudFileReader(str(scene))
+    reader.load()
+    scene.write_text(_rows(100, 4))
+    assert reader.refresh() == ("reloaded", 0)
+    np.testing.assert_array_equal(reader.cloud()[0], [100, 101, 102, 103])
+
+
+def test_rewritten_head_triggers_full_reload(scene):
+    reader = PointCloudFileReader(str(scene))
+    reader.load()
+    content = scene.read_text()
+    scene.write_text("9" + content[1:] + _rows(10, 2))
+    _bump_mtime(scene)
+    assert reader.refresh() == ("reloaded", 0)
+    assert reader.cloud()[0][0] == 9
+
+
+def test_replaced_file_triggers_full_reload(scene, tmp_path):
+    reader = PointCloudFileReader(str(scene))
+    reader.load()
+    # 开头与边界窗口内容都相同，只是文件被整体替换（inode变化）并在中间改动
+    replacement = tmp_path / "scene.txt.tmp"
+    rows = _rows(0, 10).splitlines(keepends=True)
+    rows[5] = "5 5.5 10 0.1 3\n"
+    replacement.write_text("".join(rows) + _rows(10, 1))
+    os.replace(replacement, scene)
+    _bump_mtime(scene)
+    assert reader.refresh() == ("reloaded", 0)
+    assert reader.cloud()[3][5] == 3
@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+import pytest
+
+import p2txt_core
+from p2txt_core import I18N_TEXTS, RenderCache, SceneEntry, cloud_content_digest, render_point_cloud_views
+
+
+def _cloud(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    points = rng.random((n, 3)) * 10
+    labels = rng.integers(0, 5, n)
+    return points[:, 0], points[:, 1], points[:, 2], labels, rng.random(n), points
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return RenderCache(str(tmp_path / "cache"), 64 * 1024 * 1024)
+
+
+def test_key_depends_on_content_and_parameters(cache):
+    i18n = I18N_TEXTS["en"]
+    digest = cloud_content_digest(_cloud())
+    base = cache.key(digest, "top", "Top", i18n)
+    assert base == cache.key(cloud_content_digest(_cloud()), "top", "Top", i18n)
+    assert base != cache.key(cloud_content_digest(_cloud(seed=1)), "top", "Top", i18n)
+    assert base != cache.key(digest, "front", "Top", i18n)
+    assert base != cache.key(digest, "top", "Top", i18n, dpi=60)
+    assert base != cache.key(digest, "top", "Top", i18n, variant="preview")
+    assert base != cache.key(digest, "top", "Top", I18N_TEXTS["zh"])
+
+
+def test_store_fetch_and_corrupt_entry(cache, tmp_path):
+    src = tmp_path / "view.png"
+    src.write_bytes(b"\x89PNG\r\n\x1a\n" + b"\0" * 100)
+    cache.store("k1", str(src))
+    dest = tmp_path / "copy.png"
+    assert cache.fetch("k1", str(dest)) and dest.read_bytes() == src.read_bytes()
+    assert not cache.fetch("missing", str(dest))
+    with open(os.path.join(cache.cache_dir, "k2.png"), "wb") as f:
+        f.write(b"not a png")
+    assert not cache.fetch("k2", str(dest))
+    assert not os.path.exists(os.path.join(cache.cache_dir, "k2.png"))
+
+
+def test_eviction_keeps_most_recent(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), 250)
+    cache.set_max_bytes(250)  # 缓存目录尚不存在时也可以调整上限
+    src = tmp_path / "view.png"
+    src.write_bytes(b"\x89PNG\r\n\x1a\n" + b"\0" * 92)  # 100字节
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.store(key, str(src))
+        os.utime(os.path.join(cache.cache_dir, key + ".png"), (1000 + i, 1000 + i))
+    cache.set_max_bytes(250)
+    assert sorted(os.listdir(cache.cache_dir)) == ["b.png", "c.png"]
+
+
+def test_scene_entry_digest_computed_once_per_cloud(monkeypatch, tmp_path):
+    calls = []
+    original = p2txt_core.cloud_content_digest
+    monkeypatch.setattr(p2txt_core, "cloud_content_digest", lambda cloud: calls.append(1) or original(cloud))
+    entry = SceneEntry(str(tmp_path / "scene.txt"), str(tmp_path))
+    entry.cloud = _cloud()
+    first = entry.content_digest(entry.cloud)
+    assert entry.content_digest(entry.cloud) == first and len(calls) == 1
+    old_cloud = entry.cloud
+    entry.cloud = _cloud(seed=1)
+    assert entry.content_digest(entry.cloud) != first and len(calls) == 2
+    # 旧版本点云（例如仍在后台渲染）的哈希照常计算，但不会覆盖当前版本的缓存
+    assert entry.content_digest(old_cloud) == first and len(calls) == 3
+    entry.content_digest(entry.cloud)
+    assert len(calls) == 3
+
+
+def test_render_uses_given_digest(monkeypatch, cache, tmp_path):
+    cloud = _cloud()
+    digest = cloud_content_digest(cloud)
+    monkeypatch.setattr(p2txt_core, "cloud_content_digest", lambda cloud: pytest.fail("digest recomputed"))
+    i18n = I18N_TEXTS["en"]
+    paths = render_point_cloud_views("scene.txt", str(tmp_path / "views"), i18n, cloud=cloud, render_cache=cache,
+                                     data_digest=digest)
+    assert sorted(paths) == ["front", "side", "top"]
+    assert len(os.listdir(cache.cache_dir)) == 3
+    again = render_point_cloud_views("scene.txt", str(tmp_path / "views2"), i18n, cloud=cloud, render_cache=cache,
+                                     data_digest=digest)
+    assert all(os.path.getsize(again[key]) == os.path.getsize(paths[key]) for key in paths)
@@ -0,0 +1,176 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import p2txt_service as ps
+from p2txt_core import I18N_TEXTS, SceneCache, SceneEntry
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _wait(job, timeout=30.0):
+    deadline = time.time() + timeout
+    while not job.is_finished() and time.time() < deadline:
+        time.sleep(0.02)
+    assert job.is_finished(), job.status
+
+
+@pytest.fixture
+def service(tmp_path):
+    config = ps.ServiceConfig(api_key="sk-test", output_dir=str(tmp_path / "views"),
+                              render_cache_dir=str(tmp_path / "render_cache"), upload_dir=str(tmp_path / "uploads"))
+    svc = ps.SceneService(config)
+    yield svc
+    svc.shutdown()
+
+
+def test_service_does_not_import_qt():
+    code = "import sys, p2txt_service; print(sorted(m for m in ('PyQt6', 'open3d') if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+
+def test_i18n_languages_have_same_keys():
+    assert set(I18N_TEXTS["en"]) == set(I18N_TEXTS["zh"])
+    assert "error_no_2d_views_for_vlm" in I18N_TEXTS["en"]
+
+
+def test_unparsable_scene_fails_with_readable_error(service, tmp_path):
+    scene = tmp_path / "empty.txt"
+    scene.write_text("# only a comment\n")
+    job = service.submit(ps.AnalysisJob(str(scene), lang="en"))
+    _wait(job)
+    assert job.status == ps.JOB_FAILED
+    assert "点云文件中未找到数据" in job.error
+    assert job.snapshot()["error"] == job.error
+    assert job.events_since(0, 0)[-1] == ("error", {"error": job.error})
+
+
+def test_render_only_job_reuses_loaded_scene(service, tmp_path):
+    scene = tmp_path / "scene.txt"
+    rng = np.random.default_rng(0)
+    np.savetxt(scene, np.c_[rng.random((500, 4)), rng.integers(0, 4, 500)], fmt="%.4f %.4f %.4f %.4f %d")
+    first = service.submit(ps.AnalysisJob(str(scene), lang="en", analyze=False))
+    _wait(first)
+    assert first.status == ps.JOB_DONE, first.error
+    assert sorted(first.views) == ["front", "side", "top"]
+    second = service.submit(ps.AnalysisJob(str(scene), lang="en", analyze=False))
+    _wait(second)
+    assert second.views == first.views
+    assert service.health()["loaded_scenes"] == 1
+
+
+def test_scene_cache_skips_pinned_entries(tmp_path):
+    cache = SceneCache(max_bytes=1)
+    entries = []
+    for i in range(3):
+        entry = SceneEntry(str(tmp_path / f"{i}.txt"), str(tmp_path))
+        points = np.zeros((100, 3))
+        entry.cloud = (points[:, 0], points[:, 1], points[:, 2], np.zeros(100, dtype=np.int32), np.zeros(100), points)
+        entries.append(entry)
+    cache.pin(entries[0])
+    for entry in entries:
+        cache.touch(entry)
+    # 被固定的场景不会被释放；解除固定后补上淘汰
+    assert entries[0].is_loaded()
+    assert not entries[1].is_loaded()
+    cache.unpin(entries[0])
+    assert not entries[0].is_loaded()
+    assert entries[2].is_loaded()
+
+
+def test_scene_entry_counts_and_releases_sorted_projections(tmp_path):
+    entry = SceneEntry(str(tmp_path / "a.txt"), str(tmp_path))
+    points = np.zeros((100, 3))
+    entry.cloud = (points[:, 0], points[:, 1], points[:, 2], np.zeros(100, dtype=np.int32), np.zeros(100), points)
+    base = entry.nbytes()
+    projections = entry.projections  # 交互视图持有同一个字典
+    projections['top'] = (np.zeros(100), np.zeros(100), np.zeros(100, dtype=np.uint32))
+    assert entry.nbytes() == base + 100 * (8 + 8 + 4)
+    entry.release()
+    assert projections == {}
+
+
+def test_reader_that_sees_finished_job_has_final_event(monkeypatch, tmp_path):
+    # 与SSE循环相同：没有新事件且任务已结束时停止读取
+    original_emit = ps.AnalysisJob.emit
+
+    def slow_emit(self, event, data):
+        if event in ("done", "error"):
+            time.sleep(0.05)  # 拉大状态事件与结束事件之间的间隔
+        original_emit(self, event, data)
+
+    monkeypatch.setattr(ps.AnalysisJob, "emit", slow_emit)
+    for finish in (lambda job: job.finish(), lambda job: job.fail("boom")):
+        job = ps.AnalysisJob(str(tmp_path / "scene.txt"))
+        received, index = [], 0
+
+        def read():
+            nonlocal index
+            while True:
+                events = job.events_since(index, 0.01)
+                if not events and job.is_finished():
+                    return
+                received.extend(events)
+                index += len(events)
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        time.sleep(0.05)
+        finish(job)
+        reader.join(2)
+        assert received[-1][0] in ("done", "error")
+        assert received[-2] == ("status", {"status": job.status})
+
+
+def _write_scene(path, n=500):
+    rng = np.random.default_rng(0)
+    np.savetxt(path, np.c_[rng.random((n, 4)), rng.integers(0, 4, n)], fmt="%.4f %.4f %.4f %.4f %d")
+
+
+def test_analysis_uploads_overlap_rendering_and_each_other(service, tmp_path, monkeypatch):
+    dashscope = pytest.importorskip("dashscope")
+    import mock_vlm_server as mv
+    import p2txt_core
+
+    server = mv.start_mock_server(mv.MockVlmConfig(first_token_delay_s=0.02, tokens=5, tokens_per_second=500))
+    monkeypatch.setattr(dashscope, "base_http_api_url", server.base_url)
+    uploads, renders = [], []
+    render_view_cached = p2txt_core.render_view_cached
+
+    def slow_render(*args, **kwargs):
+        path = render_view_cached(*args, **kwargs)
+        renders.append(time.monotonic())
+        return path
+
+    def slow_upload(path, *args):
+        start = time.monotonic()
+        time.sleep(0.3)
+        uploads.append((start, time.monotonic()))
+        return f"file://{path}", 10
+
+    monkeypatch.setattr(p2txt_core, "render_view_cached", slow_render)
+    monkeypatch.setattr(p2txt_core, "resolve_image_reference", slow_upload)
+    monkeypatch.setattr(ps, "resolve_image_reference", slow_upload)
+    scene = tmp_path / "scene.txt"
+    _write_scene(scene)
+
+    cold = service.submit(ps.AnalysisJob(str(scene), lang="en"))
+    _wait(cold)
+    assert cold.status == ps.JOB_DONE, cold.error
+    assert cold.metrics["upload_bytes"] == 30
+    # 冷场景：第一张图在最后一个视图渲染完成前已开始上传
+    assert min(start for start, _ in uploads) < max(renders)
+
+    uploads.clear()
+    warm = service.submit(ps.AnalysisJob(str(scene), lang="en"))
+    _wait(warm)
+    assert warm.status == ps.JOB_DONE, warm.error
+    # 已渲染的场景：三个视图并发解析
+    assert max(start for start, _ in uploads) < min(end for _, end in uploads)
+    assert [event for event, _ in warm.events_since(0, 0)][-2:] == ["status", "done"]
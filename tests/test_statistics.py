@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from p2txt_core import compute_scene_statistics
+
+
+def _per_class_loop(points, labels, grid_size):
+    """逐类别循环的参考实现。"""
+    scene_min, scene_max = points.min(axis=0), points.max(axis=0)
+    extent = np.maximum(scene_max[:2] - scene_min[:2], 1e-9)
+    cells = np.clip(((points[:, :2] - scene_min[:2]) / extent * grid_size).astype(int), 0, grid_size - 1)
+    result = []
+    for label_id in np.unique(labels):
+        mask = labels == label_id
+        grid = np.zeros((grid_size, grid_size), dtype=bool)
+        grid[grid_size - 1 - cells[mask, 1], cells[mask, 0]] = True
+        result.append((label_id, mask.sum(), points[mask].min(axis=0), points[mask].max(axis=0), grid))
+    return result
+
+
+@pytest.mark.parametrize("n_classes", [1, 5, 40])
+def test_statistics_match_per_class_loop(n_classes):
+    rng = np.random.default_rng(n_classes)
+    points = rng.normal(size=(5000, 3)) * [50, 20, 5]
+    labels = rng.integers(-3, n_classes, size=5000) * 7  # 含负数、非连续的标签
+    stats = compute_scene_statistics(points, labels, grid_size=6)
+    expected = _per_class_loop(points, labels, 6)
+    np.testing.assert_array_equal(stats["label_ids"], [e[0] for e in expected])
+    np.testing.assert_array_equal(stats["counts"], [e[1] for e in expected])
+    np.testing.assert_allclose(stats["mins"], [e[2] for e in expected])
+    np.testing.assert_allclose(stats["maxs"], [e[3] for e in expected])
+    np.testing.assert_array_equal(stats["occupancy"], [e[4] for e in expected])
+    assert stats["total"] == 5000
+    np.testing.assert_allclose(stats["scene_min"], points.min(axis=0))
+
+
+def test_single_point_and_empty():
+    stats = compute_scene_statistics(np.array([[1.0, 2.0, 3.0]]), np.array([4]))
+    assert stats["label_ids"].tolist() == [4] and stats["counts"].tolist() == [1]
+    assert stats["occupancy"].sum() == 1
+    assert compute_scene_statistics(np.empty((0, 3)), np.empty(0, dtype=int)) is None
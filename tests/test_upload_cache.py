@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+
+from p2txt_core import UploadedImageCache
+
+
+class SlowUploadCache(UploadedImageCache):
+    def __init__(self, fail_first=False):
+        super().__init__()
+        self.uploads = 0
+        self.fail_first = fail_first
+
+    def _upload(self, file_path, api_key):
+        self.uploads += 1
+        time.sleep(0.2)
+        if self.fail_first and self.uploads == 1:
+            raise RuntimeError("upload failed")
+        return f"oss://bucket/{self.uploads}.png"
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "view.png"
+    path.write_bytes(b"\x89PNG" + b"\1" * 1000)
+    return str(path)
+
+
+def _resolve_concurrently(cache, path, n=8):
+    results, errors = [], []
+
+    def run():
+        try:
+            results.append(cache.resolve(path, "sk-test"))
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_simultaneous_misses_upload_once(image):
+    cache = SlowUploadCache()
+    results, errors = _resolve_concurrently(cache, image)
+    assert not errors and cache.uploads == 1
+    assert {url for url, _ in results} == {"oss://bucket/1.png"}
+    assert sorted(sent for _, sent in results) == [0] * 7 + [1004]
+    assert cache.resolve(image, "sk-test") == ("oss://bucket/1.png", 0)
+    assert cache.resolve(image, "sk-other")[1] == 1004  # 不同密钥各自上传
+
+
+def test_failed_upload_is_shared_then_retried(image):
+    cache = SlowUploadCache(fail_first=True)
+    results, errors = _resolve_concurrently(cache, image, n=4)
+    assert not results and len(errors) == 4 and cache.uploads == 1
+    assert cache.resolve(image, "sk-test") == ("oss://bucket/2.png", 1004)
+
+
+def test_upload_against_mock_server(monkeypatch, image):
+    dashscope = pytest.importorskip("dashscope")
+    import mock_vlm_server as mv
+
+    server = mv.start_mock_server(mv.MockVlmConfig())
+    monkeypatch.setattr(dashscope, "base_http_api_url", server.base_url)
+    cache = UploadedImageCache()
+    url, sent = cache.resolve(image, "sk-test")
+    assert url.startswith("oss://") and sent == 1004
+    assert cache.resolve(image, "sk-test") == (url, 0)
+    assert server.stats["uploads"] == 1
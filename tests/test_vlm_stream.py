@@ -0,0 +1,92 @@
+import threading
+import time
+
+import pytest
+
+dashscope = pytest.importorskip("dashscope")
+
+import mock_vlm_server as mv
+from p2txt_core import AnalysisCancelled, VlmStreamTimeout, stream_vlm_analysis_guarded
+
+
+def _start_mock(monkeypatch, **config):
+    server = mv.start_mock_server(mv.MockVlmConfig(**config))
+    monkeypatch.setattr(dashscope, "base_http_api_url", server.base_url)
+    return server
+
+
+def _stream_threads():
+    return [thread for thread in threading.enumerate() if thread.name.startswith("vlm-stream-")]
+
+
+def _wait_for_stream_threads(timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while _stream_threads() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return _stream_threads()
+
+
+def _guarded(**kwargs):
+    return stream_vlm_analysis_guarded("sk-mock", [], "system", "user", **kwargs)
+
+
+def test_stream_completes(monkeypatch):
+    server = _start_mock(monkeypatch, first_token_delay_s=0.05, tokens=8, tokens_per_second=200)
+    text = "".join(_guarded())
+    assert text == "".join(server.reply_tokens())
+    assert _wait_for_stream_threads() == []
+
+
+def test_first_token_timeout_closes_connection(monkeypatch):
+    _start_mock(monkeypatch, first_token_delay_s=10, tokens=5)
+    start = time.monotonic()
+    with pytest.raises(VlmStreamTimeout):
+        list(_guarded(first_token_timeout_s=0.5))
+    assert time.monotonic() - start < 2
+    # 读取线程阻塞在等待首个token上，连接被断开后应立即退出，而不是等到10秒后数据到达
+    assert _wait_for_stream_threads() == []
+
+
+def test_inter_token_timeout_after_stall(monkeypatch):
+    _start_mock(monkeypatch, first_token_delay_s=0.05, tokens=10, tokens_per_second=200, stall_rate=1.0)
+    received = []
+    with pytest.raises(VlmStreamTimeout, match="下一段token"):
+        for text in _guarded(inter_token_timeout_s=0.5):
+            received.append(text)
+    # 模拟服务在一半token后停住；停住前的最后几段可能还留在客户端的读取缓冲中
+    assert 0 < len(received) <= 5
+    assert _wait_for_stream_threads() == []
+
+
+def test_cancel_closes_connection(monkeypatch):
+    _start_mock(monkeypatch, first_token_delay_s=10, tokens=5)
+    cancel_event = threading.Event()
+    threading.Timer(0.3, cancel_event.set).start()
+    start = time.monotonic()
+    with pytest.raises(AnalysisCancelled):
+        list(_guarded(cancel_event=cancel_event))
+    assert time.monotonic() - start < 2
+    assert _wait_for_stream_threads() == []
+
+
+def test_closing_generator_closes_connection(monkeypatch):
+    _start_mock(monkeypatch, first_token_delay_s=0.05, tokens=1000, tokens_per_second=20)
+    stream = _guarded()
+    assert next(stream)
+    stream.close()
+    assert _wait_for_stream_threads() == []
+
+
+def test_bench_stalls_release_concurrency_slots(monkeypatch):
+    # 停住的流在客户端超时断开后应立即释放并发名额，后续请求不应被持续限流
+    server = _start_mock(monkeypatch, first_token_delay_s=0.02, tokens=6, tokens_per_second=200, stall_rate=0.5,
+                         max_concurrent=2, seed=1)
+    results, _elapsed = mv.run_bench(server.base_url, requests=12, concurrency=2, inter_token_timeout_s=0.3)
+    errors = [r["error"] for r in results if r["error"] is not None]
+    assert server.stats["stalls"] >= 2
+    assert sum(error.startswith("VlmStreamTimeout") for error in errors) == server.stats["stalls"]
+    assert server.stats["throttled"] <= 1
+    deadline = time.monotonic() + 2
+    while server.active_streams and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert server.active_streams == 0